@@ -2,12 +2,18 @@ import os
 import sys
 import re
 import json
-import openai
+import ai_cache
+import prompt_budget
+import episode_parser
+import nfo_writer
+import media_scanner
+from nfo_worker import ProgressPanel, NFOWorker, GenerationCancelled
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QLineEdit, QTextEdit, QPushButton, QFileDialog, 
                             QMessageBox, QSpinBox, QCheckBox, QGroupBox, QFormLayout,
                             QDialog, QGridLayout, QLabel, QLineEdit, QDialogButtonBox)
 from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QTextCursor
 
 class OpenAIConfigDialog(QDialog):
     def __init__(self, parent=None):
@@ -36,37 +42,48 @@ class OpenAIConfigDialog(QDialog):
             'base_url': self.base_url_edit.text()
         }
 
-def chat(system_content, json_data, api_key, base_url="https://api.openai.com/v1"):
-    """调用OpenAI API生成简介"""
+def build_chat_request(system_content, json_data):
+    """构造生成电视剧简介的请求参数"""
+    # 集数很多时只附带均匀抽取的部分标题，请求大小不随集数增长
+    episodes = prompt_budget.sample_titles(json_data.get('episodes', []))
+    titles_text = "\n".join([f"第{ep.get('episode')}集: {ep.get('title')}" for ep in episodes])
+    
+    user_content = f"""
+    电视剧名称: {json_data.get('title', '未知')}
+    剧集标题:
+    {titles_text}
+    
+    请根据以上信息生成电视剧简介，要求在50字以内。
+    """
+    
+    return {
+        'model': "gpt-3.5-turbo",
+        'messages': [
+            {"role": "system", "content": system_content},
+            {"role": "user", "content": user_content}
+        ],
+        'max_tokens': 100,
+        'temperature': 0.7
+    }
+
+def chat(system_content, json_data, api_key, base_url="https://api.openai.com/v1", on_delta=None):
+    """调用OpenAI API生成简介；提供 on_delta(text) 时以流式方式请求，边生成边回调"""
     try:
-        # 设置OpenAI API配置
-        openai.api_key = api_key
-        openai.api_base = base_url
+        # openai 导入较慢，第一次生成简介时才导入，不拖慢程序启动
+        import openai
+        # openai>=1 不再读取模块级的 api_base / max_retries，必须通过客户端指定接口地址；
+        # 限流与重试由 ai_client.py 统一处理，客户端自身不重试
+        client = openai.OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
         
         # 准备提示词
-        episodes = json_data.get('episodes', [])
-        titles_text = "\n".join([f"第{ep.get('episode')}集: {ep.get('title')}" for ep in episodes])
-        
-        user_content = f"""
-        电视剧名称: {json_data.get('title', '未知')}
-        剧集标题:
-        {titles_text}
-        
-        请根据以上信息生成电视剧简介，要求在50字以内。
-        """
-        
-        # 调用OpenAI API
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_content},
-                {"role": "user", "content": user_content}
-            ],
-            max_tokens=100,
-            temperature=0.7
-        )
-        
-        return response.choices[0].message.content.strip()
+        request = build_chat_request(system_content, json_data)
+        
+        # 调用OpenAI API (相同的请求直接使用本地缓存)
+        if on_delta:
+            return ai_cache.cached_stream(client, request, on_delta, base_url)
+        return ai_cache.cached_create(client, request, base_url)
+    except GenerationCancelled:
+        raise
     except Exception as e:
         return f"生成简介时出错: {str(e)}"
 
@@ -80,6 +97,7 @@ class NFOGenerator(QMainWindow):
         self.video_files = []
         self.selected_folder = ""
         self.openai_config = None
+        self.plot_worker = None
         
         # 创建中心部件和布局
         self.central_widget = QWidget()
@@ -189,6 +207,12 @@ class NFOGenerator(QMainWindow):
         button_layout.addWidget(self.generate_button)
         
         self.main_layout.addWidget(button_widget)
+        
+        # 进度条（生成时显示）
+        self.progress_panel = ProgressPanel()
+        self.progress_panel.running_changed.connect(self.folder_button.setDisabled)
+        self.progress_panel.running_changed.connect(self.generate_button.setDisabled)
+        self.main_layout.addWidget(self.progress_panel)
     
     def select_folder(self):
         folder_path = QFileDialog.getExistingDirectory(self, "选择视频文件夹")
@@ -201,9 +225,7 @@ class NFOGenerator(QMainWindow):
     def load_video_files(self, folder_path):
         # 获取视频文件列表
         video_extensions = ['.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv']
-        self.video_files = [f for f in os.listdir(folder_path) 
-                          if os.path.isfile(os.path.join(folder_path, f)) 
-                          and os.path.splitext(f)[1].lower() in video_extensions]
+        self.video_files = media_scanner.list_files(folder_path, video_extensions)
         
         if not self.video_files:
             QMessageBox.warning(self, "警告", "所选文件夹中没有找到视频文件!")
@@ -228,6 +250,12 @@ class NFOGenerator(QMainWindow):
             self.ai_generate_button.setEnabled(bool(self.video_files) and self.openai_config)
     
     def generate_ai_plot(self):
+        # 生成过程中再次点击按钮为停止生成
+        if self.plot_worker is not None:
+            self.plot_worker.cancel()
+            self.ai_generate_button.setEnabled(False)
+            return
+
         if not self.openai_config:
             QMessageBox.warning(self, "警告", "请先配置OpenAI API信息!")
             return
@@ -261,25 +289,43 @@ class NFOGenerator(QMainWindow):
         # 系统提示词
         system_content = "请为一部电视剧生成简介，要求简介在50字以内，需概括剧集主要内容和情节发展。"
         
-        # 显示等待消息
-        self.statusBar().showMessage("正在调用OpenAI API生成简介...")
-        QApplication.processEvents()
-        
-        # 调用AI生成简介
-        try:
-            generated_plot = chat(
-                system_content, 
-                json_data,
-                self.openai_config['api_key'],
-                self.openai_config['base_url']
-            )
-            
-            # 填充到剧情简介文本框
-            self.plot.setPlainText(generated_plot)
-            self.statusBar().showMessage("简介生成成功")
-        except Exception as e:
-            QMessageBox.critical(self, "错误", f"调用OpenAI API时出错: {str(e)}")
-            self.statusBar().showMessage(f"错误: {str(e)}")
+        # 显示等待消息和本次请求的输入 token 数
+        input_tokens = prompt_budget.request_tokens(build_chat_request(system_content, json_data))
+        self.statusBar().showMessage(f"正在调用OpenAI API生成简介 (输入约 {input_tokens} token)...")
+
+        # 在后台线程中以流式方式调用AI，生成的文字逐段显示在剧情简介文本框中
+        api_key = self.openai_config['api_key']
+        base_url = self.openai_config['base_url']
+
+        def task(worker):
+            return chat(system_content, json_data, api_key, base_url, on_delta=worker.send_text)
+
+        self.plot.clear()
+        worker = NFOWorker(task, self)
+        worker.text_received.connect(self.append_plot_text)
+        worker.succeeded.connect(self.on_ai_plot_finished)
+        worker.failed.connect(self.on_generation_failed)
+        worker.cancelled.connect(lambda: self.statusBar().showMessage("已停止生成，保留已生成的部分"))
+        worker.finished.connect(self.on_ai_plot_worker_finished)
+        self.plot_worker = worker
+        self.ai_generate_button.setText("停止生成")
+        worker.start()
+
+    def append_plot_text(self, text):
+        cursor = self.plot.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+        self.plot.setTextCursor(cursor)
+
+    def on_ai_plot_finished(self, generated_plot):
+        # 填充到剧情简介文本框（去掉首尾空白，出错时为错误信息）
+        self.plot.setPlainText(generated_plot)
+        self.statusBar().showMessage("简介生成成功")
+
+    def on_ai_plot_worker_finished(self):
+        self.plot_worker = None
+        self.ai_generate_button.setText("生成AI简介")
+        self.ai_generate_button.setEnabled(bool(self.video_files) and bool(self.openai_config))
     
     def extract_title(self, filename):
         # 从文件名中提取标题（去除扩展名和常见标记）
@@ -299,21 +345,8 @@ class NFOGenerator(QMainWindow):
         return base_name
     
     def extract_episode_number(self, filename):
-        # 尝试从文件名中提取集数
-        patterns = [
-            r'\[P(\d+)\]',    # 匹配 [P01] 格式
-            r'E(\d+)',        # 匹配 E01 格式
-            r'第(\d+)集'      # 匹配 第1集 格式
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, filename)
-            if match:
-                try:
-                    return int(match.group(1))
-                except ValueError:
-                    continue
-        return None
+        # 集数识别规则统一在 episode_parser.py 中
+        return episode_parser.extract_episode_number(filename)
     
     def generate_nfo_files(self):
         if not self.selected_folder or not self.video_files:
@@ -340,53 +373,75 @@ class NFOGenerator(QMainWindow):
                 QMessageBox.warning(self, "警告", "剧情简介不能为空!")
                 return
             
-            # 生成主TVShow NFO文件
-            tvshow_nfo_path = os.path.join(self.selected_folder, "tvshow.nfo")
-            with open(tvshow_nfo_path, 'w', encoding='utf-8') as f:
-                f.write(self.generate_tvshow_nfo(title, originaltitle, plot, year, genre, studio))
+            folder_path = self.selected_folder
+            video_files = list(self.video_files)
             
-            # 为每个视频文件生成剧集NFO文件
-            current_episode = start_episode
-            for video_file in self.video_files:
-                # 尝试从文件名中提取集数
-                ep_num = self.extract_episode_number(video_file) or current_episode
+            # 在后台线程中写入，界面保持响应，可随时取消
+            def task(worker):
+                # 生成主TVShow NFO文件
+                tvshow_nfo_path = os.path.join(folder_path, "tvshow.nfo")
+                nfo_writer.write_nfo(tvshow_nfo_path, self.generate_tvshow_nfo(title, originaltitle, plot, year, genre, studio))
                 
-                # 创建剧集NFO文件
-                base_name = os.path.splitext(video_file)[0]
-                episode_nfo_path = os.path.join(self.selected_folder, f"{base_name}.nfo")
-                with open(episode_nfo_path, 'w', encoding='utf-8') as f:
-                    f.write(self.generate_episode_nfo(title, plot, season, ep_num, year))
-                
-                current_episode += 1
+                # 为每个视频文件生成剧集NFO文件
+                current_episode = start_episode
+                for done, video_file in enumerate(video_files, 1):
+                    # 尝试从文件名中提取集数
+                    ep_num = self.extract_episode_number(video_file) or current_episode
+                    
+                    # 创建剧集NFO文件
+                    base_name = os.path.splitext(video_file)[0]
+                    episode_nfo_path = os.path.join(folder_path, f"{base_name}.nfo")
+                    nfo_writer.write_nfo(episode_nfo_path, self.generate_episode_nfo(title, plot, season, ep_num, year))
+                    
+                    current_episode += 1
+                    worker.report(done, len(video_files), video_file)
+                return len(video_files)
             
-            QMessageBox.information(self, "成功", f"已成功生成 {len(self.video_files) + 1} 个NFO文件!")
-            self.statusBar().showMessage(f"已为 {len(self.video_files)} 个视频文件生成NFO文件")
+            self.statusBar().showMessage("正在生成NFO文件...")
+            self.progress_panel.start(task, self.on_generation_finished, self.on_generation_failed,
+                                      self.on_generation_cancelled)
             
         except Exception as e:
             QMessageBox.critical(self, "错误", f"生成NFO文件时出错: {str(e)}")
             self.statusBar().showMessage(f"错误: {str(e)}")
     
+    def on_generation_finished(self, count):
+        QMessageBox.information(self, "成功", f"已成功生成 {count + 1} 个NFO文件!")
+        self.statusBar().showMessage(f"已为 {count} 个视频文件生成NFO文件")
+    
+    def on_generation_failed(self, message):
+        QMessageBox.critical(self, "错误", f"生成NFO文件时出错: {message}")
+        self.statusBar().showMessage(f"错误: {message}")
+    
+    def on_generation_cancelled(self):
+        self.statusBar().showMessage("已取消生成")
+    
+    def closeEvent(self, event):
+        self.progress_panel.stop()
+        if self.plot_worker is not None:
+            self.plot_worker.cancel()
+            self.plot_worker.wait()
+        super().closeEvent(event)
+    
     def generate_tvshow_nfo(self, title, originaltitle, plot, year, genre, studio):
-        return f"""<?xml version="1.0" encoding="UTF-8"?>
-<tvshow>
-    <title>{title}</title>
-    <originaltitle>{originaltitle}</originaltitle>
-    <plot>{plot}</plot>
-    <year>{year}</year>
-    <genre>{genre}</genre>
-    <studio>{studio}</studio>
-</tvshow>"""
+        return nfo_writer.render_nfo('tvshow', [
+            ('title', title),
+            ('originaltitle', originaltitle),
+            ('plot', plot),
+            ('year', year),
+            ('genre', genre),
+            ('studio', studio),
+        ])
     
     def generate_episode_nfo(self, title, plot, season, episode, year):
-        return f"""<?xml version="1.0" encoding="UTF-8"?>
-<episodedetails>
-    <title>{title} - 第{season}季 第{episode}集</title>
-    <showtitle>{title}</showtitle>
-    <plot>{plot}</plot>
-    <season>{season}</season>
-    <episode>{episode}</episode>
-    <year>{year}</year>
-</episodedetails>"""
+        return nfo_writer.render_nfo('episodedetails', [
+            ('title', f"{title} - 第{season}季 第{episode}集"),
+            ('showtitle', title),
+            ('plot', plot),
+            ('season', season),
+            ('episode', episode),
+            ('year', year),
+        ])
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
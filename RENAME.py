@@ -1,6 +1,7 @@
 import sys
 import os
 import re
+import media_scanner
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QPushButton, QFileDialog, QListWidget, 
                             QLabel, QLineEdit, QSpinBox, QCheckBox, QMessageBox, 
@@ -248,19 +249,24 @@ class BatchRenamer(QMainWindow):
     def select_folder(self):
         folder = QFileDialog.getExistingDirectory(self, '选择文件夹')
         if folder:
-            files = [os.path.join(folder, f) for f in os.listdir(folder) 
-                    if os.path.isfile(os.path.join(folder, f))]
+            # scandir 一次取得文件类型和修改时间，不再逐个 stat
+            entries = list(media_scanner.iter_files(folder))
+            files = [entry.path for entry in entries]
+            mtimes = {entry.path: media_scanner.entry_mtime(entry) for entry in entries}
             if files:
-                self.add_files(files)
+                self.add_files(files, mtimes)
                 
-    def add_files(self, files):
+    def add_files(self, files, mtimes=None):
         for file_path in files:
             file_name = os.path.basename(file_path)
-            # 获取文件修改时间
-            try:
-                mtime = os.path.getmtime(file_path)
-            except:
-                mtime = 0
+            # 获取文件修改时间（扫描文件夹时已经取得的直接使用）
+            if mtimes and file_path in mtimes:
+                mtime = mtimes[file_path]
+            else:
+                try:
+                    mtime = os.path.getmtime(file_path)
+                except:
+                    mtime = 0
             # 存储文件名、路径和修改时间
             self.file_data.append((file_name, file_path, mtime))
             self.file_list.addItem(file_name)
@@ -0,0 +1,188 @@
+"""
+AI 回复的本地缓存 (SQLite)
+
+以 (接口地址, 模型, 消息, temperature 等请求参数) 的哈希为键保存回复文本，
+相同的请求不再重复调用接口。超过保存期限的记录和超出容量上限的最久未用记录会被清理。
+cached_stream 以流式方式请求，边收边交给界面显示。
+
+缓存文件默认位于 ~/.nfo_generator/ai_cache.sqlite3，可用环境变量 NFO_AI_CACHE
+指定其他路径，设为 off 则关闭缓存。
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+import ai_client
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".nfo_generator", "ai_cache.sqlite3")
+DEFAULT_MAX_AGE_DAYS = 180
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# 长时间运行的进程 (nfo_watch、图形界面) 中，每写入这么多条或这么多字节后清理一次
+EVICT_EVERY_PUTS = 200
+EVICT_EVERY_BYTES = 1024 * 1024
+
+
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age_days=DEFAULT_MAX_AGE_DAYS, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_age = max_age_days * 24 * 3600
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self._bytes_since_evict = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 多个进程 (nfo_batch.py 的进程池) 会同时读写，使用 WAL 并设置等待时间
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON responses(last_used)")
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(base_url, request):
+        """request 为传给 chat.completions.create 的参数字典（不含 stream 等与内容无关的参数）"""
+        data = json.dumps({'base_url': str(base_url).rstrip('/'), 'request': request},
+                          ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[1] > self.max_age:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now))
+            self._conn.commit()
+            self._puts_since_evict += 1
+            self._bytes_since_evict += size
+            due = self._puts_since_evict >= EVICT_EVERY_PUTS or self._bytes_since_evict >= EVICT_EVERY_BYTES
+        if due:
+            self.evict()
+
+    def evict(self):
+        """删除过期记录，并按最近使用时间淘汰超出容量的记录"""
+        with self._lock:
+            self._puts_since_evict = 0
+            self._bytes_since_evict = 0
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age,))
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                freed = 0
+                stale = []
+                for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+                    stale.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+_default_cache_pid = None
+
+
+def get_default_cache():
+    """返回本进程共享的缓存实例；缓存被关闭或无法打开时返回 None"""
+    global _default_cache, _default_cache_pid
+    path = os.environ.get('NFO_AI_CACHE', DEFAULT_CACHE_PATH)
+    if path.lower() == 'off':
+        return None
+    # 子进程不能沿用父进程的 SQLite 连接
+    if _default_cache is None or _default_cache_pid != os.getpid():
+        try:
+            _default_cache = ResponseCache(path)
+            _default_cache_pid = os.getpid()
+        except sqlite3.Error:
+            return None
+    return _default_cache
+
+
+def cached_create(client, request, base_url=None):
+    """
+    带缓存的 client.chat.completions.create，返回去除首尾空白的回复文本。
+
+    base_url 缺省时取 client.base_url；未命中缓存时经 ai_client.py 限流、重试后调用接口。
+    只缓存非空的回复。
+    """
+    base_url = base_url or client.base_url
+    cache = get_default_cache()
+    key = None
+    if cache:
+        key = cache.make_key(base_url, request)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    response = ai_client.get_guard(base_url).create(client, request)
+    text = (response.choices[0].message.content or '').strip()
+    # 空回复不写入缓存，否则以后每次都命中空字符串，再也得不到简介
+    if cache and text:
+        cache.put(key, text)
+    return text
+
+
+def cached_stream(client, request, on_delta, base_url=None):
+    """
+    流式版本的 cached_create：每收到一段文本就调用 on_delta(text)，返回完整回复文本。
+
+    命中缓存时把缓存的回复一次性交给 on_delta。on_delta 中抛出的异常（如用户取消）
+    会关闭连接、停止生成并向上传递，未完成的回复不写入缓存。
+    与非流式请求使用相同的缓存键，预览过的简介在批量生成时直接命中缓存。
+    """
+    base_url = base_url or client.base_url
+    cache = get_default_cache()
+    key = None
+    if cache:
+        key = cache.make_key(base_url, request)
+        cached = cache.get(key)
+        if cached is not None:
+            on_delta(cached)
+            return cached
+    # 只在建立连接 (收到第一块之前) 时重试
+    stream = ai_client.get_guard(base_url).create(client, dict(request, stream=True))
+    parts = []
+    try:
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+    finally:
+        stream.close()
+    text = ''.join(parts).strip()
+    if cache and text:
+        cache.put(key, text)
+    return text
@@ -0,0 +1,232 @@
+"""
+AI 接口调用的限流、重试与熔断
+
+所有 chat.completions.create 调用（nfo_generator_enhance2.py、AI_nfo.py、AI2.py）都经由这里：
+- 令牌桶分别限制每分钟请求数和每分钟 token 数
+- 遇到 429 时按 AIMD 调整并发数（成功时缓慢增加，限流时减半）
+- 429、5xx、超时和连接错误按带抖动的指数退避重试，优先遵守 Retry-After
+- 连续失败达到阈值后熔断一段时间，期间直接报错，不再请求接口
+
+令牌桶和熔断器按接口地址在进程内共享；AIMD 并发限制器属于单次异步运行。
+"""
+import time
+import random
+import threading
+
+import prompt_budget
+
+DEFAULT_RPM = 300
+DEFAULT_TPM = 500000
+DEFAULT_MAX_RETRIES = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+BREAKER_THRESHOLD = 5
+BREAKER_RESET_SECONDS = 30.0
+# 请求未指定 max_tokens 时按此估算输出 token 数
+DEFAULT_COMPLETION_TOKENS = 512
+
+
+class CircuitOpenError(Exception):
+    """熔断期间拒绝请求"""
+
+
+class TokenBucket:
+    """按每分钟速率补充的令牌桶，允许先透支再等待"""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        """预留 amount 个令牌，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # 单次请求超过桶容量时按容量计，避免永远等不到
+            self.tokens -= min(amount, self.capacity)
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+
+class CircuitBreaker:
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def check(self):
+        """熔断打开且未到恢复时间时抛出 CircuitOpenError；到时间后放行试探请求"""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.reset_seconds - (time.monotonic() - self.opened_at)
+            if remaining > 0:
+                raise CircuitOpenError(f"AI 接口连续失败，已暂停调用，{remaining:.0f} 秒后重试")
+            # 半开状态：放行请求，失败一次就重新打开
+            self.failures = self.threshold - 1
+            self.opened_at = None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class AIMDLimiter:
+    """异步并发限制器：成功时每轮增加 1 个并发，限流时减半"""
+
+    def __init__(self, max_limit, min_limit=1):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = min_limit
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        # asyncio 只在并发生成时需要，不在启动时导入
+        import asyncio
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def on_rate_limited(self):
+        self.limit = max(self.min_limit, self.limit / 2)
+
+
+def is_rate_limited(error):
+    return getattr(error, 'status_code', None) == 429
+
+
+def is_retryable(error):
+    """429、5xx、超时和连接错误可以重试；其余错误（如 401、400）直接抛出"""
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status == 429 or status == 408 or status >= 500
+    return type(error).__name__ in ('APIConnectionError', 'APITimeoutError', 'TimeoutError', 'ConnectionError')
+
+
+def retry_delay(error, attempt):
+    """优先使用 Retry-After，否则为带完全抖动的指数退避"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers:
+        try:
+            return min(MAX_DELAY, float(headers.get('retry-after')))
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+
+
+def estimate_tokens(request):
+    """估算一次请求消耗的 token 数（输入 token 数 + 输出上限），见 prompt_budget.py"""
+    return prompt_budget.request_tokens(request) + request.get('max_tokens', DEFAULT_COMPLETION_TOKENS)
+
+
+class RequestGuard:
+    """同一接口地址共享的限流与熔断状态"""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM, max_retries=DEFAULT_MAX_RETRIES):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.request_bucket = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self.breaker = CircuitBreaker()
+        self.max_retries = max_retries
+
+    def _reserve(self, request):
+        return max(self.request_bucket.reserve(1), self.token_bucket.reserve(estimate_tokens(request)))
+
+    def create(self, client, request):
+        """同步调用 client.chat.completions.create，带限流、重试和熔断"""
+        attempt = 0
+        while True:
+            self.breaker.check()
+            time.sleep(self._reserve(request))
+            try:
+                response = client.chat.completions.create(**request)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if not is_rate_limited(e):
+                    self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(retry_delay(e, attempt))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return response
+
+    async def acreate(self, client, request, limiter=None):
+        """异步版本；limiter 为 AIMDLimiter 时每次尝试占用一个并发名额"""
+        import asyncio
+        attempt = 0
+        while True:
+            self.breaker.check()
+            await asyncio.sleep(self._reserve(request))
+            try:
+                if limiter:
+                    async with limiter:
+                        response = await client.chat.completions.create(**request)
+                else:
+                    response = await client.chat.completions.create(**request)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                if is_rate_limited(e):
+                    if limiter:
+                        limiter.on_rate_limited()
+                else:
+                    self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(retry_delay(e, attempt))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            if limiter:
+                limiter.on_success()
+            return response
+
+
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def get_guard(base_url, rpm=None, tpm=None):
+    """返回接口地址对应的共享 RequestGuard；传入 rpm/tpm 时更新限速"""
+    key = str(base_url).rstrip('/')
+    with _guards_lock:
+        guard = _guards.get(key)
+        if guard is None:
+            guard = _guards[key] = RequestGuard(rpm or DEFAULT_RPM, tpm or DEFAULT_TPM)
+        else:
+            if rpm and rpm != guard.rpm:
+                guard.rpm = rpm
+                guard.request_bucket = TokenBucket(rpm)
+            if tpm and tpm != guard.tpm:
+                guard.tpm = tpm
+                guard.token_bucket = TokenBucket(tpm)
+        return guard
@@ -0,0 +1,281 @@
+"""
+AI 剧集简介生成
+
+同步接口 get_ai_generated_plot 一次生成一集，stream_ai_generated_plot 为其流式版本（界面预览用）；
+generate_plots_concurrently 用 asyncio 同时发出多个请求（受并发上限约束），结果按完成顺序回调，调用方可以边收边写 NFO。
+两者都会先查询 ai_cache.py 的本地缓存，已生成过的内容不再调用接口。
+并发接口还支持把多集合并到一个请求中 (batch_size)，减少重复发送的提示词。
+电视剧简介按 prompt_budget.py 截断到 token 预算以内，请求大小不随简介长度增长。
+"""
+import os
+import json
+import importlib.util
+
+import ai_cache
+import ai_client
+import prompt_budget
+
+# AI 功能需要 openai 库, 如果你打算使用此功能,
+# 请先通过命令行安装: pip install openai
+# 导入 openai 需要约 0.5 秒，推迟到第一次创建客户端时；没有安装时程序照常运行，但AI功能不可用
+
+# 可用环境变量 NFO_AI_BASE_URL 指向其他兼容接口，例如 mock_openai_server.py
+DEFAULT_BASE_URL = os.environ.get('NFO_AI_BASE_URL', 'https://dashscope.aliyuncs.com/compatible-mode/v1')
+DEFAULT_MODEL = "qwen3-235b-a22b"
+DEFAULT_TEMPERATURE = 0.7
+# 同时进行中的 AI 请求数上限
+DEFAULT_CONCURRENCY = 8
+
+SYSTEM_PROMPT = "你是一位专业的电视剧剧情摘要助手。"
+
+
+def get_default_api_key():
+    """优先使用环境变量，其次使用 config.py 中的 qwen_api"""
+    api_key = os.environ.get('QWEN_API_KEY') or os.environ.get('DASHSCOPE_API_KEY')
+    if api_key:
+        return api_key
+    try:
+        from config import qwen_api
+        return qwen_api
+    except ImportError:
+        return None
+
+
+def is_available():
+    """是否安装了 openai 库（只查找，不导入）"""
+    return importlib.util.find_spec('openai') is not None
+
+
+def _import_openai():
+    if not is_available():
+        raise ImportError("OpenAI library is not installed.")
+    import openai
+    return openai
+
+
+def create_ai_client(api_key, base_url=DEFAULT_BASE_URL):
+    """创建 OpenAI 兼容客户端，未安装 openai 库时抛出 ImportError"""
+    # 重试由 ai_client.py 统一处理
+    return _import_openai().OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+
+def create_async_ai_client(api_key, base_url=DEFAULT_BASE_URL):
+    """创建异步客户端，需在同一个事件循环中使用并关闭"""
+    return _import_openai().AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+
+def build_plot_request(show_title, show_plot, episode_title, plot_budget=prompt_budget.DEFAULT_PLOT_BUDGET):
+    """构造单集简介的请求参数；电视剧简介超过 plot_budget 个 token 时截断"""
+    show_plot = prompt_budget.compact_plot(show_plot, plot_budget)
+    prompt = f"""
+    你是一位专业的电视剧剧情摘要助手。
+    请根据以下信息，为指定的一集生成一段引人入胜、简洁明了的剧情简介。
+
+    电视剧名称: {show_title}
+    电视剧主线剧情: {show_plot}
+    本集标题: {episode_title}
+
+    请只输出为 "{episode_title}" 这一集生成的剧情简介，不要包含“本集简介是：”或任何多余的客套话。
+    """
+    return {
+        'model': DEFAULT_MODEL,
+        'messages': [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        'temperature': DEFAULT_TEMPERATURE,
+        'extra_body': {"enable_thinking": False},
+    }
+
+
+def get_ai_generated_plot(client, show_title, show_plot, episode_title):
+    """
+    使用新版 openai>1.0.0 的 API 调用方式
+    """
+    if not is_available():
+        raise ImportError("OpenAI library is not installed.")
+
+    return ai_cache.cached_create(client, build_plot_request(show_title, show_plot, episode_title))
+
+
+def stream_ai_generated_plot(client, show_title, show_plot, episode_title, on_delta):
+    """流式生成单集简介，每收到一段文本调用 on_delta(text)，返回完整简介（见 ai_cache.cached_stream）"""
+    if not is_available():
+        raise ImportError("OpenAI library is not installed.")
+
+    return ai_cache.cached_stream(client, build_plot_request(show_title, show_plot, episode_title), on_delta)
+
+
+def build_batch_request(show_title, show_plot, episodes, plot_budget=prompt_budget.DEFAULT_PLOT_BUDGET):
+    """
+    构造多集合并的请求参数，episodes 为 [(集数, 本集标题), ...]。
+    电视剧简介的截断同 build_plot_request。
+
+    要求模型返回 JSON 数组: [{"episode": 集数, "plot": "简介"}, ...]
+    """
+    show_plot = prompt_budget.compact_plot(show_plot, plot_budget)
+    episodes_text = "\n".join(f"    第{number}集: {episode_title}" for number, episode_title in episodes)
+    prompt = f"""
+    请根据以下信息，为列出的每一集分别生成一段引人入胜、简洁明了的剧情简介。
+
+    电视剧名称: {show_title}
+    电视剧主线剧情: {show_plot}
+    剧集列表:
+{episodes_text}
+
+    请只输出一个 JSON 数组，每个元素形如 {{"episode": 集数, "plot": "该集剧情简介"}}，
+    每一集对应一个元素，不要输出 JSON 以外的任何内容。
+    """
+    return {
+        'model': DEFAULT_MODEL,
+        'messages': [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        'temperature': DEFAULT_TEMPERATURE,
+        'extra_body': {"enable_thinking": False},
+    }
+
+
+def parse_batch_response(text, episode_numbers):
+    """
+    解析多集合并请求的回复，返回 {集数: 简介}。
+
+    只保留 episode_numbers 中的集数且简介非空的条目；格式错误时返回空字典，
+    缺失的集由调用方单独重新请求。
+    """
+    text = text.strip()
+    # 去掉模型可能加上的 ```json 代码块标记
+    if text.startswith("```"):
+        text = text.strip('`')
+        if text.lower().startswith('json'):
+            text = text[4:]
+    start, end = text.find('['), text.rfind(']')
+    if start == -1 or end <= start:
+        return {}
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+
+    wanted = set(episode_numbers)
+    plots = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            number = int(item.get('episode'))
+        except (TypeError, ValueError):
+            continue
+        plot = item.get('plot')
+        if number in wanted and isinstance(plot, str) and plot.strip():
+            plots[number] = plot.strip()
+    return plots
+
+
+def split_batches(jobs, batch_size):
+    """把同一部剧的剧集按 batch_size 分组；同一批内集数不能重复，重复的集单独请求"""
+    batches = []
+    singles = []
+    groups = {}
+    for job in jobs:
+        groups.setdefault((job[1], job[2]), []).append(job)
+    for group in groups.values():
+        current = []
+        numbers = set()
+        for job in group:
+            if job[3] in numbers:
+                singles.append(job)
+                continue
+            current.append(job)
+            numbers.add(job[3])
+            if len(current) == batch_size:
+                batches.append(current)
+                current, numbers = [], set()
+        if len(current) > 1:
+            batches.append(current)
+        else:
+            singles.extend(current)
+    return batches, singles
+
+
+async def _generate_plots(api_key, base_url, jobs, concurrency, batch_size, rpm, tpm, on_result,
+                          plot_budget, stats):
+    import asyncio
+    # 并发上限会在遇到 429 时自动降低，之后再慢慢恢复
+    limiter = ai_client.AIMDLimiter(concurrency)
+    guard = ai_client.get_guard(base_url, rpm, tpm)
+    cache = ai_cache.get_default_cache()
+
+    async with create_async_ai_client(api_key, base_url) as client:
+        async def complete(request):
+            cache_key = cache.make_key(base_url, request) if cache else None
+            if cache:
+                cached = cache.get(cache_key)
+                if cached is not None:
+                    return cached
+            response = await guard.acreate(client, request, limiter)
+            text = response.choices[0].message.content.strip()
+            if stats is not None:
+                # 优先使用接口返回的实际用量
+                usage = getattr(response, 'usage', None)
+                stats['requests'] += 1
+                stats['prompt_tokens'] += (getattr(usage, 'prompt_tokens', None)
+                                           or prompt_budget.request_tokens(request))
+            if cache:
+                cache.put(cache_key, text)
+            return text
+
+        async def run(job):
+            key, show_title, show_plot, episode_number, episode_title = job
+            try:
+                plot = await complete(build_plot_request(show_title, show_plot, episode_title, plot_budget))
+                return [(key, plot, None)]
+            except Exception as e:
+                return [(key, None, e)]
+
+        async def run_batch(batch):
+            _, show_title, show_plot, _, _ = batch[0]
+            episodes = [(job[3], job[4]) for job in batch]
+            try:
+                plots = parse_batch_response(
+                    await complete(build_batch_request(show_title, show_plot, episodes, plot_budget)),
+                    [number for number, _ in episodes])
+            except Exception:
+                plots = {}
+            results = [(job[0], plots[job[3]], None) for job in batch if job[3] in plots]
+            # 回复中缺失或格式不对的集改为逐集请求
+            for single in await asyncio.gather(*[run(job) for job in batch if job[3] not in plots]):
+                results.extend(single)
+            return results
+
+        if batch_size > 1:
+            batches, singles = split_batches(jobs, batch_size)
+        else:
+            batches, singles = [], jobs
+        tasks = [run_batch(batch) for batch in batches] + [run(job) for job in singles]
+        for future in asyncio.as_completed(tasks):
+            for key, plot, error in await future:
+                on_result(key, plot, error)
+
+
+def generate_plots_concurrently(api_key, base_url, jobs, on_result, concurrency=DEFAULT_CONCURRENCY,
+                                batch_size=1, rpm=None, tpm=None,
+                                plot_budget=prompt_budget.DEFAULT_PLOT_BUDGET, stats=None):
+    """
+    并发生成多集简介。
+
+    jobs 为 (key, show_title, show_plot, episode_number, episode_title) 列表；每完成一集调用
+    on_result(key, plot, error)，成功时 error 为 None，失败时 plot 为 None。
+    batch_size 大于 1 时把同一部剧的多集合并到一个请求中，要求返回 JSON，
+    解析失败或缺失的集再单独请求。
+    rpm/tpm 为每分钟请求数和 token 数上限，None 表示使用 ai_client.py 的默认值。
+    plot_budget 为电视剧简介的 token 预算；stats 为字典时累加实际发出的请求数
+    ('requests') 和输入 token 数 ('prompt_tokens')，命中缓存的不计。
+    """
+    if not jobs:
+        return
+    # asyncio 只在并发生成时需要，不在启动时导入
+    import asyncio
+    asyncio.run(_generate_plots(api_key, base_url, jobs, concurrency, batch_size, rpm, tpm, on_result,
+                                plot_budget, stats))
@@ -2,12 +2,12 @@ import sys
 import os
 import subprocess
 import shutil
+import tempfile
+import importlib.util
 from pathlib import Path
 
-# 检查 natsort 是否安装
-try:
-    from natsort import natsorted
-except ImportError:
+# 检查 natsort 是否安装（只查找不导入，第一次排序时才导入，加快启动）
+if importlib.util.find_spec('natsort') is None:
     print("错误: 缺少 'natsort' 库。")
     print("请通过 'pip install natsort' 命令安装后重试。")
     sys.exit(1)
@@ -15,9 +15,12 @@ except ImportError:
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QListWidget, QFileDialog, QMessageBox, QComboBox,
-    QLabel, QCheckBox, QTextEdit, QListWidgetItem
+    QLabel, QCheckBox, QListWidgetItem
 )
-from PyQt5.QtCore import Qt, QProcess
+from PyQt5.QtCore import Qt
+
+import ffmpeg_jobs
+import log_sink
 
 class AudioMergerApp(QMainWindow):
     def __init__(self):
@@ -29,8 +32,11 @@ class AudioMergerApp(QMainWindow):
         if not self.check_ffmpeg():
             sys.exit(1) # 如果 ffmpeg 不存在，则退出应用
 
+        # ffmpeg 任务队列，多个任务可同时运行
+        self.jobs = ffmpeg_jobs.JobScheduler(parent=self)
+        self.jobs.job_finished.connect(self.on_job_finished)
+        self.jobs.queue_finished.connect(self.on_queue_finished)
         self.init_ui()
-        self.process = None # 用于执行 ffmpeg 命令
 
     def init_ui(self):
         # 主布局
@@ -89,10 +95,12 @@ class AudioMergerApp(QMainWindow):
         process_layout.addWidget(self.merge_button)
         process_layout.addStretch()
         
+        # --- 任务队列区 ---
+        self.job_panel = ffmpeg_jobs.JobPanel(self.jobs)
+
         # --- 日志输出区 ---
-        self.log_output = QTextEdit()
-        self.log_output.setReadOnly(True)
-        self.log_output.setPlaceholderText("FFmpeg 执行日志和状态信息将显示在这里...")
+        self.log_output = log_sink.create_view("FFmpeg 执行日志和状态信息将显示在这里...")
+        self.log_sink = log_sink.LogSink(self.log_output, file_path=log_sink.log_file_path("audio_process"))
 
         # 添加组件到主布局
         main_layout.addLayout(top_button_layout)
@@ -102,6 +110,8 @@ class AudioMergerApp(QMainWindow):
         main_layout.addSpacing(20)
         main_layout.addLayout(process_layout)
         main_layout.addSpacing(10)
+        main_layout.addWidget(QLabel("任务队列:"))
+        main_layout.addWidget(self.job_panel)
         main_layout.addWidget(QLabel("执行日志:"))
         main_layout.addWidget(self.log_output)
 
@@ -144,6 +154,7 @@ class AudioMergerApp(QMainWindow):
 
     def sort_list(self, reverse=False):
         """对列表中的项进行自然排序"""
+        from natsort import natsorted
         items = [self.audio_list_widget.item(i).text() for i in range(self.audio_list_widget.count())]
         sorted_items = natsorted(items, reverse=reverse)
         self.audio_list_widget.clear()
@@ -176,10 +187,15 @@ class AudioMergerApp(QMainWindow):
                 self.log("操作取消。")
                 return
 
-        # 创建一个临时文件列表供 ffmpeg concat 使用
-        list_file_path = output_dir / "ffmpeg_audio_list.txt"
+        # 创建一个临时文件列表供 ffmpeg concat 使用；文件名唯一，同一文件夹中的多个合并任务互不影响
         try:
-            with open(list_file_path, 'w', encoding='utf-8') as f:
+            fd, list_file_path = tempfile.mkstemp(prefix="ffmpeg_audio_list_", suffix=".txt", dir=output_dir)
+        except OSError as e:
+            self.show_message("错误", f"创建临时文件失败: {e}", QMessageBox.Icon.Critical)
+            return
+        list_file_path = Path(list_file_path)
+        try:
+            with open(fd, 'w', encoding='utf-8') as f:
                 for audio in audios:
                     # 处理路径中的单引号，避免ffmpeg命令出错
                     processed_path = audio.replace("'", "'\\''")
@@ -228,58 +244,39 @@ class AudioMergerApp(QMainWindow):
             if list_file_path.exists():
                 os.remove(list_file_path)
 
-    def run_process(self, command, success_message, cleanup_file=None):
-        """执行外部命令（如 ffmpeg）"""
-        if self.process and self.process.state() == QProcess.ProcessState.Running:
-            self.show_message("请稍候", "另一个任务正在进行中，请等待其完成后再试。", QMessageBox.Icon.Warning)
-            return
-
-        self.log("="*50)
-        self.log(f"执行命令: {' '.join(command)}")
-        self.log("="*50)
-        
-        self.process = QProcess()
-        
-        # 定义完成后的操作
-        def on_finished(exit_code, exit_status):
-            # 清理临时文件
+    def run_process(self, command, success_message, cleanup_file=None, priority=ffmpeg_jobs.PRIORITY_NORMAL):
+        """把外部命令（如 ffmpeg）加入任务队列，多个任务可同时运行"""
+        existing = self.jobs.find_active(command[-1])
+        if existing:
+            # 两个任务同时写同一个输出文件会互相破坏
             if cleanup_file and os.path.exists(cleanup_file):
-                try:
-                    os.remove(cleanup_file)
-                    self.log(f"已清理临时文件: {cleanup_file}")
-                except OSError as e:
-                    self.log(f"清理临时文件失败: {e}")
-
-            if exit_code == 0:
-                self.log(f"\n任务成功完成！\n{'-'*20}")
-                self.show_message("成功", success_message, QMessageBox.Icon.Information)
-            else:
-                error_output = self.process.readAllStandardError().data().decode('utf-8', errors='ignore')
-                self.log(f"\n任务失败！退出代码: {exit_code}\n{'-'*20}")
-                self.log(f"FFmpeg 错误信息:\n{error_output}")
-                self.show_message("失败", f"操作失败，请查看日志获取详细信息。", QMessageBox.Icon.Critical)
-            self.process = None  # 重置 process
-
-        self.process.readyReadStandardOutput.connect(self.handle_stdout)
-        self.process.readyReadStandardError.connect(self.handle_stderr)
-        self.process.finished.connect(on_finished)
-
-        self.process.start(command[0], command[1:])
-
-    def handle_stdout(self):
-        """处理标准输出"""
-        data = self.process.readAllStandardOutput().data().decode('utf-8', errors='ignore')
-        self.log(data.strip())
+                os.remove(cleanup_file)
+            self.show_message("请稍候", f"'{existing.title}' 已在任务队列中，请等待其完成后再试。", QMessageBox.Icon.Warning)
+            return None
+        job = self.jobs.submit(command, success_message, [cleanup_file] if cleanup_file else [], priority)
+        self.log(f"已加入任务队列: {job.title}")
+        return job
+
+    def on_job_finished(self, job):
+        """单个任务结束；完整的 FFmpeg 输出在任务列表中选中该任务查看"""
+        if job.state == ffmpeg_jobs.DONE:
+            self.log(f"任务成功完成: {job.title} ({job.elapsed():.1f} 秒)")
+        elif job.state == ffmpeg_jobs.FAILED:
+            self.log(f"任务失败: {job.title}，退出代码: {job.exit_code}", log_sink.ERROR)
+            self.log(f"FFmpeg 错误信息:\n{job.tail()}", log_sink.ERROR)
+        else:
+            self.log(f"任务已取消: {job.title}")
 
-    def handle_stderr(self):
-        """处理标准错误（ffmpeg 进度信息通常在这里）"""
-        data = self.process.readAllStandardError().data().decode('utf-8', errors='ignore')
-        self.log(data.strip())
+    def on_queue_finished(self, jobs):
+        """队列中的任务全部结束后只提示一次"""
+        ok, message = ffmpeg_jobs.summarize(jobs)
+        if message:
+            self.show_message("成功" if ok else "失败", message,
+                              QMessageBox.Icon.Information if ok else QMessageBox.Icon.Critical)
 
-    def log(self, message):
+    def log(self, message, level=log_sink.INFO):
         """向日志文本框追加信息"""
-        self.log_output.append(message)
-        self.log_output.ensureCursorVisible()  # 滚动到底部
+        self.log_sink.write(message, level)
 
     def show_message(self, title, message, icon):
         """显示一个简单的消息框"""
@@ -290,15 +287,15 @@ class AudioMergerApp(QMainWindow):
         msg_box.exec()
 
     def closeEvent(self, event):
-        """关闭窗口时确认是否有进程在运行"""
-        if self.process and self.process.state() == QProcess.ProcessState.Running:
+        """关闭窗口时确认是否有任务未完成"""
+        if self.jobs.is_busy():
             reply = QMessageBox.question(
-                self, "确认退出", "一个任务正在运行中。确定要强制退出吗？",
+                self, "确认退出", f"还有 {self.jobs.active_count()} 个任务未完成。确定要强制退出吗？",
                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
                 QMessageBox.StandardButton.No
             )
             if reply == QMessageBox.StandardButton.Yes:
-                self.process.kill()
+                self.jobs.shutdown()
                 event.accept()
             else:
                 event.ignore()
@@ -0,0 +1,92 @@
+"""
+AI 简介生成流程的性能测试 (使用 mock_openai_server.py，不消耗真实接口额度)
+
+在临时目录中创建若干假视频文件，用 nfo_core.generate_nfo_files 的 AI 路径对模拟接口
+生成简介，对每组 (并发数, 每批集数) 输出每秒处理集数、请求数以及服务端延迟分位数。
+
+示例:
+    python bench_ai.py --episodes 200 --concurrency 1 8 32 --batch-size 1 10 --latency-dist lognormal
+    python bench_ai.py --base-url http://127.0.0.1:8765/v1   # 使用已启动的模拟接口
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import urllib.request
+
+# 测试时关闭本地缓存，否则第二轮起所有请求都会命中缓存
+os.environ['NFO_AI_CACHE'] = 'off'
+
+import nfo_core
+import mock_openai_server
+
+
+def fetch_stats(base_url, reset=False):
+    root = base_url.rsplit('/v1', 1)[0]
+    if reset:
+        request = urllib.request.Request(root + '/stats/reset', data=b'', method='POST')
+    else:
+        request = urllib.request.Request(root + '/stats')
+    with urllib.request.urlopen(request) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def make_fake_season(folder_path, episodes):
+    for i in range(1, episodes + 1):
+        open(os.path.join(folder_path, f"[P{i:03d}] 第{i}集 模拟标题{i}.mp4"), 'wb').close()
+
+
+def run_once(base_url, episodes, concurrency, batch_size, rpm):
+    folder_path = tempfile.mkdtemp(prefix='bench_ai_')
+    try:
+        make_fake_season(folder_path, episodes)
+        show = dict(nfo_core.DEFAULT_SHOW, title="性能测试", plot="一部用于测试 AI 简介生成吞吐量的模拟电视剧。")
+        ai_settings = {'api_key': 'mock', 'base_url': base_url, 'concurrency': concurrency,
+                       'batch_size': batch_size, 'rpm': rpm}
+        fetch_stats(base_url, reset=True)
+        start = time.perf_counter()
+        summary = nfo_core.generate_nfo_files(folder_path, show, True, ai_settings)
+        elapsed = time.perf_counter() - start
+        stats = fetch_stats(base_url)
+    finally:
+        shutil.rmtree(folder_path, ignore_errors=True)
+    return summary, elapsed, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI 简介生成流程性能测试")
+    parser.add_argument('--episodes', type=int, default=100, help="每轮测试的集数")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16], help="并发数列表")
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[1, 10], help="每批集数列表")
+    parser.add_argument('--rpm', type=int, default=100000, help="客户端每分钟请求上限")
+    parser.add_argument('--base-url', default=None, help="已启动的模拟接口地址 (默认在本进程内启动)")
+    mock_openai_server.add_settings_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = None
+    base_url = args.base_url
+    if not base_url:
+        server, base_url = mock_openai_server.start_server(mock_openai_server.settings_from_args(args))
+
+    print(f"接口: {base_url}  集数: {args.episodes}")
+    print(f"{'并发':>4} {'每批':>4} {'耗时(s)':>8} {'集/秒':>8} {'请求':>6} {'429':>5} {'500':>5} "
+          f"{'AI失败':>6} {'p50(s)':>7} {'p95(s)':>7} {'p99(s)':>7}")
+    try:
+        for batch_size in args.batch_size:
+            for concurrency in args.concurrency:
+                summary, elapsed, stats = run_once(base_url, args.episodes, concurrency, batch_size, args.rpm)
+                print(f"{concurrency:>4} {batch_size:>4} {elapsed:>8.2f} {summary['generated'] / elapsed:>8.1f} "
+                      f"{stats['requests']:>6} {stats['rate_limited']:>5} {stats['errors']:>5} "
+                      f"{summary['ai_failed']:>6} {stats['latency_p50']:>7.3f} {stats['latency_p95']:>7.3f} "
+                      f"{stats['latency_p99']:>7.3f}")
+    finally:
+        if server:
+            server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
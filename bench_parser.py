@@ -0,0 +1,156 @@
+"""
+文件名解析的性能与准确率测试
+
+按固定的随机种子生成文件名语料（默认 100 万个），每个文件名都带有预期的集数、季数和标题，
+分别用 episode_parser.parse_filenames 和原来逐条 re.search 的实现解析，输出耗时和准确率。
+
+示例:
+    python bench_parser.py
+    python bench_parser.py --count 200000 --dump corpus.tsv   # 同时把语料写成 TSV
+    python bench_parser.py --corpus corpus.tsv                # 使用已有语料
+"""
+import os
+import gc
+import re
+import sys
+import time
+import random
+import argparse
+
+import episode_parser
+
+# 词库中不能出现数字以及 [ ] - 等会影响解析的字符
+SHOW_WORDS = ['Python', 'Linear', 'Algebra', 'Deep', 'Learning', 'Data', 'Structures', 'Operating',
+              'Systems', '机器学习', '线性代数', '操作系统', '计算机网络', '数据结构', '英语听力', '高等数学']
+TITLE_WORDS = ['Introduction', 'Overview', 'Vectors', 'Matrices', 'Graphs', 'Trees', 'Sorting', 'Review',
+               'Summary', 'Practice', '导论', '绪论', '矩阵', '向量', '复习', '总结', '习题课', '实验', '答疑']
+EXTENSIONS = ['.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv']
+
+
+def _words(rng, pool, low, high):
+    return ' '.join(rng.choice(pool) for _ in range(rng.randint(low, high)))
+
+
+def make_corpus(count, seed=0):
+    """返回 [(文件名, 集数, 季数, 标题), ...]，未识别的字段为 None"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        show = _words(rng, SHOW_WORDS, 1, 3)
+        title = _words(rng, TITLE_WORDS, 1, 4)
+        n = rng.randint(1, 999)
+        season = rng.randint(1, 12)
+        ext = rng.choice(EXTENSIONS)
+        kind = rng.randrange(7)
+        if kind == 0:
+            corpus.append((f"[P{n:02d}] {title}{ext}", n, None, title))
+        elif kind == 1:
+            corpus.append((f"{show} - E{n:02d} - {title}{ext}", n, None, title))
+        elif kind == 2:
+            corpus.append((f"{show} S{season:02d}E{n:02d} - {title}{ext}", n, season, title))
+        elif kind == 3:
+            corpus.append((f"第{n}集 - {title}{ext}", n, None, title))
+        elif kind == 4:
+            # 开头的序号保留在标题中，由生成 NFO 时再去掉
+            corpus.append((f"{n:02d}. {title}{ext}", n, None, f"{n:02d}. {title}"))
+        elif kind == 5:
+            corpus.append((f"{show} [{n:02d}] {title}{ext}", n, None, title))
+        else:
+            corpus.append((f"{show} - {title}{ext}", None, None, title))
+    return corpus
+
+
+def dump_corpus(corpus, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        for filename, episode, season, title in corpus:
+            f.write(f"{filename}\t{'' if episode is None else episode}\t"
+                    f"{'' if season is None else season}\t{title}\n")
+
+
+def load_corpus(path):
+    corpus = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            filename, episode, season, title = line.rstrip('\n').split('\t')
+            corpus.append((filename, int(episode) if episode else None, int(season) if season else None, title))
+    return corpus
+
+
+LEGACY_PATTERNS = [
+    r'\[P(\d+)\]',
+    r'[._ \-][Ee][Pp]?(\d+)',
+    r'[Ss]\d+[Ee](\d+)',
+    r'\[(\d+)\]',
+    r'第(\d+)[集话]',
+    r'^[^\w]*(\d+)[._ \-]'
+]
+
+
+def legacy_parse(filename):
+    """原来的实现：逐条 re.search，再用 split 截取标题"""
+    episode = None
+    for pattern in LEGACY_PATTERNS:
+        match = re.search(pattern, filename, re.IGNORECASE)
+        if match:
+            try:
+                episode = int(match.groups()[-1])
+                break
+            except (ValueError, IndexError):
+                continue
+    title = os.path.splitext(filename)[0].split(']')[-1].strip()
+    title = title.split('-')[-1].strip()
+    return episode, title
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="文件名解析性能与准确率测试")
+    parser.add_argument('--count', type=int, default=1000000, help="生成的文件名数量")
+    parser.add_argument('--seed', type=int, default=0, help="随机数种子")
+    parser.add_argument('--corpus', default=None, help="从 TSV 文件读取语料 (文件名、集数、季数、标题)")
+    parser.add_argument('--dump', default=None, help="把生成的语料写入 TSV 文件")
+    args = parser.parse_args(argv)
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        corpus = make_corpus(args.count, args.seed)
+    if args.dump:
+        dump_corpus(corpus, args.dump)
+    filenames = [item[0] for item in corpus]
+    print(f"语料: {len(filenames)} 个文件名")
+
+    # 与 timeit 一样在计时期间关闭垃圾回收，避免大量结果对象触发的回收影响比较
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        legacy = [legacy_parse(filename) for filename in filenames]
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        parsed = episode_parser.parse_filenames(filenames)
+        parser_time = time.perf_counter() - start
+    finally:
+        gc.enable()
+
+    legacy_ok = sum(1 for (_, episode, _, title), result in zip(corpus, legacy) if result == (episode, title))
+    parser_ok = sum(1 for (_, episode, season, title), result in zip(corpus, parsed)
+                    if result == (episode, season, title))
+    same = sum(1 for old, new in zip(legacy, parsed) if old == (new.episode, new.title))
+
+    total = len(filenames) or 1
+    print(f"{'实现':<16} {'耗时(s)':>8} {'万个/秒':>8} {'准确率':>8}")
+    print(f"{'逐条 re.search':<16} {legacy_time:>8.2f} {len(filenames) / legacy_time / 10000:>8.1f} "
+          f"{legacy_ok / total:>8.2%}")
+    print(f"{'episode_parser':<16} {parser_time:>8.2f} {len(filenames) / parser_time / 10000:>8.1f} "
+          f"{parser_ok / total:>8.2%}")
+    print(f"两种实现的集数和标题一致: {same / total:.2%}")
+
+    for (filename, episode, season, title), result in zip(corpus, parsed):
+        if result != (episode, season, title):
+            print(f"不符合预期: {filename!r} -> {tuple(result)}，预期 {(episode, season, title)}")
+            break
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
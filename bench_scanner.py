@@ -0,0 +1,92 @@
+"""
+文件夹扫描的性能测试：os.listdir + isfile/getmtime 与 media_scanner (os.scandir) 对比
+
+默认在临时目录中创建 10 万个空文件；用 --path 指定已有文件夹（例如 SMB 挂载的媒体库）
+时不创建文件，直接扫描。每种方式先预热一次再取多次运行的最短时间。
+
+示例:
+    python bench_scanner.py
+    python bench_scanner.py --count 20000 --repeat 5
+    python bench_scanner.py --path /mnt/nas/TV/某部剧
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import media_scanner
+
+VIDEO_EXTENSIONS = ['.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv']
+
+
+def make_files(folder, count):
+    extensions = VIDEO_EXTENSIONS + ['.nfo', '.jpg']
+    for i in range(count):
+        open(os.path.join(folder, f"[P{i:06d}] 测试文件{i}{extensions[i % len(extensions)]}"), 'wb').close()
+
+
+def listdir_names(folder):
+    """原来的写法：listdir 后逐个 isfile，再按扩展名过滤"""
+    return sorted(f for f in os.listdir(folder)
+                  if os.path.isfile(os.path.join(folder, f))
+                  and os.path.splitext(f)[1].lower() in VIDEO_EXTENSIONS)
+
+
+def listdir_mtimes(folder):
+    """原来重命名工具的写法：listdir + isfile，添加时再 getmtime"""
+    files = [os.path.join(folder, f) for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f))]
+    return [(path, os.path.getmtime(path)) for path in files]
+
+
+def scandir_names(folder):
+    return media_scanner.list_files(folder, VIDEO_EXTENSIONS)
+
+
+def scandir_mtimes(folder):
+    return [(entry.path, media_scanner.entry_mtime(entry)) for entry in media_scanner.iter_files(folder)]
+
+
+def best_time(func, folder, repeat):
+    func(folder)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(folder)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(result)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="文件夹扫描性能测试")
+    parser.add_argument('--count', type=int, default=100000, help="在临时目录中创建的文件数")
+    parser.add_argument('--path', default=None, help="扫描已有文件夹，不创建测试文件")
+    parser.add_argument('--repeat', type=int, default=3, help="每种方式的运行次数")
+    args = parser.parse_args(argv)
+
+    folder = args.path
+    created = None
+    if not folder:
+        created = folder = tempfile.mkdtemp(prefix='bench_scanner_')
+        print(f"正在创建 {args.count} 个文件...")
+        make_files(folder, args.count)
+
+    try:
+        print(f"文件夹: {folder}")
+        print(f"{'方式':<28} {'最短耗时(s)':>10} {'结果数':>8}")
+        for label, func in [("listdir + isfile 视频列表", listdir_names),
+                            ("scandir 视频列表", scandir_names),
+                            ("listdir + isfile + getmtime", listdir_mtimes),
+                            ("scandir + 缓存的 stat", scandir_mtimes)]:
+            elapsed, count = best_time(func, folder, args.repeat)
+            print(f"{label:<28} {elapsed:>10.3f} {count:>8}")
+    finally:
+        if created:
+            shutil.rmtree(created, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
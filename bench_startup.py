@@ -0,0 +1,110 @@
+"""
+各工具的启动耗时测试 (基于 python -X importtime)
+
+在子进程中只导入工具脚本本身（不创建窗口、不进入事件循环），输出：
+- 进程启动到导入完成的总时间（多次运行取最短）
+- -X importtime 报告的模块导入耗时
+- 加 --detail 时列出该脚本直接导入的模块中最耗时的几项
+
+打包为 --onefile 的程序每次启动都要先解压再导入，导入的模块越少启动越快。
+测试在当前 Python 环境中进行，未安装的依赖（如 PyQt6、mpv）会显示为导入失败。
+推迟导入前后的基线结果和测试环境见 bench_startup_report.txt。
+
+示例:
+    python bench_startup.py
+    python bench_startup.py nfo_generator_enhance2 nfo_batch --repeat 10 --detail
+"""
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+TOOLS = [
+    'nfo_generator_enhance2', 'nfo_generator', 'nfo_ai', 'AI_nfo', 'AI2', 'nfo_batch', 'nfo_watch',
+    'video_process', 'audio_process', 'youtube-video-merge', 'video_procesee3', 'view_process2', 'video4',
+    'video_crop', 'RENAME', 'rename2', 'rename3',
+]
+
+
+def run_import(module, cwd):
+    """导入一次 module，返回 (总耗时秒, importtime 输出行, 错误信息或 None)"""
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"__import__({module!r})"],
+        cwd=cwd, env=env, capture_output=True, text=True, encoding='utf-8', errors='replace')
+    elapsed = time.perf_counter() - start
+    lines = result.stderr.splitlines()
+    if result.returncode != 0:
+        errors = [line for line in lines if not line.startswith('import time:')]
+        return elapsed, lines, errors[-1] if errors else f"退出码 {result.returncode}"
+    return elapsed, lines, None
+
+
+def parse_importtime(lines):
+    """解析 -X importtime 的输出，返回 [(名称, 嵌套深度, 自身微秒, 累计微秒), ...]"""
+    entries = []
+    for line in lines:
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            entries.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return entries
+
+
+def measure(module, cwd, repeat):
+    best = None
+    for _ in range(repeat):
+        elapsed, lines, error = run_import(module, cwd)
+        if error:
+            return None, None, error
+        if best is None or elapsed < best[0]:
+            best = (elapsed, parse_importtime(lines))
+    return best[0], best[1], None
+
+
+def print_detail(module, entries, top):
+    # importtime 在子模块导入完成后才输出父模块，所以脚本的直接导入是它之前、
+    # 上一个顶层条目之后深度为 1 的条目
+    end = max(i for i, entry in enumerate(entries) if entry[1] == 0 and entry[0] == module)
+    start = end - 1
+    while start >= 0 and entries[start][1] != 0:
+        start -= 1
+    children = [entry for entry in entries[start + 1:end] if entry[1] == 1]
+    children.sort(key=lambda entry: entry[3], reverse=True)
+    for name, _, _, cumulative in children[:top]:
+        print(f"    {name:<40} {cumulative / 1000:>9.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="工具启动耗时测试")
+    parser.add_argument('modules', nargs='*', default=TOOLS, help="要测试的脚本名 (不含 .py)")
+    parser.add_argument('--repeat', type=int, default=5, help="每个脚本的运行次数")
+    parser.add_argument('--detail', action='store_true', help="列出最耗时的直接导入")
+    parser.add_argument('--top', type=int, default=8, help="--detail 时列出的项数")
+    args = parser.parse_args(argv)
+
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    baseline, _, _ = measure('os', cwd, args.repeat)
+    print(f"Python {sys.version.split()[0]}，空解释器启动 {baseline * 1000:.0f} ms")
+    print(f"{'脚本':<26} {'总耗时(ms)':>10} {'导入(ms)':>10}")
+    for module in args.modules:
+        elapsed, entries, error = measure(module, cwd, args.repeat)
+        if error:
+            print(f"{module:<26} 导入失败: {error}")
+            continue
+        top_level = [entry for entry in entries if entry[1] == 0 and entry[0] == module]
+        import_ms = top_level[-1][3] / 1000 if top_level else 0.0
+        print(f"{module:<26} {elapsed * 1000:>10.0f} {import_ms:>10.1f}")
+        if args.detail and top_level:
+            print_detail(module, entries, args.top)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+"""
+合并前检查：输入文件能否直接用 concat 流复制拼接
+
+concat 分离器加 -c copy 要求所有文件的编码、分辨率、像素格式、帧率、时间基和音频参数一致，
+否则合并结果会花屏、音画不同步或中途停止，而 ffmpeg 不一定报错。
+
+plan_concat 并行探测所有输入 (media_probe.probe_files，结果有缓存)，按这些参数分组，
+以文件数最多的一组为目标（数量相同时取列表中靠前的文件所在的组）。其他文件生成一个转换命令，
+转换为目标参数后再和其余文件一起流复制拼接，只有与大多数文件不同的文件需要转码：
+- 只有时间基不同时只重新封装 (-c copy)，不转码
+- 视频参数相同而音频不同时只转换音频，反之只转换视频
+- 缺少音轨的文件补一段静音
+
+plan_concat 会运行 ffprobe，每个文件最长等待 media_probe.PROBE_TIMEOUT 秒，应在后台线程中调用
+(如 JobScheduler.run_in_background)；prepare 根据检查结果创建临时文件并生成转换命令，在界面线程中调用。
+转换命令由调用方加入 ffmpeg_jobs.JobScheduler 并行执行，合并任务用 after 等待它们完成。
+"""
+import os
+import logging
+import tempfile
+from collections import Counter
+from fractions import Fraction
+
+import media_probe
+
+# 目标编码对应的 ffmpeg 编码器；不在表中的编码无法转换，这些文件只能按原样拼接
+VIDEO_ENCODERS = {
+    'h264': 'libx264', 'hevc': 'libx265', 'mpeg4': 'mpeg4', 'mpeg2video': 'mpeg2video',
+    'vp8': 'libvpx', 'vp9': 'libvpx-vp9', 'av1': 'libsvtav1',
+}
+AUDIO_ENCODERS = {
+    'aac': 'aac', 'mp3': 'libmp3lame', 'opus': 'libopus', 'vorbis': 'libvorbis',
+    'ac3': 'ac3', 'eac3': 'eac3', 'flac': 'flac',
+}
+# x264/x265 转换离群文件时的画质，数值越小画质越高
+NORMALIZE_CRF = '18'
+# 只有 MP4/MOV 可以指定视频轨道的时间基
+MOV_EXTENSIONS = ('.mp4', '.m4v', '.mov')
+
+
+def stream_profile(summary):
+    """
+    决定能否流复制拼接的参数：(视频参数, 音频参数)，没有视频或音频时对应项为 None。
+
+    视频参数为 (编码, 宽, 高, 像素格式, 帧率, 时间基)，音频参数为 (编码, 采样率, 声道数, 声道布局)，
+    只比较第一个视频流和第一个音频流。无法探测时返回 None。
+    """
+    if not summary:
+        return None
+    video = summary['video'][0] if summary.get('video') else None
+    audio = summary['audio'][0] if summary.get('audio') else None
+    if video:
+        video = (video.get('codec'), video.get('width'), video.get('height'), video.get('pix_fmt'),
+                 video.get('fps'), video.get('time_base'))
+    if audio:
+        audio = (audio.get('codec'), audio.get('sample_rate'), audio.get('channels'), audio.get('channel_layout'))
+    return video, audio
+
+
+def _fps_text(fps):
+    try:
+        return f"{float(Fraction(fps)):.3g}fps"
+    except (TypeError, ValueError, ZeroDivisionError):
+        return "?fps"
+
+
+def describe_profile(profile):
+    video, audio = profile
+    parts = []
+    if video:
+        codec, width, height, pix_fmt, fps, _ = video
+        parts.append(f"{codec} {width}x{height} {pix_fmt} {_fps_text(fps)}")
+    if audio:
+        codec, sample_rate, channels, _ = audio
+        parts.append(f"{codec} {sample_rate}Hz {channels}声道")
+    return " / ".join(parts) or "无音视频流"
+
+
+def can_convert(source, target):
+    """
+    source 能否转换为 target：目标编码需要有对应的编码器且参数完整，目标有视频时源文件也必须有视频
+    """
+    source_video, source_audio = source
+    target_video, target_audio = target
+    if target_video and not source_video:
+        return False
+    if target_video and source_video[:5] != target_video[:5]:
+        if target_video[0] not in VIDEO_ENCODERS or not all(target_video[1:5]):
+            return False
+    if target_audio and source_audio != target_audio:
+        if target_audio[0] not in AUDIO_ENCODERS or not all(target_audio[1:3]):
+            return False
+    return True
+
+
+def normalize_command(path, source, target, output_path):
+    """把 path (参数为 source) 转换为 target 参数的 ffmpeg 命令；只转换不一致的流"""
+    source_video, source_audio = source
+    target_video, target_audio = target
+    command = ['ffmpeg', '-i', path]
+    if target_audio and not source_audio:
+        codec, sample_rate, channels, layout = target_audio
+        command += ['-f', 'lavfi', '-i', f"anullsrc=channel_layout={layout or 'stereo'}:sample_rate={sample_rate}"]
+
+    if target_video:
+        command += ['-map', '0:v:0']
+        if source_video[:5] == target_video[:5]:
+            command += ['-c:v', 'copy']
+        else:
+            codec, width, height, pix_fmt, fps, _ = target_video
+            # 保持画面比例缩放，不足的部分加黑边
+            filters = [f"scale={width}:{height}:force_original_aspect_ratio=decrease",
+                       f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2", "setsar=1", f"fps={fps}"]
+            command += ['-vf', ",".join(filters), '-c:v', VIDEO_ENCODERS[codec], '-pix_fmt', pix_fmt]
+            if codec in ('h264', 'hevc'):
+                command += ['-crf', NORMALIZE_CRF, '-preset', 'medium']
+        time_base = target_video[5]
+        if time_base and os.path.splitext(output_path)[1].lower() in MOV_EXTENSIONS:
+            command += ['-video_track_timescale', str(Fraction(time_base).denominator)]
+    else:
+        command += ['-vn']
+
+    if target_audio:
+        if source_audio:
+            command += ['-map', '0:a:0']
+        else:
+            command += ['-map', '1:a:0', '-shortest']
+        if source_audio == target_audio:
+            command += ['-c:a', 'copy']
+        else:
+            codec, sample_rate, channels, layout = target_audio
+            command += ['-c:a', AUDIO_ENCODERS[codec], '-ar', str(sample_rate), '-ac', str(channels)]
+    else:
+        command += ['-an']
+    return command + ['-y', output_path]
+
+
+class ConcatPlan:
+    """
+    一次合并的检查结果。
+
+    profile 为目标参数，outliers 为需要转换的文件，unfixable 为参数不同但无法转换的文件，
+    unknown 为无法探测的文件；后两者按原样拼接。
+    """
+
+    def __init__(self, paths, profiles):
+        self.paths = list(paths)
+        self.profiles = profiles
+        known = [profiles[path] for path in self.paths if profiles.get(path)]
+        self.profile = Counter(known).most_common(1)[0][0] if known else None
+        self.unknown = [path for path in self.paths if not profiles.get(path)]
+        self.outliers = []
+        self.unfixable = []
+        for path in dict.fromkeys(self.paths):
+            profile = profiles.get(path)
+            if not profile or profile == self.profile:
+                continue
+            if can_convert(profile, self.profile):
+                self.outliers.append(path)
+            else:
+                self.unfixable.append(path)
+        # 转换后的文件使用目标参数的文件的容器格式
+        self.extension = next((os.path.splitext(path)[1] for path in self.paths
+                               if profiles.get(path) == self.profile), '.mkv')
+
+
+def plan_concat(paths, workers=media_probe.DEFAULT_WORKERS):
+    """并行探测 paths，返回 ConcatPlan；未安装 ffprobe 时所有文件都是 unknown。会阻塞，不要在界面线程中调用"""
+    summaries = media_probe.probe_files(list(dict.fromkeys(paths)), workers)
+    return ConcatPlan(paths, {path: stream_profile(summary) for path, summary in summaries.items()})
+
+
+def prepare(plan, output_dir, log):
+    """
+    根据 plan_concat 的结果为需要转换的文件生成命令。
+
+    返回 (拼接使用的文件列表, [(任务标题, 转换命令), ...], 临时文件列表)。转换结果写入 output_dir 中的
+    临时文件，合并结束后由调用方删除；创建临时文件失败时抛出 OSError。
+    log(message, level) 用于输出检查结果，level 为 logging 模块的级别。
+    """
+    paths = plan.paths
+    if plan.unknown:
+        log(f"无法读取 {len(plan.unknown)} 个文件的编码参数，按原样合并: "
+            + ", ".join(os.path.basename(path) for path in plan.unknown), logging.WARNING)
+    if plan.unfixable:
+        log(f"{len(plan.unfixable)} 个文件的编码参数不同但无法自动转换，按原样合并，结果可能有问题: "
+            + ", ".join(os.path.basename(path) for path in plan.unfixable), logging.WARNING)
+    if not plan.outliers:
+        return list(paths), [], []
+
+    log(f"{len(plan.outliers)} 个文件与其他文件的编码参数不同，先转换为 {describe_profile(plan.profile)} 再合并")
+    temp_files = {}
+    try:
+        for path in plan.outliers:
+            fd, temp_path = tempfile.mkstemp(prefix="ffmpeg_norm_", suffix=plan.extension, dir=output_dir)
+            os.close(fd)
+            temp_files[path] = temp_path
+    except OSError:
+        for temp_path in temp_files.values():
+            os.remove(temp_path)
+        raise
+    conversions = []
+    for path, temp_path in temp_files.items():
+        log(f"  {os.path.basename(path)}: {describe_profile(plan.profiles[path])}")
+        conversions.append((f"转换 {os.path.basename(path)}",
+                            normalize_command(path, plan.profiles[path], plan.profile, temp_path)))
+    return [temp_files.get(path, path) for path in paths], conversions, list(temp_files.values())
@@ -0,0 +1,89 @@
+"""
+视频文件名解析 (集数、季数、本集标题)
+
+所有识别规则按优先级编译成一个带命名分组的正则表达式，finditer 扫描一遍文件名，
+取命中规则中优先级最高的一个。各条规则的匹配不会互相嵌套，因此结果与逐条 re.search 一致。
+parse_filenames / parse_directory 一次解析整个文件列表。
+"""
+import os
+import re
+from collections import namedtuple
+
+import media_scanner
+
+ParsedName = namedtuple('ParsedName', ['episode', 'season', 'title'])
+
+# (分组名, 规则)，按优先级排列；规则中集数的分组必须与分组名同名
+EPISODE_RULES = [
+    ('bracket_p', r'\[P(?P<bracket_p>\d+)\]'),              # [P01]
+    ('ep', r'[._ \-][Ee][Pp]?(?P<ep>\d+)'),                 # E01, Ep01, ep01, -E01
+    ('sxe', r'[Ss](?P<sxe_season>\d+)[Ee](?P<sxe>\d+)'),    # S01E01
+    ('bracket', r'\[(?P<bracket>\d+)\]'),                   # [01]
+    ('cn', r'第(?P<cn>\d+)[集话]'),                          # 第1集, 第1话
+]
+# 只在文件名开头匹配：01. xxx, 01-xxx, 01 xxx；分隔符用前瞻，不占用后面 E01 之类的匹配
+LEADING_RULE = ('lead', r'[^\w]*(?P<lead>\d+)(?=[._ \-])')
+# 优先级最低：前面没有分隔符的 E01 (Show.E05 之外的 ShowE05)，与旧版规则一样区分大小写，
+# 避免把单词中的小写 e 加数字当作集数
+FALLBACK_RULE = ('bare_e', r'(?-i:E)(?P<bare_e>\d+)')
+
+_EPISODE_RE = re.compile(
+    '|'.join(f'(?:{rule})' for _, rule in EPISODE_RULES) + f'|^{LEADING_RULE[1]}|{FALLBACK_RULE[1]}',
+    re.IGNORECASE | re.DOTALL)
+# 集数分组的编号 -> 规则优先级 (数值越小越优先)
+_PRIORITY = {_EPISODE_RE.groupindex[name]: priority
+             for priority, name in enumerate([name for name, _ in EPISODE_RULES] + [LEADING_RULE[0], FALLBACK_RULE[0]])}
+_SEASON_GROUP = _EPISODE_RE.groupindex['sxe_season']
+_SXE_GROUP = _EPISODE_RE.groupindex['sxe']
+
+
+def _parse(base_name, filename, finditer=_EPISODE_RE.finditer):
+    best = None
+    best_priority = len(_PRIORITY)
+    for match in finditer(filename):
+        # 集数分组都是各条规则的最后一个分组，lastindex 即可区分命中的规则
+        priority = _PRIORITY[match.lastindex]
+        if priority < best_priority:
+            best, best_priority = match, priority
+            if priority == 0:
+                break
+    episode = season = None
+    if best is not None:
+        episode = int(best.group(best.lastindex))
+        # 季数只在按 SxxEyy 识别集数时给出
+        if best.lastindex == _SXE_GROUP:
+            season = int(best.group(_SEASON_GROUP))
+    # 本集标题: 最后一个 ']' 之后、再取最后一个 '-' 之后的部分
+    title = base_name.rpartition(']')[2].rpartition('-')[2].strip()
+    return ParsedName(episode, season, title)
+
+
+def parse_filename(filename):
+    """解析单个文件名（可带扩展名），返回 ParsedName(episode, season, title)，未识别的字段为 None"""
+    return _parse(os.path.splitext(filename)[0], filename)
+
+
+def parse_filenames(filenames):
+    """批量解析文件名列表，返回与输入顺序对应的 ParsedName 列表"""
+    splitext = os.path.splitext
+    return [_parse(splitext(filename)[0], filename) for filename in filenames]
+
+
+def parse_directory(folder_path, extensions=None):
+    """
+    解析文件夹（不递归）中的所有文件，返回按文件名排序的 [(文件名, ParsedName), ...]。
+
+    extensions 为扩展名列表（如 ['.mp4']），None 表示不过滤。
+    """
+    filenames = media_scanner.list_files(folder_path, extensions)
+    return list(zip(filenames, parse_filenames(filenames)))
+
+
+def extract_episode_number(filename):
+    """从文件名中提取集数，未识别时返回 None"""
+    return parse_filename(filename).episode
+
+
+def extract_title(filename):
+    """从文件名中提取本集标题"""
+    return parse_filename(filename).title
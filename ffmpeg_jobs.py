@@ -0,0 +1,830 @@
+"""
+ffmpeg 任务队列
+
+各视频工具原来一次只能运行一个 ffmpeg，正在运行时拒绝新的任务。JobScheduler 把命令放进
+按优先级排列的队列（同优先级先提交先运行），最多同时运行 max_workers 个 QProcess，
+默认数量按 CPU 核心数决定。每个任务有自己的状态（排队中/运行中/完成/失败/已取消）
+和输出日志，可以单独取消。任务可以指定要等待的其他任务 (after)，例如先转换再合并；
+run_in_background 在后台线程中做准备工作（如探测输入），完成后在界面线程中回调再提交任务。JobPanel 是显示任务列表和所选任务日志的控件，
+并用进度条显示当前这一批任务的完成数和预计剩余时间。
+
+ffmpeg 命令会自动加上 -progress pipe:1 -nostats -loglevel warning：标准输出是结构化的
+进度 (out_time_us、speed、total_size 等)，由 FFmpegProgress 解析；标准错误只剩警告和错误，
+记入任务日志。任务开始时在后台用 ffprobe 探测输入时长 (见 media_probe.py)，
+据此计算每个任务的百分比和剩余时间。
+
+PyQt5 和 PyQt6 的工具都可以使用 (见 qt_compat.py)。
+"""
+import os
+import re
+import time
+import heapq
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import media_probe
+from qt_compat import (
+    QAbstractItemView, QHBoxLayout, QHeaderView, QLabel, QMessageBox, QObject, QPlainTextEdit, QProcess,
+    QProgressBar, QPushButton, QSpinBox, QSplitter, Qt, QTableWidget, QTableWidgetItem, QTimer, QVBoxLayout,
+    QWidget, pyqtSignal,
+)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+STATE_LABELS = {QUEUED: "排队中", RUNNING: "运行中", DONE: "完成", FAILED: "失败", CANCELLED: "已取消"}
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+# ask_overwrite_policy 的返回值
+OVERWRITE = 'overwrite'
+SKIP = 'skip'
+# 询问时最多列出的已存在文件数
+MAX_LISTED_FILES = 10
+
+# 加在 ffmpeg 命令中的参数：进度写到标准输出，标准错误只保留警告和错误
+PROGRESS_ARGS = ['-progress', 'pipe:1', '-nostats']
+LOG_LEVEL_ARGS = ['-hide_banner', '-loglevel', 'warning']
+
+# 每个任务保留的日志行数
+LOG_LINES = 2000
+MAX_DEFAULT_WORKERS = 8
+# 关闭窗口时等待被结束的 ffmpeg 退出的时间 (毫秒)
+SHUTDOWN_WAIT_MS = 3000
+
+_LINE_BREAK = re.compile(r'[\r\n]+')
+
+
+def format_seconds(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600} 小时 {seconds % 3600 // 60} 分"
+    if seconds >= 60:
+        return f"{seconds // 60} 分 {seconds % 60} 秒"
+    return f"{seconds} 秒"
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def is_ffmpeg(command):
+    return bool(command) and os.path.splitext(os.path.basename(str(command[0])))[0].lower() == 'ffmpeg'
+
+
+def with_progress(command):
+    """
+    在 ffmpeg 命令的程序名之后加上 PROGRESS_ARGS 和 LOG_LEVEL_ARGS，返回新的列表。
+
+    不是 ffmpeg 的命令原样返回；命令中已经指定了 -progress 或日志级别时不重复添加。
+    """
+    command = [str(arg) for arg in command]
+    if not is_ffmpeg(command):
+        return command
+    extra = []
+    if '-progress' not in command:
+        extra += PROGRESS_ARGS
+    if '-loglevel' not in command and '-v' not in command:
+        extra += LOG_LEVEL_ARGS
+    return command[:1] + extra + command[1:]
+
+
+def parse_time(value):
+    """ffmpeg 的时间参数：秒数或 [HH:]MM:SS[.xxx]，无法解析时返回 None"""
+    seconds = 0.0
+    try:
+        for part in str(value).split(':'):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        return None
+    return seconds
+
+
+def _concat_token(text):
+    """按 ffmpeg 的规则解析 concat 列表中 file 之后的路径：单引号内原样保留，引号外的反斜杠转义下一个字符"""
+    token = []
+    quoted = False
+    chars = iter(text.strip())
+    for char in chars:
+        if quoted:
+            if char == "'":
+                quoted = False
+            else:
+                token.append(char)
+        elif char == "'":
+            quoted = True
+        elif char == '\\':
+            token.append(next(chars, ''))
+        elif char in ' \t':
+            break
+        else:
+            token.append(char)
+    return ''.join(token)
+
+
+def read_concat_list(list_path):
+    """返回 concat 列表文件中的文件路径"""
+    paths = []
+    try:
+        with open(list_path, encoding='utf-8') as f:
+            for line in f:
+                directive, _, rest = line.strip().partition(' ')
+                if directive == 'file' and rest:
+                    paths.append(_concat_token(rest))
+    except OSError:
+        pass
+    return paths
+
+
+def command_inputs(command):
+    """返回 (ffmpeg 命令的输入文件列表, 是否为 concat 合并)；concat 列表展开为其中的文件"""
+    inputs = []
+    concat = False
+    input_format = None
+    args = iter(command[1:])
+    for arg in args:
+        if arg == '-f':
+            input_format = next(args, None)
+        elif arg == '-i':
+            path = next(args, None)
+            if path is None:
+                break
+            if input_format == 'concat':
+                concat = True
+                inputs.extend(read_concat_list(path))
+            else:
+                inputs.append(path)
+            input_format = None
+    return inputs, concat
+
+
+def estimate_duration(command, cache=None):
+    """
+    估算 ffmpeg 命令输出的时长 (秒)，用于计算进度百分比；无法估算时返回 None。
+
+    指定了 -t 或 -ss/-to 时按裁切范围计算，concat 合并为各文件时长之和，
+    其他情况取最长的输入。会运行 ffprobe，不要在界面线程中对大量命令调用。
+    """
+    options = {}
+    for option, value in zip(command, command[1:]):
+        if option in ('-t', '-ss', '-to'):
+            options[option] = parse_time(value)
+    if options.get('-t'):
+        return options['-t']
+    if options.get('-to'):
+        return max(0.0, options['-to'] - (options.get('-ss') or 0.0))
+    inputs, concat = command_inputs(command)
+    if not inputs or not media_probe.is_available():
+        return None
+    if cache is None:
+        cache = media_probe.get_default_cache()
+    durations = [media_probe.probe_duration(path, cache) for path in inputs]
+    if concat:
+        return sum(durations) if all(durations) else None
+    return max([d for d in durations if d], default=None)
+
+
+class FFmpegProgress:
+    """
+    解析 ffmpeg -progress 输出的 key=value 行。
+
+    每组以 progress=continue 或 progress=end 结束；duration 为输出的预计时长 (秒)，
+    未知时只能显示已处理的时长，不能计算百分比和剩余时间。
+    """
+
+    def __init__(self, duration=None):
+        self.duration = duration
+        self.values = {}
+        self.position = 0.0
+        self.speed = None
+        self.total_size = None
+        self.ended = False
+        self._partial = ''
+
+    def feed(self, text):
+        """加入一段标准输出，收到一组完整的进度时返回 True"""
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        updated = False
+        for line in lines:
+            key, sep, value = line.strip().partition('=')
+            if not sep:
+                continue
+            self.values[key] = value.strip()
+            if key == 'progress':
+                self._update()
+                self.ended = value.strip() == 'end'
+                updated = True
+        return updated
+
+    def _update(self):
+        # 旧版本 ffmpeg 的 out_time_ms 实际上也是微秒；开头几组可能是 N/A 或负数
+        try:
+            self.position = max(0.0, int(self.values.get('out_time_us') or self.values.get('out_time_ms')) / 1e6)
+        except (TypeError, ValueError):
+            pass
+        try:
+            self.speed = float(self.values.get('speed', '').rstrip('x'))
+        except ValueError:
+            self.speed = None
+        try:
+            self.total_size = int(self.values.get('total_size'))
+        except (TypeError, ValueError):
+            pass
+
+    def percent(self):
+        if self.ended:
+            return 100.0
+        if not self.duration:
+            return None
+        return min(100.0, self.position * 100 / self.duration)
+
+    def eta(self):
+        """按当前编码速度估算的剩余秒数，未知时返回 None"""
+        if not self.duration or not self.speed:
+            return None
+        return max(0.0, self.duration - self.position) / self.speed
+
+    def speed_text(self):
+        """编码速度 (相对于实时的倍数)、帧率和已写入的大小"""
+        parts = []
+        if self.speed:
+            parts.append(f"{self.speed:.2f}x")
+        try:
+            fps = float(self.values.get('fps', 0))
+        except ValueError:
+            fps = 0
+        if fps:
+            parts.append(f"{fps:.0f} fps")
+        if self.total_size:
+            parts.append(format_size(self.total_size))
+        return "  ".join(parts)
+
+    def describe(self):
+        percent = self.percent()
+        if percent is None:
+            return f"已处理 {format_seconds(self.position)}"
+        eta = self.eta()
+        if eta is None or self.ended:
+            return f"{percent:.0f}%"
+        return f"{percent:.0f}% 剩余 {format_seconds(eta)}"
+
+
+def default_workers():
+    """ffmpeg 编码本身是多线程的，流复制主要受磁盘限制，默认同时运行 CPU 核心数一半的任务 (1~8 个)"""
+    return max(1, min(MAX_DEFAULT_WORKERS, (os.cpu_count() or 2) // 2))
+
+
+class FFmpegJob:
+    """一个外部命令任务；由 JobScheduler.submit 创建"""
+
+    def __init__(self, job_id, command, title, priority, success_message=None, cleanup_files=(), after=()):
+        self.id = job_id
+        self.command = with_progress(command)
+        self.title = title
+        self.priority = priority
+        self.success_message = success_message
+        self.cleanup_files = [str(path) for path in cleanup_files]
+        self.after = list(after)
+        self.state = QUEUED
+        self.exit_code = None
+        self.error = None
+        self.log = deque(maxlen=LOG_LINES)
+        self.started = None
+        self.finished = None
+        self.process = None
+        self.cancel_requested = False
+        self.progress = FFmpegProgress() if is_ffmpeg(self.command) else None
+        self._partial = {}
+
+    @property
+    def output_path(self):
+        """ffmpeg 命令的最后一个参数是输出文件"""
+        return self.command[-1]
+
+    def is_active(self):
+        return self.state in (QUEUED, RUNNING)
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def log_text(self):
+        return "\n".join(self.log)
+
+    def tail(self, lines=20):
+        """最后几行输出，用于失败时的错误信息"""
+        return "\n".join(list(self.log)[-lines:])
+
+    def add_output(self, channel, text, final=False):
+        """按行 (\\r 或 \\n) 切分输出并记入日志，返回新的完整行；未结束的一行留到下次"""
+        text = self._partial.pop(channel, '') + text
+        lines = _LINE_BREAK.split(text)
+        if not final:
+            self._partial[channel] = lines.pop()
+        lines = [line for line in lines if line.strip()]
+        self.log.extend(lines)
+        return lines
+
+
+class JobScheduler(QObject):
+    job_added = pyqtSignal(object)
+    job_changed = pyqtSignal(object)  # 状态变化
+    job_output = pyqtSignal(object, str)  # 任务, 新的输出行
+    job_progress = pyqtSignal(object)  # ffmpeg 报告了新的进度
+    job_finished = pyqtSignal(object)
+    queue_finished = pyqtSignal(list)  # 队列全部结束，参数为这一批提交的任务
+    # 后台线程发出，经队列连接在界面线程中调用回调：(callback, 结果, 异常)
+    _background_done = pyqtSignal(object, object, object)
+
+    def __init__(self, max_workers=None, parent=None):
+        super().__init__(parent)
+        self.max_workers = max(1, max_workers or default_workers())
+        self.jobs = []
+        self._queue = []
+        self._running = []
+        self._batch = []
+        self._batch_started = None
+        self._ids = itertools.count(1)
+        # 已结束但依赖的任务还在写入临时文件，等它们结束后再清理
+        self._deferred_cleanup = []
+        self._closed = False
+        # 在后台探测输入时长，不阻塞界面
+        self._probe_pool = ThreadPoolExecutor(max_workers=media_probe.DEFAULT_WORKERS)
+        self._background_done.connect(self._on_background_done)
+
+    def submit(self, command, success_message=None, cleanup_files=(), priority=PRIORITY_NORMAL, title=None,
+               after=()):
+        """
+        把命令加入队列，返回 FFmpegJob。
+
+        cleanup_files 中的文件在任务结束（包括失败和取消）后删除；
+        priority 越大越先运行，title 默认为输出文件名。
+        after 中的任务全部完成后才开始运行，其中有任务失败或被取消时这个任务也被取消。
+        after 中的任务只为这个任务服务（如合并前的转换）：这个任务被取消时，其余未结束的也被取消，
+        cleanup_files 等它们全部结束后才删除。
+        """
+        job = FFmpegJob(next(self._ids), command, title or os.path.basename(str(command[-1])), priority,
+                        success_message, cleanup_files, after)
+        self.jobs.append(job)
+        if not self._batch:
+            self._batch_started = time.time()
+        self._batch.append(job)
+        heapq.heappush(self._queue, (-priority, job.id, job))
+        self.job_added.emit(job)
+        self._start_next()
+        return job
+
+    def run_in_background(self, func, callback):
+        """
+        在线程池中运行 func()，结束后在界面线程中调用 callback(结果, 异常)，成功时异常为 None。
+
+        用于提交任务前的准备工作（如用 ffprobe 检查输入），不阻塞界面；窗口关闭后不再回调。
+        """
+        def run():
+            try:
+                result, error = func(), None
+            except Exception as e:
+                result, error = None, e
+            try:
+                self._background_done.emit(callback, result, error)
+            except RuntimeError:
+                # 窗口已关闭，调度器已被销毁
+                pass
+        self._probe_pool.submit(run)
+
+    def _on_background_done(self, callback, result, error):
+        if not self._closed:
+            callback(result, error)
+
+    def find_active(self, output_path):
+        """返回输出到 output_path 且尚未结束的任务，没有时返回 None"""
+        output_path = os.path.abspath(str(output_path))
+        for job in self.jobs:
+            if job.is_active() and os.path.abspath(job.output_path) == output_path:
+                return job
+        return None
+
+    def active_count(self):
+        return sum(job.is_active() for job in self.jobs)
+
+    def is_busy(self):
+        return self.active_count() > 0
+
+    def batch_progress(self):
+        """
+        当前这一批任务的进度，返回 (已结束数, 总数, 预计剩余秒数或 None)。
+
+        队列为空后开始的新提交算作新的一批；剩余时间按已结束任务的平均速度估算。
+        """
+        total = len(self._batch)
+        finished = sum(not job.is_active() for job in self._batch)
+        remaining = None
+        if finished and finished < total:
+            remaining = (time.time() - self._batch_started) / finished * (total - finished)
+        return finished, total, remaining
+
+    def set_max_workers(self, max_workers):
+        self.max_workers = max(1, max_workers)
+        self._start_next()
+
+    def cancel(self, job):
+        """取消排队中的任务，或结束正在运行的 ffmpeg"""
+        if job.state == QUEUED:
+            self._finish(job, CANCELLED, start_next=False)
+            self._cancel_dependencies(job)
+            self._start_next()
+        elif job.state == RUNNING and not job.cancel_requested:
+            job.cancel_requested = True
+            job.log.append("正在取消...")
+            job.process.kill()
+
+    def cancel_all(self):
+        # 先取消排队中的任务，避免结束运行中的任务后又启动新的
+        for job in [job for job in self.jobs if job.state == QUEUED]:
+            self.cancel(job)
+        for job in list(self._running):
+            self.cancel(job)
+
+    def shutdown(self):
+        """关闭窗口时调用：取消所有任务并等待 ffmpeg 退出"""
+        self._closed = True
+        running = list(self._running)
+        self.cancel_all()
+        for job in running:
+            if job.process is not None:
+                job.process.waitForFinished(SHUTDOWN_WAIT_MS)
+        self._probe_pool.shutdown(wait=False)
+
+    def clear_finished(self):
+        """从任务列表中移除已结束的任务"""
+        self.jobs = [job for job in self.jobs if job.is_active()]
+
+    def _start_next(self):
+        waiting = []
+        while len(self._running) < self.max_workers and self._queue:
+            entry = heapq.heappop(self._queue)
+            job = entry[2]
+            # 排队时已取消的任务留在堆中，到这里才丢弃
+            if job.state != QUEUED:
+                continue
+            if any(dependency.state in (FAILED, CANCELLED) for dependency in job.after):
+                job.log.append("等待的任务未成功完成")
+                self._finish(job, CANCELLED, start_next=False)
+                self._cancel_dependencies(job)
+            elif any(dependency.is_active() for dependency in job.after):
+                # 依赖的任务结束时会再次调用 _start_next
+                waiting.append(entry)
+            else:
+                self._start(job)
+        for entry in waiting:
+            heapq.heappush(self._queue, entry)
+        if not self._running and not self._queue and self._batch:
+            batch, self._batch = self._batch, []
+            self.queue_finished.emit(batch)
+
+    def _cancel_dependencies(self, job):
+        """job 已取消后取消它仍未结束的依赖任务；这里不启动新任务，由调用方负责"""
+        for dependency in job.after:
+            if dependency.state == QUEUED:
+                dependency.log.append(f"等待它的任务 '{job.title}' 已取消")
+                self._finish(dependency, CANCELLED, start_next=False)
+            elif dependency.state == RUNNING:
+                self.cancel(dependency)
+
+    def _start(self, job):
+        process = QProcess(self)
+        job.process = process
+        job.state = RUNNING
+        job.started = time.time()
+        job.log.append(f"执行命令: {' '.join(job.command)}")
+        self._running.append(job)
+        process.readyReadStandardOutput.connect(
+            lambda: self._read(job, 'stdout', process.readAllStandardOutput()))
+        process.readyReadStandardError.connect(
+            lambda: self._read(job, 'stderr', process.readAllStandardError()))
+        process.finished.connect(lambda exit_code, exit_status: self._on_finished(job, exit_code, exit_status))
+        process.errorOccurred.connect(lambda error: self._on_error(job, error))
+        self.job_changed.emit(job)
+        if job.progress is not None and job.progress.duration is None:
+            self._probe_pool.submit(self._estimate_duration, job)
+        process.start(job.command[0], job.command[1:])
+
+    def _estimate_duration(self, job):
+        # 在线程池中运行；只写入 job.progress.duration，由界面线程在下次进度更新时读取
+        try:
+            job.progress.duration = estimate_duration(job.command)
+        except Exception as e:
+            job.log.append(f"无法获取输入时长: {e}")
+
+    def _read(self, job, channel, data, final=False):
+        text = data.data().decode('utf-8', errors='ignore')
+        if channel == 'stdout' and job.progress is not None:
+            # -progress pipe:1 的输出只用于更新进度，不记入日志
+            if job.progress.feed(text):
+                self.job_progress.emit(job)
+            return
+        lines = job.add_output(channel, text, final)
+        if lines:
+            self.job_output.emit(job, "\n".join(lines))
+
+    def _on_error(self, job, error):
+        # 无法启动时不会再有 finished 信号；其他错误（如被结束）之后仍会收到 finished
+        if error == QProcess.ProcessError.FailedToStart:
+            job.error = job.process.errorString()
+            job.log.append(f"无法启动: {job.error}")
+            self._finish(job, FAILED)
+
+    def _on_finished(self, job, exit_code, exit_status):
+        process = job.process
+        if process is None:
+            return
+        self._read(job, 'stdout', process.readAllStandardOutput(), final=True)
+        self._read(job, 'stderr', process.readAllStandardError(), final=True)
+        job.exit_code = exit_code
+        if job.cancel_requested:
+            state = CANCELLED
+        elif exit_code == 0 and exit_status == QProcess.ExitStatus.NormalExit:
+            state = DONE
+        else:
+            state = FAILED
+        self._finish(job, state)
+
+    def _cleanup(self, job):
+        for path in job.cleanup_files:
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    job.log.append(f"清理临时文件失败: {e}")
+
+    def _finish(self, job, state, start_next=True):
+        if job.state in FINISHED_STATES:
+            return
+        job.state = state
+        job.finished = time.time()
+        if job in self._running:
+            self._running.remove(job)
+        if job.process is not None:
+            job.process.deleteLater()
+            job.process = None
+        if any(dependency.is_active() for dependency in job.after):
+            # 被结束的依赖任务可能还在写入这些临时文件
+            self._deferred_cleanup.append(job)
+        else:
+            self._cleanup(job)
+        for waiting in [waiting for waiting in self._deferred_cleanup
+                        if not any(dependency.is_active() for dependency in waiting.after)]:
+            self._deferred_cleanup.remove(waiting)
+            self._cleanup(waiting)
+        job.log.append(f"{STATE_LABELS[state]}，用时 {job.elapsed():.1f} 秒"
+                       + (f"，退出代码 {job.exit_code}" if state == FAILED and job.exit_code is not None else ""))
+        self.job_changed.emit(job)
+        self.job_finished.emit(job)
+        if state != DONE:
+            # 等待这个任务的任务不会再运行，立即取消，连同它们其余的依赖任务，不占用运行名额
+            for dependent in [other for other in self.jobs if other.state == QUEUED and job in other.after]:
+                dependent.log.append("等待的任务未成功完成")
+                self._finish(dependent, CANCELLED, start_next=False)
+                self._cancel_dependencies(dependent)
+        if start_next:
+            self._start_next()
+
+
+def summarize(jobs):
+    """
+    一批任务结束后的提示，返回 (是否全部成功, 提示文字)；全部是用户取消的任务时返回 (True, None)。
+
+    只有一个任务给出了 success_message 时（如合并及其前面的转换任务）使用它。
+    """
+    done = [job for job in jobs if job.state == DONE]
+    failed = [job for job in jobs if job.state == FAILED]
+    cancelled = [job for job in jobs if job.state == CANCELLED]
+    if not done and not failed:
+        return True, None
+    if not failed and not cancelled:
+        messages = [job.success_message for job in done if job.success_message]
+        if len(messages) == 1:
+            return True, messages[0]
+        if len(done) == 1:
+            return True, f"任务完成: {done[0].title}"
+        return True, f"{len(done)} 个任务全部完成！"
+    return False, (f"完成 {len(done)} 个，失败 {len(failed)} 个，已取消 {len(cancelled)} 个。\n"
+                   "请在任务列表中选中失败的任务查看日志。")
+
+
+def ask_overwrite_policy(parent, existing):
+    """
+    批量任务开始前对已存在的输出文件询问一次，而不是每个文件问一次。
+
+    返回 OVERWRITE (全部覆盖)、SKIP (跳过已存在的) 或 None (取消)。
+    """
+    names = [os.path.basename(str(path)) for path in existing[:MAX_LISTED_FILES]]
+    if len(existing) > MAX_LISTED_FILES:
+        names.append(f"... 等共 {len(existing)} 个")
+    box = QMessageBox(parent)
+    box.setIcon(QMessageBox.Icon.Question)
+    box.setWindowTitle("文件已存在")
+    box.setText(f"{len(existing)} 个输出文件已存在，如何处理？")
+    box.setInformativeText("\n".join(names))
+    overwrite_button = box.addButton("全部覆盖", QMessageBox.ButtonRole.AcceptRole)
+    skip_button = box.addButton("跳过已存在的", QMessageBox.ButtonRole.AcceptRole)
+    box.addButton("取消", QMessageBox.ButtonRole.RejectRole)
+    box.setDefaultButton(skip_button)
+    box.exec()
+    clicked = box.clickedButton()
+    if clicked is overwrite_button:
+        return OVERWRITE
+    if clicked is skip_button:
+        return SKIP
+    return None
+
+
+class JobPanel(QWidget):
+    """任务列表（左）和所选任务的日志（右），下方可调整并行数和取消任务"""
+
+    COLUMNS = ["任务", "状态", "进度", "速度", "用时"]
+
+    def __init__(self, scheduler, parent=None):
+        super().__init__(parent)
+        self.scheduler = scheduler
+        self._rows = {}
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        header = self.table.horizontalHeader()
+        header.setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        for column in range(1, len(self.COLUMNS)):
+            header.setSectionResizeMode(column, QHeaderView.ResizeMode.ResizeToContents)
+
+        self.job_log = QPlainTextEdit()
+        self.job_log.setReadOnly(True)
+        self.job_log.setMaximumBlockCount(LOG_LINES)
+        self.job_log.setPlaceholderText("选中一个任务查看它的 FFmpeg 输出")
+
+        splitter = QSplitter(Qt.Orientation.Horizontal)
+        splitter.addWidget(self.table)
+        splitter.addWidget(self.job_log)
+        splitter.setSizes([300, 400])
+
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, max(os.cpu_count() or 1, scheduler.max_workers))
+        self.workers_spin.setValue(scheduler.max_workers)
+        self.workers_spin.valueChanged.connect(scheduler.set_max_workers)
+        self.cancel_button = QPushButton("取消选中")
+        self.cancel_button.clicked.connect(self.cancel_selected)
+        self.cancel_all_button = QPushButton("全部取消")
+        self.cancel_all_button.clicked.connect(scheduler.cancel_all)
+        self.clear_button = QPushButton("清除已结束")
+        self.clear_button.clicked.connect(self.clear_finished)
+        self.summary_label = QLabel()
+        self.batch_progress = QProgressBar()
+        self.batch_progress.setFormat("%v/%m")
+        self.batch_progress.setValue(0)
+        self.batch_progress.setTextVisible(False)
+        self.batch_label = QLabel()
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("同时运行:"))
+        controls.addWidget(self.workers_spin)
+        controls.addWidget(self.cancel_button)
+        controls.addWidget(self.cancel_all_button)
+        controls.addWidget(self.clear_button)
+        controls.addStretch()
+        controls.addWidget(self.summary_label)
+
+        progress = QHBoxLayout()
+        progress.addWidget(self.batch_progress)
+        progress.addWidget(self.batch_label)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(splitter)
+        layout.addLayout(progress)
+        layout.addLayout(controls)
+
+        scheduler.job_added.connect(self.add_job)
+        scheduler.job_changed.connect(self.update_job)
+        scheduler.job_output.connect(self.append_output)
+        scheduler.job_progress.connect(self.update_progress)
+        self.table.itemSelectionChanged.connect(self.show_selected_log)
+
+        # 运行中任务的用时每秒刷新一次
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh_running)
+        self.timer.start(1000)
+        self.update_summary()
+
+    def add_job(self, job):
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        title_item = QTableWidgetItem(job.title)
+        title_item.setToolTip(" ".join(job.command))
+        title_item.setData(Qt.ItemDataRole.UserRole, job.id)
+        self.table.setItem(row, 0, title_item)
+        for column in range(1, len(self.COLUMNS)):
+            self.table.setItem(row, column, QTableWidgetItem())
+        bar = QProgressBar()
+        bar.setRange(0, 100)
+        bar.setValue(0)
+        self.table.setCellWidget(row, 2, bar)
+        self._rows[job.id] = row
+        self.update_job(job)
+        self.update_progress(job)
+
+    def update_job(self, job):
+        row = self._rows.get(job.id)
+        if row is None:
+            return
+        self.table.item(row, 1).setText(STATE_LABELS[job.state])
+        self.table.item(row, 4).setText(f"{job.elapsed():.0f} 秒" if job.started else "")
+        if job.state == DONE:
+            bar = self.table.cellWidget(row, 2)
+            bar.setValue(100)
+            bar.setFormat("100%")
+        if job is self.selected_job() and not job.is_active():
+            self.show_selected_log()
+        self.update_summary()
+
+    def update_progress(self, job):
+        row = self._rows.get(job.id)
+        if row is None or job.progress is None or job.state == DONE:
+            return
+        bar = self.table.cellWidget(row, 2)
+        percent = job.progress.percent()
+        bar.setValue(int(percent) if percent is not None else 0)
+        bar.setFormat(job.progress.describe() if job.started else "")
+        self.table.item(row, 3).setText(job.progress.speed_text())
+
+    def refresh_running(self):
+        for job in self.scheduler.jobs:
+            if job.state == RUNNING:
+                self.update_job(job)
+        self.update_batch_progress()
+
+    def update_summary(self):
+        counts = {state: 0 for state in STATE_LABELS}
+        for job in self.scheduler.jobs:
+            counts[job.state] += 1
+        self.summary_label.setText(
+            f"运行中 {counts[RUNNING]}，排队 {counts[QUEUED]}，完成 {counts[DONE]}，失败 {counts[FAILED]}")
+        self.update_batch_progress()
+
+    def update_batch_progress(self):
+        finished, total, remaining = self.scheduler.batch_progress()
+        # 一批结束后保留最后的进度，直到下一批开始
+        if not total:
+            return
+        self.batch_progress.setMaximum(total)
+        self.batch_progress.setValue(finished)
+        self.batch_progress.setTextVisible(True)
+        if finished == total:
+            self.batch_label.setText("本批任务已全部结束")
+        elif remaining is None:
+            self.batch_label.setText(f"本批共 {total} 个任务")
+        else:
+            self.batch_label.setText(f"预计剩余 {format_seconds(remaining)}")
+
+    def selected_jobs(self):
+        ids = {self.table.item(index.row(), 0).data(Qt.ItemDataRole.UserRole)
+               for index in self.table.selectionModel().selectedRows()}
+        return [job for job in self.scheduler.jobs if job.id in ids]
+
+    def selected_job(self):
+        jobs = self.selected_jobs()
+        return jobs[0] if len(jobs) == 1 else None
+
+    def show_selected_log(self):
+        job = self.selected_job()
+        self.job_log.setPlainText(job.log_text() if job else "")
+        self.job_log.verticalScrollBar().setValue(self.job_log.verticalScrollBar().maximum())
+
+    def append_output(self, job, text):
+        if job is self.selected_job():
+            self.job_log.appendPlainText(text)
+
+    def cancel_selected(self):
+        for job in self.selected_jobs():
+            self.scheduler.cancel(job)
+
+    def clear_finished(self):
+        self.scheduler.clear_finished()
+        self.table.setRowCount(0)
+        self._rows = {}
+        for job in self.scheduler.jobs:
+            self.add_job(job)
+        self.show_selected_log()
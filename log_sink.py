@@ -0,0 +1,136 @@
+"""
+视频工具的执行日志
+
+原来每条信息都直接 QTextEdit.append 并滚动到底部，长时间任务的日志不断增长，频繁的重绘也会让界面卡顿。
+LogSink 把日志先放进缓冲区，由定时器每秒最多刷新 10 次，一次性追加到 QPlainTextEdit；
+文本框用 setMaximumBlockCount 限制行数，超出时自动丢弃最早的行，内存占用不随运行时间增长。
+
+日志分为 DEBUG/INFO/WARNING/ERROR 四级（即 logging 模块的级别），低于显示级别的不显示；
+警告和错误带前缀。设置了环境变量 VIDEO_TOOLS_LOG_DIR 时，所有级别的日志还会写入该目录下的
+<工具名>.log，文件超过 5 MB 时轮转，保留 3 个旧文件。
+
+PyQt5 和 PyQt6 的工具都可以使用 (见 qt_compat.py)。
+"""
+import os
+import logging
+import logging.handlers
+from collections import deque
+
+from qt_compat import QObject, QPlainTextEdit, QTimer
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+ERROR = logging.ERROR
+LEVEL_PREFIXES = {WARNING: "[警告] ", ERROR: "[错误] "}
+
+# 文本框和缓冲区保留的行数
+DEFAULT_MAX_LINES = 5000
+# 两次刷新之间的最短间隔 (毫秒)
+FLUSH_INTERVAL_MS = 100
+LOG_DIR_ENV = 'VIDEO_TOOLS_LOG_DIR'
+LOG_FILE_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+
+
+def log_file_path(tool_name):
+    """环境变量 VIDEO_TOOLS_LOG_DIR 指定的目录下的 <tool_name>.log，未设置时返回 None"""
+    directory = os.environ.get(LOG_DIR_ENV)
+    if not directory:
+        return None
+    return os.path.join(directory, f"{tool_name}.log")
+
+
+def create_view(placeholder=None, max_lines=DEFAULT_MAX_LINES):
+    """只读、有行数上限的日志文本框"""
+    view = QPlainTextEdit()
+    view.setReadOnly(True)
+    view.setMaximumBlockCount(max_lines)
+    if placeholder:
+        view.setPlaceholderText(placeholder)
+    return view
+
+
+class LogSink(QObject):
+    """
+    把日志写到 QPlainTextEdit（以及可选的轮转文件）。
+
+    write 只把文本放进缓冲区并启动定时器，FLUSH_INTERVAL_MS 毫秒后一次性追加；
+    两次刷新之间写入超过 max_lines 行时只保留最后 max_lines 行。
+    """
+
+    def __init__(self, view, max_lines=DEFAULT_MAX_LINES, level=INFO, file_path=None, parent=None):
+        super().__init__(parent if parent is not None else view)
+        self.view = view
+        self.view.setMaximumBlockCount(max_lines)
+        self.level = level
+        self.lines = deque(maxlen=max_lines)
+        self._pending = deque(maxlen=max_lines)
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(FLUSH_INTERVAL_MS)
+        self._timer.timeout.connect(self.flush)
+        self._file_handler = None
+        if file_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+                self._file_handler = logging.handlers.RotatingFileHandler(
+                    file_path, maxBytes=LOG_FILE_BYTES, backupCount=LOG_FILE_BACKUPS, encoding='utf-8')
+                self._file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+            except OSError as e:
+                self.write(f"无法打开日志文件 {file_path}: {e}", WARNING)
+
+    def write(self, message, level=INFO):
+        if not message:
+            return
+        message = str(message).rstrip('\n')
+        if self._file_handler is not None:
+            self._file_handler.handle(logging.makeLogRecord(
+                {'msg': message, 'levelno': level, 'levelname': logging.getLevelName(level)}))
+        if level < self.level:
+            return
+        line = LEVEL_PREFIXES.get(level, '') + message
+        self.lines.append(line)
+        self._pending.append(line)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def debug(self, message):
+        self.write(message, DEBUG)
+
+    def info(self, message):
+        self.write(message, INFO)
+
+    def warning(self, message):
+        self.write(message, WARNING)
+
+    def error(self, message):
+        self.write(message, ERROR)
+
+    def set_level(self, level):
+        """只影响之后的日志，已显示的不重新过滤"""
+        self.level = level
+
+    def flush(self):
+        """把缓冲区中的日志追加到文本框；用户向上翻看时不自动滚动到底部"""
+        self._timer.stop()
+        if not self._pending:
+            return
+        scrollbar = self.view.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+        self.view.appendPlainText("\n".join(self._pending))
+        self._pending.clear()
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def clear(self):
+        self._timer.stop()
+        self._pending.clear()
+        self.lines.clear()
+        self.view.clear()
+
+    def close(self):
+        self.flush()
+        if self._file_handler is not None:
+            self._file_handler.close()
+            self._file_handler = None
@@ -0,0 +1,199 @@
+"""
+用 ffprobe 读取视频的编码、分辨率、时长、音轨和字幕信息
+
+结果按 (路径, 大小, 修改时间) 缓存在本地 SQLite 中，同一个文件只探测一次；
+多个文件在有上限的线程池中并行探测。streamdetails_fields 把结果转换成
+Kodi/Jellyfin 使用的 <fileinfo><streamdetails> 字段，交给 nfo_writer.render_nfo 输出。
+
+缓存文件默认位于 ~/.nfo_generator/probe_cache.sqlite3，可用环境变量 NFO_PROBE_CACHE
+指定其他路径，设为 off 则关闭缓存。
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+FFPROBE = "ffprobe"
+# 同时运行的 ffprobe 进程数；每个进程都要从 NAS 读取文件头，不宜过多
+DEFAULT_WORKERS = 4
+PROBE_TIMEOUT = 60
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".nfo_generator", "probe_cache.sqlite3")
+# summarize 的输出格式版本；增加字段后加一，缓存中旧版本的结果会重新探测
+SUMMARY_VERSION = 2
+
+
+def is_available():
+    return shutil.which(FFPROBE) is not None
+
+
+def run_ffprobe(path, timeout=PROBE_TIMEOUT):
+    """运行 ffprobe，返回其 JSON 输出；失败时抛出 OSError 或 subprocess.SubprocessError"""
+    creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+    result = subprocess.run(
+        [FFPROBE, '-v', 'error', '-print_format', 'json', '-show_format', '-show_streams', path],
+        capture_output=True, check=True, timeout=timeout, creationflags=creation_flags)
+    return json.loads(result.stdout.decode('utf-8', errors='replace'))
+
+
+def _duration(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def summarize(info):
+    """
+    从 ffprobe 输出中提取需要写入 NFO 的信息：
+    {'duration': 秒数或 None, 'video': [...], 'audio': [...], 'subtitle': [...]}，每项为字段字典。
+
+    视频和音频还记录了像素格式、帧率、时间基、采样率和声道布局，供 concat_preflight.py 判断
+    多个文件能否直接拼接。
+    """
+    format_duration = _duration(info.get('format', {}).get('duration'))
+    summary = {'version': SUMMARY_VERSION, 'duration': format_duration, 'video': [], 'audio': [], 'subtitle': []}
+    for stream in info.get('streams', []):
+        codec_type = stream.get('codec_type')
+        tags = stream.get('tags') or {}
+        language = tags.get('language')
+        if codec_type == 'video':
+            # 跳过内嵌的封面图片
+            if (stream.get('disposition') or {}).get('attached_pic'):
+                continue
+            width = stream.get('width')
+            height = stream.get('height')
+            duration = _duration(stream.get('duration')) or format_duration
+            video = {'codec': stream.get('codec_name'), 'width': width, 'height': height,
+                     'pix_fmt': stream.get('pix_fmt'), 'fps': stream.get('r_frame_rate'),
+                     'time_base': stream.get('time_base')}
+            if width and height:
+                video['aspect'] = round(width / height, 2)
+            if duration:
+                video['durationinseconds'] = int(round(duration))
+            summary['video'].append(video)
+        elif codec_type == 'audio':
+            sample_rate = stream.get('sample_rate')
+            summary['audio'].append({'codec': stream.get('codec_name'), 'language': language,
+                                     'channels': stream.get('channels'),
+                                     'sample_rate': int(sample_rate) if sample_rate else None,
+                                     'channel_layout': stream.get('channel_layout')})
+        elif codec_type == 'subtitle':
+            summary['subtitle'].append({'language': language})
+    return summary
+
+
+def streamdetails_fields(summary):
+    """转换为 nfo_writer.render_nfo 的嵌套字段 [('fileinfo', [('streamdetails', [...])])]"""
+    streams = []
+    for video in summary.get('video', []):
+        streams.append(('video', [(key, video.get(key))
+                                  for key in ('codec', 'aspect', 'width', 'height', 'durationinseconds')]))
+    for audio in summary.get('audio', []):
+        streams.append(('audio', [(key, audio.get(key)) for key in ('codec', 'language', 'channels')]))
+    for subtitle in summary.get('subtitle', []):
+        if subtitle.get('language'):
+            streams.append(('subtitle', [('language', subtitle['language'])]))
+    if not streams:
+        return []
+    return [('fileinfo', [('streamdetails', streams)])]
+
+
+class ProbeCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 多个进程 (nfo_batch.py 的进程池) 会同时读写，使用 WAL 并设置等待时间
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS probes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                summary TEXT NOT NULL,
+                probed REAL NOT NULL
+            )""")
+        self._conn.commit()
+
+    def get(self, path, size, mtime_ns):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM probes WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (path, size, mtime_ns)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, path, size, mtime_ns, summary):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO probes (path, size, mtime_ns, summary, probed) VALUES (?, ?, ?, ?, ?)",
+                (path, size, mtime_ns, json.dumps(summary, ensure_ascii=False), time.time()))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache = None
+_default_cache_pid = None
+
+
+def get_default_cache():
+    """返回本进程共享的缓存实例；缓存被关闭或无法打开时返回 None"""
+    global _default_cache, _default_cache_pid
+    path = os.environ.get('NFO_PROBE_CACHE', DEFAULT_CACHE_PATH)
+    if path.lower() == 'off':
+        return None
+    # 子进程不能沿用父进程的 SQLite 连接
+    if _default_cache is None or _default_cache_pid != os.getpid():
+        try:
+            _default_cache = ProbeCache(path)
+            _default_cache_pid = os.getpid()
+        except sqlite3.Error:
+            return None
+    return _default_cache
+
+
+def probe_file(path, cache=None):
+    """探测单个文件，返回 summarize 的结果；无法探测时返回 None"""
+    path = os.path.abspath(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if cache:
+        cached = cache.get(path, st.st_size, st.st_mtime_ns)
+        if cached is not None and cached.get('version') == SUMMARY_VERSION:
+            return cached
+    try:
+        summary = summarize(run_ffprobe(path))
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+    if cache:
+        cache.put(path, st.st_size, st.st_mtime_ns, summary)
+    return summary
+
+
+def probe_duration(path, cache=None):
+    """文件时长 (秒)，无法探测时返回 None"""
+    summary = probe_file(path, cache)
+    return summary.get('duration') if summary else None
+
+
+def probe_files(paths, workers=DEFAULT_WORKERS):
+    """并行探测多个文件，返回 {路径: 结果或 None}；未安装 ffprobe 时全部为 None"""
+    if not paths:
+        return {}
+    if not is_available():
+        return {path: None for path in paths}
+    cache = get_default_cache()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return dict(zip(paths, executor.map(lambda path: probe_file(path, cache), paths)))
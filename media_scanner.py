@@ -0,0 +1,83 @@
+"""
+基于 os.scandir 的文件夹扫描
+
+os.listdir 之后再对每一项调用 os.path.isfile / os.path.getmtime，每个文件都要单独 stat 一次，
+在 SMB 等网络共享上每次都是一次网络往返。os.scandir 返回的 DirEntry 自带文件类型，
+stat 结果也会缓存（Windows 上目录列表本身就带有大小和修改时间），可以省掉大部分请求。
+"""
+import os
+
+
+def _normalize_extensions(extensions):
+    if extensions is None:
+        return None
+    return frozenset(ext.lower() for ext in extensions)
+
+
+def iter_files(folder, extensions=None, recursive=False, on_error=None):
+    """
+    逐个生成文件夹中的文件 (os.DirEntry)。
+
+    extensions 为扩展名列表（如 ['.mp4']，不区分大小写），None 表示不过滤；
+    recursive 为 True 时同时进入子文件夹（不跟随指向文件夹的符号链接）。
+    folder 本身无法读取时抛出 OSError，子文件夹无法读取时调用 on_error(error) 后跳过。
+    """
+    extensions = _normalize_extensions(extensions)
+    pending = [folder]
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = os.scandir(directory)
+        except OSError as e:
+            if directory is folder:
+                raise
+            if on_error:
+                on_error(e)
+            continue
+        subdirs = []
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            subdirs.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                if extensions is None or os.path.splitext(entry.name)[1].lower() in extensions:
+                    yield entry
+        # 倒序压栈，使子文件夹按目录列表中的顺序处理
+        pending.extend(reversed(subdirs))
+
+
+def list_files(folder, extensions=None, recursive=False):
+    """返回排序后的文件名列表；recursive 时为相对于 folder 的路径"""
+    if recursive:
+        return sorted(os.path.relpath(entry.path, folder) for entry in iter_files(folder, extensions, True))
+    return sorted(entry.name for entry in iter_files(folder, extensions))
+
+
+def scan_directory(directory):
+    """读取一层目录，返回 (子文件夹列表, 文件列表)，元素均为 os.DirEntry"""
+    dirs = []
+    files = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir():
+                    dirs.append(entry)
+                elif entry.is_file():
+                    files.append(entry)
+            except OSError:
+                continue
+    return dirs, files
+
+
+def entry_mtime(entry):
+    """DirEntry 的修改时间（使用缓存的 stat 结果），无法获取时返回 0"""
+    try:
+        return entry.stat().st_mtime
+    except OSError:
+        return 0
@@ -0,0 +1,280 @@
+"""
+本地模拟的 OpenAI 兼容接口 (仅用于测试和性能测量，不调用任何真实服务)
+
+实现 POST /v1/chat/completions，可配置响应延迟分布、错误率、429 注入以及每分钟请求上限；
+stream 为 true 时按 SSE 分块返回，首块在 --first-token-latency 秒后发出，其余分块均匀分布在整个响应延迟内；
+GET /stats 返回请求数、错误数和延迟分位数，POST /stats/reset 清零统计。
+多集合并请求（提示词中要求返回 JSON 数组）会按列出的集数返回 JSON。
+
+示例:
+    python mock_openai_server.py --port 8765 --latency-dist lognormal --latency-mean 1.5 --rate-limit-rate 0.05
+    然后把接口地址设为 http://127.0.0.1:8765/v1
+"""
+import re
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockSettings:
+    def __init__(self, latency_dist='fixed', latency_mean=0.5, latency_sigma=0.5,
+                 error_rate=0.0, rate_limit_rate=0.0, rpm_limit=0, retry_after=1.0, seed=None,
+                 first_token_latency=0.2):
+        self.latency_dist = latency_dist
+        self.latency_mean = latency_mean
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm_limit = rpm_limit
+        self.retry_after = retry_after
+        self.first_token_latency = first_token_latency
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample_latency(self):
+        with self.lock:
+            if self.latency_dist == 'uniform':
+                return self.random.uniform(0, 2 * self.latency_mean)
+            if self.latency_dist == 'exponential':
+                return self.random.expovariate(1.0 / self.latency_mean) if self.latency_mean > 0 else 0.0
+            if self.latency_dist == 'lognormal':
+                # 使分布的均值等于 latency_mean
+                mu = math.log(max(self.latency_mean, 1e-6)) - self.latency_sigma ** 2 / 2
+                return self.random.lognormvariate(mu, self.latency_sigma)
+            return self.latency_mean
+
+    def roll(self, rate):
+        with self.lock:
+            return self.random.random() < rate
+
+
+class MockStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.ok = 0
+            self.errors = 0
+            self.rate_limited = 0
+            self.prompt_chars = 0
+            self.latencies = []
+            self.window = deque()
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+
+            def percentile(p):
+                if not latencies:
+                    return 0.0
+                return latencies[min(len(latencies) - 1, int(p / 100.0 * len(latencies)))]
+
+            return {
+                'requests': self.requests,
+                'ok': self.ok,
+                'errors': self.errors,
+                'rate_limited': self.rate_limited,
+                'prompt_chars': self.prompt_chars,
+                'latency_p50': percentile(50),
+                'latency_p95': percentile(95),
+                'latency_p99': percentile(99),
+                'latency_max': latencies[-1] if latencies else 0.0,
+            }
+
+
+def make_reply(messages):
+    """根据提示词生成假的简介；多集合并请求返回 JSON 数组"""
+    prompt = messages[-1].get('content', '') if messages else ''
+    if 'JSON 数组' in prompt:
+        numbers = [int(n) for n in re.findall(r'第(\d+)集:', prompt)]
+        return json.dumps([{'episode': n, 'plot': f"模拟简介：第{n}集的剧情。"} for n in numbers],
+                          ensure_ascii=False)
+    match = re.search(r'本集标题: (.*)', prompt)
+    episode_title = match.group(1).strip() if match else "本集"
+    return f"模拟简介：{episode_title} 的剧情。"
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, request, content, duration, chunk_chars=4):
+        """以 text/event-stream 分块发送回复（格式与 OpenAI 的流式接口相同），分块间隔均匀分布在 duration 秒内"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        pieces = [content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars)] or ['']
+        step = max(0.0, duration) / len(pieces)
+        base = {'id': f"chatcmpl-mock-{self.server.stats.requests}", 'object': 'chat.completion.chunk',
+                'created': int(time.time()), 'model': request.get('model', 'mock')}
+        try:
+            for i, piece in enumerate(pieces):
+                if i:
+                    time.sleep(step)
+                delta = {'role': 'assistant', 'content': piece} if i == 0 else {'content': piece}
+                chunk = dict(base, choices=[{'index': 0, 'delta': delta, 'finish_reason': None}])
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+            chunk = dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端中途取消
+            pass
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            self.send_json(200, self.server.stats.snapshot())
+        else:
+            self.send_json(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        path = self.path.rstrip('/')
+        if path == '/stats/reset':
+            self.server.stats.reset()
+            self.send_json(200, {'ok': True})
+            return
+        if not path.endswith('/chat/completions'):
+            self.send_json(404, {'error': {'message': 'not found'}})
+            return
+
+        start = time.monotonic()
+        settings = self.server.settings
+        stats = self.server.stats
+        try:
+            request = json.loads(raw or b'{}')
+        except ValueError:
+            self.send_json(400, {'error': {'message': 'invalid json', 'type': 'invalid_request_error'}})
+            return
+        messages = request.get('messages', [])
+
+        with stats.lock:
+            stats.requests += 1
+            stats.prompt_chars += sum(len(m.get('content') or '') for m in messages)
+            over_quota = False
+            if settings.rpm_limit:
+                while stats.window and start - stats.window[0] > 60:
+                    stats.window.popleft()
+                over_quota = len(stats.window) >= settings.rpm_limit
+                if not over_quota:
+                    stats.window.append(start)
+
+        if over_quota or settings.roll(settings.rate_limit_rate):
+            with stats.lock:
+                stats.rate_limited += 1
+            self.send_json(429, {'error': {'message': 'Rate limit exceeded', 'type': 'rate_limit_error'}},
+                           {'Retry-After': str(settings.retry_after)})
+            return
+
+        latency = settings.sample_latency()
+        stream = bool(request.get('stream'))
+        time.sleep(min(latency, settings.first_token_latency) if stream else latency)
+
+        if settings.roll(settings.error_rate):
+            with stats.lock:
+                stats.errors += 1
+            self.send_json(500, {'error': {'message': 'Injected server error', 'type': 'server_error'}})
+            return
+
+        content = make_reply(messages)
+        if stream:
+            self.send_stream(request, content, latency - min(latency, settings.first_token_latency))
+            with stats.lock:
+                stats.ok += 1
+                stats.latencies.append(time.monotonic() - start)
+            return
+        with stats.lock:
+            stats.ok += 1
+            stats.latencies.append(time.monotonic() - start)
+        self.send_json(200, {
+            'id': f"chatcmpl-mock-{stats.requests}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': sum(len(m.get('content') or '') for m in messages),
+                'completion_tokens': len(content),
+                'total_tokens': sum(len(m.get('content') or '') for m in messages) + len(content),
+            },
+        })
+
+
+def start_server(settings, host='127.0.0.1', port=0):
+    """在后台线程启动模拟服务，返回 (server, base_url)；用完后调用 server.shutdown()"""
+    server = ThreadingHTTPServer((host, port), MockHandler)
+    server.daemon_threads = True
+    server.settings = settings
+    server.stats = MockStats()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def add_settings_arguments(parser):
+    parser.add_argument('--latency-dist', choices=['fixed', 'uniform', 'exponential', 'lognormal'],
+                        default='fixed', help="响应延迟分布")
+    parser.add_argument('--latency-mean', type=float, default=0.5, help="平均延迟 (秒)")
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help="lognormal 分布的 sigma")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="返回 500 的概率")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="随机返回 429 的概率")
+    parser.add_argument('--rpm-limit', type=int, default=0, help="每分钟请求上限，超出返回 429 (0 为不限)")
+    parser.add_argument('--retry-after', type=float, default=1.0, help="429 响应中的 Retry-After 秒数")
+    parser.add_argument('--seed', type=int, default=None, help="随机数种子")
+    parser.add_argument('--first-token-latency', type=float, default=0.2, help="流式回复首块的延迟 (秒)")
+
+
+def settings_from_args(args):
+    return MockSettings(args.latency_dist, args.latency_mean, args.latency_sigma, args.error_rate,
+                        args.rate_limit_rate, args.rpm_limit, args.retry_after, args.seed,
+                        args.first_token_latency)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟的 OpenAI 兼容接口")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_settings_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server, base_url = start_server(settings_from_args(args), args.host, args.port)
+    print(f"模拟接口已启动: {base_url}  (Ctrl+C 退出)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
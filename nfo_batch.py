@@ -0,0 +1,113 @@
+"""
+NFO 批量生成命令行工具 (无界面)
+
+遍历媒体库根目录，为每个电视剧文件夹并行生成 tvshow.nfo 和各集 NFO。
+已有 tvshow.nfo 的文件夹会沿用其中的电视剧信息，否则使用文件夹名作为电视剧名称。
+包含季文件夹 (Season 1、S01、第1季 等) 的电视剧在根目录生成一个 tvshow.nfo，
+各季的季数取自文件夹名（文件名为 SxxEyy 时以文件名为准），各季并行生成。
+
+示例:
+    python nfo_batch.py /mnt/nas/TV --workers 8
+    python nfo_batch.py /mnt/nas/TV --regenerate-all --ai --api-key sk-xxxx
+    python nfo_batch.py /mnt/nas/TV --regenerate-all --dry-run
+"""
+import os
+import sys
+import argparse
+
+import ai_plot
+import nfo_core
+import prompt_budget
+import thumbnails
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="批量为媒体库生成 NFO 文件")
+    parser.add_argument('root', help="媒体库根目录")
+    parser.add_argument('--workers', type=int, default=None, help="并行进程数 (默认: CPU 核心数)")
+    parser.add_argument('--regenerate-all', action='store_true', help="为所有视频文件重新生成NFO")
+    parser.add_argument('--ai', action='store_true', help="使用AI为每集生成简介")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="只预览：统计会新建/改变/不变的NFO并显示部分 diff，不写入任何文件")
+    parser.add_argument('--probe', action='store_true', help="用 ffprobe 读取视频流信息并写入NFO")
+    parser.add_argument('--thumbs', action='store_true', help="用 ffmpeg 为每集截取缩略图 (<文件名>-thumb.jpg)")
+    parser.add_argument('--thumb-offset', type=float, default=thumbnails.DEFAULT_OFFSET, help="截图位置 (秒)")
+    parser.add_argument('--api-key', default=None, help="OpenAI 兼容接口的 API Key")
+    parser.add_argument('--base-url', default=ai_plot.DEFAULT_BASE_URL, help="OpenAI 兼容接口地址")
+    parser.add_argument('--ai-concurrency', type=int, default=ai_plot.DEFAULT_CONCURRENCY,
+                        help="每个进程同时进行的AI请求数")
+    parser.add_argument('--ai-batch-size', type=int, default=1,
+                        help="每个AI请求包含的集数 (大于1时合并请求并要求返回JSON)")
+    parser.add_argument('--ai-rpm', type=int, default=None, help="每个进程每分钟AI请求数上限")
+    parser.add_argument('--ai-tpm', type=int, default=None, help="每个进程每分钟AI token数上限")
+    parser.add_argument('--ai-plot-budget', type=int, default=prompt_budget.DEFAULT_PLOT_BUDGET,
+                        help="每个AI请求中电视剧简介最多占用的 token 数 (0 为不截断)")
+    parser.add_argument('--season', type=int, default=nfo_core.DEFAULT_SHOW['season'], help="季数")
+    parser.add_argument('--episode', type=int, default=nfo_core.DEFAULT_SHOW['episode'], help="起始集数")
+    parser.add_argument('--year', type=int, default=nfo_core.DEFAULT_SHOW['year'], help="年份 (tvshow.nfo 中没有时使用)")
+    parser.add_argument('--genre', default=nfo_core.DEFAULT_SHOW['genre'], help="类型 (tvshow.nfo 中没有时使用)")
+    parser.add_argument('--studio', default=nfo_core.DEFAULT_SHOW['studio'], help="制作公司 (tvshow.nfo 中没有时使用)")
+    return parser.parse_args(argv)
+
+
+def print_plan(plan):
+    print(f"预览: 新建 {plan['created']}，改变 {plan['changed']}，内容未变 {plan['unchanged']}")
+    print(f"会写入 {plan['bytes_written']} 字节，内容未变而不必写入 {plan['bytes_unchanged']} 字节")
+    for diff in plan['diffs']:
+        print()
+        print(diff)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.isdir(args.root):
+        print(f"错误: 目录不存在 - {args.root}")
+        return 1
+
+    ai_settings = None
+    if args.ai:
+        api_key = args.api_key or ai_plot.get_default_api_key()
+        if not ai_plot.is_available() or not api_key:
+            print("错误: 使用AI功能前，请确保已安装'openai'库并提供了API Key。")
+            return 1
+        ai_settings = {'api_key': api_key, 'base_url': args.base_url,
+                       'concurrency': args.ai_concurrency, 'batch_size': args.ai_batch_size,
+                       'rpm': args.ai_rpm, 'tpm': args.ai_tpm, 'plot_budget': args.ai_plot_budget}
+
+    defaults = {
+        'season': args.season,
+        'episode': args.episode,
+        'year': args.year,
+        'genre': args.genre,
+        'studio': args.studio,
+    }
+
+    def on_progress(done, total, summary):
+        status = "失败" if summary.get('failed') else "完成"
+        print(f"[{done}/{total}] {status} {summary['folder']}: "
+              f"{'会生成' if args.dry_run else '生成'} {summary['generated']}，内容未变 {summary['unchanged']}，跳过 {summary['skipped']}，"
+              f"用时 {summary['elapsed']:.1f}s")
+        for error in summary.get('errors', []):
+            print(f"    ! {error}")
+
+    report = nfo_core.generate_library(
+        args.root, defaults, args.regenerate_all, ai_settings, args.workers, on_progress, args.probe,
+        args.thumb_offset if args.thumbs else None, args.dry_run)
+
+    print("=" * 50)
+    print(f"电视剧文件夹: {report['folders']} (失败 {report['failed_folders']})")
+    print(f"视频文件: {report['videos']}，{'会生成' if args.dry_run else '生成'}NFO: {report['generated']}，内容未变: {report['unchanged']}，"
+          f"跳过: {report['skipped']}")
+    if args.ai:
+        print(f"AI简介生成失败: {report['ai_failed']}")
+        if report['ai_requests']:
+            print(f"AI请求: {report['ai_requests']}，输入 token: {report['ai_prompt_tokens']}"
+                  f" (平均每个请求 {report['ai_prompt_tokens'] / report['ai_requests']:.0f})")
+    if args.dry_run:
+        print_plan(report['plan'])
+    print(f"总用时: {report['elapsed']:.1f}s")
+    return 1 if report['failed_folders'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,511 @@
+"""
+NFO 生成核心逻辑 (不依赖 Qt)
+
+nfo_generator_enhance2.py 的界面和 nfo_batch.py 的命令行都调用这里的函数，
+这样同一套生成规则既能在窗口里处理单个文件夹，也能在后台批量处理整个媒体库。
+"""
+import os
+import re
+import time
+import xml.etree.ElementTree as ET
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import ai_plot
+import nfo_manifest
+import episode_parser
+import nfo_writer
+import media_scanner
+import prompt_budget
+import media_probe
+import thumbnails
+
+VIDEO_EXTENSIONS = ['.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv']
+# 写入了流信息的集在清单输入中附加此标记，开启探测后旧的 NFO 会补上流信息
+PROBE_MARKER = 'streamdetails'
+THUMB_MARKER = 'thumb'
+# 季文件夹名：Season 1、Season 01、Series 2、S01、第1季，Specials 为第 0 季
+SEASON_FOLDER_RE = re.compile(
+    r'^(?:(?:season|series)[ ._\-]*(?P<season>\d+)\b.*|s(?P<short>\d{1,3})|第(?P<cn>\d+)季.*|(?P<specials>specials?))$',
+    re.IGNORECASE)
+# 同时生成的季数；每一季的 AI 并发、ffprobe 和 ffmpeg 进程数分别计算
+DEFAULT_SEASON_WORKERS = 4
+SUMMARY_COUNTERS = ('videos', 'generated', 'unchanged', 'skipped', 'ai_failed', 'ai_requests', 'ai_prompt_tokens')
+
+# 电视剧信息的默认值，与界面上的默认值保持一致
+DEFAULT_SHOW = {
+    'title': '',
+    'originaltitle': '',
+    'plot': '',
+    'season': 1,
+    'episode': 1,
+    'year': 2023,
+    'genre': '学习',
+    'studio': 'lang',
+}
+
+
+def read_tvshow_nfo(tvshow_nfo_path):
+    """读取 tvshow.nfo，返回电视剧信息字典；文件不存在时返回 None，格式错误时抛出 ET.ParseError"""
+    if not os.path.exists(tvshow_nfo_path):
+        return None
+    root = ET.parse(tvshow_nfo_path).getroot()
+    try:
+        year = int(root.findtext('year', '2000'))
+    except ValueError:
+        year = 2000
+    return {
+        'title': root.findtext('title', ''),
+        'originaltitle': root.findtext('originaltitle', ''),
+        'plot': root.findtext('plot', ''),
+        'year': year,
+        'genre': root.findtext('genre', ''),
+        'studio': root.findtext('studio', ''),
+    }
+
+
+def read_episode_plot(episode_nfo_path):
+    """读取已有剧集 NFO 中的简介；文件不存在或无法解析时返回 None"""
+    try:
+        return ET.parse(episode_nfo_path).getroot().findtext('plot')
+    except (OSError, ET.ParseError):
+        return None
+
+
+def list_video_files(folder_path):
+    """返回文件夹中（不递归）按文件名排序的视频文件名列表"""
+    return media_scanner.list_files(folder_path, VIDEO_EXTENSIONS)
+
+
+def season_from_folder(folder_path):
+    """文件夹名是季文件夹 (见 SEASON_FOLDER_RE) 时返回季数，否则返回 None"""
+    match = SEASON_FOLDER_RE.match(os.path.basename(os.path.normpath(folder_path)))
+    if not match:
+        return None
+    if match.group('specials'):
+        return 0
+    return int(match.group('season') or match.group('short') or match.group('cn'))
+
+
+def find_season_folders(show_root):
+    """返回电视剧根目录下直接包含视频的季文件夹 [(路径, 季数), ...]，按季数排序"""
+    seasons = []
+    try:
+        names = os.listdir(show_root)
+    except OSError:
+        return seasons
+    for name in names:
+        path = os.path.join(show_root, name)
+        season = season_from_folder(name)
+        if season is not None and os.path.isdir(path) and list_video_files(path):
+            seasons.append((path, season))
+    return sorted(seasons, key=lambda item: (item[1], item[0]))
+
+
+def find_show_folders(root_path):
+    """
+    递归查找媒体库中的电视剧文件夹（直接包含视频文件的文件夹）。
+
+    季文件夹 (Season 1、S01 等) 不单独列出，而是以其上一级文件夹作为电视剧根目录，
+    交给 generate_show_nfo_files 一次处理所有季。
+    """
+    show_folders = []
+    seen = set()
+    for dirpath, dirnames, filenames in os.walk(root_path):
+        dirnames.sort()
+        if not any(os.path.splitext(f)[1].lower() in VIDEO_EXTENSIONS for f in filenames):
+            continue
+        if season_from_folder(dirpath) is not None and os.path.normpath(dirpath) != os.path.normpath(root_path):
+            dirpath = os.path.dirname(os.path.normpath(dirpath))
+        if dirpath not in seen:
+            seen.add(dirpath)
+            show_folders.append(dirpath)
+    return show_folders
+
+
+def generate_tvshow_nfo(title, originaltitle, plot, year, genre, studio):
+    return nfo_writer.render_nfo('tvshow', [
+        ('title', title),
+        ('originaltitle', originaltitle),
+        ('plot', plot),
+        ('year', year),
+        ('genre', genre),
+        ('studio', studio),
+    ])
+
+
+def generate_episode_nfo(title, episode_plot, season, episode, year, file_title, streamdetails=None,
+                         thumb=None):
+    """
+    streamdetails 为 media_probe.summarize 的结果，提供时写入 <fileinfo><streamdetails>；
+    thumb 为缩略图文件名（与 NFO 在同一文件夹）
+    """
+    file_title = re.sub(r'^\d+\s*[\.\-]?\s*', '', file_title)
+
+    return nfo_writer.render_nfo('episodedetails', [
+        ('title', file_title),
+        ('showtitle', title),
+        ('season', season),
+        ('episode', episode),
+        ('plot', episode_plot),
+        ('year', year),
+        ('thumb', thumb),
+    ] + (media_probe.streamdetails_fields(streamdetails) if streamdetails else []))
+
+
+def new_summary(folder_path):
+    return {'folder': folder_path, 'videos': 0, 'generated': 0, 'unchanged': 0, 'skipped': 0, 'ai_failed': 0,
+            'ai_requests': 0, 'ai_prompt_tokens': 0}
+
+
+def update_tvshow_nfo(folder_path, show, manifest, emit, regenerate_all=False, only_new=False):
+    """内容或输入有变化时重新生成 tvshow.nfo；only_new 为 True 时只在文件不存在时生成"""
+    tvshow_nfo_path = os.path.join(folder_path, "tvshow.nfo")
+    fields = [show['title'], show['originaltitle'], show['plot'], show['year'], show['genre'], show['studio']]
+    tvshow_digest = nfo_manifest.inputs_digest(fields)
+    if not os.path.exists(tvshow_nfo_path) or (
+            not only_new and (regenerate_all or manifest['tvshow'] != tvshow_digest)):
+        emit(tvshow_nfo_path, generate_tvshow_nfo(*fields))
+        manifest['tvshow'] = tvshow_digest
+
+
+def write_show_root_nfo(show_root, show, regenerate_all=False, only_new=False, plan=None):
+    """
+    为只有季文件夹、没有视频的电视剧根目录生成 tvshow.nfo（参数同 update_tvshow_nfo），
+    清单保存在根目录中；plan 不为 None 时只记入预览 (nfo_writer.plan_nfo)，不写入文件
+    """
+    manifest = nfo_manifest.load_manifest(show_root)
+    if plan is not None:
+        update_tvshow_nfo(show_root, show, manifest,
+                          lambda path, text: nfo_writer.plan_nfo(plan, path, text), regenerate_all, only_new)
+        return
+    update_tvshow_nfo(show_root, show, manifest, nfo_writer.write_nfo, regenerate_all, only_new)
+    nfo_manifest.save_manifest(show_root, manifest)
+
+
+def generate_nfo_files(folder_path, show, regenerate_all=False, ai_settings=None,
+                       on_status=None, on_ai_error=None, on_progress=None, only_files=None, probe=False,
+                       thumb_offset=None, dry_run=False, write_tvshow=True):
+    """
+    为一个文件夹生成 tvshow.nfo 和各集 NFO。
+
+    show 为电视剧信息字典（键同 DEFAULT_SHOW）。
+    ai_settings 不为 None 时用 AI 生成每集简介，格式为
+    {'api_key': ..., 'base_url': ..., 'concurrency': ..., 'batch_size': ..., 'rpm': ..., 'tpm': ...,
+     'plot_budget': ...}（plot_budget 为电视剧简介的 token 预算，见 prompt_budget.py）；
+    各集请求并发发出（限流与重试见 ai_client.py），
+    哪一集的简介先返回就先写哪一集的 NFO，batch_size 大于 1 时多集合并为一个请求。
+    不勾选 regenerate_all 时依据文件夹中的清单 (nfo_manifest.py) 只重新生成视频或输入有变化的 NFO。
+    on_status(message) 用于汇报进度，on_ai_error(video_title, error) 在 AI 生成失败时调用，
+    on_progress(done, total, video_file) 在每写完一集后调用（total 为需要生成的集数），
+    回调中抛出的异常（如用户取消）会中止生成，已写入的 NFO 仍会记入清单。
+    失败的集会改用电视剧简介。内容与磁盘上相同的 NFO 不重写，计入 unchanged。返回统计字典。
+    only_files 为视频文件名集合时只处理其中的文件（集数仍按整个文件夹分配），
+    并且 tvshow.nfo 只在不存在时才生成，供 nfo_watch.py 处理新到的视频。
+    probe 为 True 时用 ffprobe 并行读取需要生成的视频的流信息（结果有缓存，见 media_probe.py），
+    写入 <fileinfo><streamdetails>；探测失败的集下次运行时会重试。
+    thumb_offset 不为 None 时在该秒数处为需要生成的集截取缩略图 (见 thumbnails.py)，写入 <thumb>。
+    dry_run 为 True 时只在内存中生成并与现有文件比较，不写入任何文件（NFO、清单、缩略图），
+    也不请求 AI（沿用现有 NFO 中的简介），结果见 summary['plan'] (nfo_writer.new_plan)，
+    包括 tvshow.nfo 在内；generated 为会写入的集数。
+    show['season'] 为文件夹中各集的季数，文件名为 SxxEyy 格式时改用文件名中的季数。
+    write_tvshow 为 False 时不生成 tvshow.nfo（季文件夹，tvshow.nfo 在上一级的电视剧根目录中）。
+    """
+    summary = new_summary(folder_path)
+    if dry_run:
+        summary['plan'] = nfo_writer.new_plan()
+
+    def emit(path, text):
+        if dry_run:
+            return nfo_writer.plan_nfo(summary['plan'], path, text)
+        return nfo_writer.write_nfo(path, text)
+
+    video_files = list_video_files(folder_path)
+    summary['videos'] = len(video_files)
+    if not video_files:
+        return summary
+
+    title = show['title']
+    plot = show['plot']
+    season = show['season']
+    year = show['year']
+
+    manifest = nfo_manifest.load_manifest(folder_path)
+    try:
+        if write_tvshow:
+            update_tvshow_nfo(folder_path, show, manifest, emit, regenerate_all, only_files is not None)
+
+        # 第一步：确定需要生成的剧集
+        pending = {}
+        current_episode_counter = show['episode']
+
+        for video_file, parsed in zip(video_files, episode_parser.parse_filenames(video_files)):
+            base_name = os.path.splitext(video_file)[0]
+            episode_nfo_path = os.path.join(folder_path, f"{base_name}.nfo")
+
+            video_file_title = parsed.title
+
+            # 集数分配与是否跳过无关，保证同一文件每次得到相同的集数
+            ep_num = parsed.episode
+            if ep_num:
+                final_episode_num = ep_num
+            else:
+                final_episode_num = current_episode_counter
+                current_episode_counter += 1
+            if only_files is not None and video_file not in only_files:
+                continue
+
+            episode_season = season if parsed.season is None else parsed.season
+            plot_source = {'source': 'ai', 'model': ai_plot.DEFAULT_MODEL} if ai_settings else {'source': 'show'}
+            inputs = [title, episode_season, year, plot, final_episode_num, video_file_title, plot_source]
+            signature = nfo_manifest.video_signature(os.path.join(folder_path, video_file))
+            digest = nfo_manifest.inputs_digest(
+                inputs + [PROBE_MARKER] * probe + [THUMB_MARKER] * (thumb_offset is not None))
+
+            if not regenerate_all and os.path.exists(episode_nfo_path):
+                if nfo_manifest.episode_is_current(manifest, video_file, signature, digest):
+                    summary['skipped'] += 1
+                    continue
+                if video_file not in manifest['episodes']:
+                    # 清单出现之前生成（或手工编辑）的 NFO 保持不动，只补记录
+                    nfo_manifest.record_episode(manifest, video_file, signature, digest)
+                    summary['skipped'] += 1
+                    continue
+
+            pending[video_file] = (episode_nfo_path, video_file_title, final_episode_num, inputs, signature,
+                                   episode_season)
+
+        streamdetails = {}
+        if probe and pending:
+            if media_probe.is_available():
+                if on_status:
+                    on_status(f"正在读取 {len(pending)} 个视频的流信息...")
+                paths = media_probe.probe_files([os.path.join(folder_path, video_file) for video_file in pending])
+                streamdetails = {video_file: paths[os.path.join(folder_path, video_file)] for video_file in pending}
+            elif on_status:
+                on_status("未找到 ffprobe，NFO 中不写入视频流信息")
+
+        thumbs = {}
+        if thumb_offset is not None and pending and dry_run:
+            thumbs = {video_file: thumbnails.thumb_path(os.path.join(folder_path, video_file))
+                      for video_file in pending}
+            thumbs = {video_file: thumb for video_file, thumb in thumbs.items()
+                      if thumbnails.is_current(os.path.join(folder_path, video_file), thumb)}
+        elif thumb_offset is not None and pending:
+            if on_status:
+                on_status(f"正在为 {len(pending)} 个视频截取缩略图...")
+            if not thumbnails.is_available() and on_status:
+                on_status("未找到 ffmpeg，只使用已有的缩略图")
+            durations = {os.path.join(folder_path, video_file): details['video'][0].get('durationinseconds')
+                         for video_file, details in streamdetails.items() if details and details['video']}
+            paths = thumbnails.extract_thumbnails(
+                [os.path.join(folder_path, video_file) for video_file in pending], thumb_offset, durations=durations)
+            thumbs = {video_file: paths[os.path.join(folder_path, video_file)] for video_file in pending}
+
+        # 第二步：写入 NFO
+        def write_episode(video_file, episode_plot, error=None):
+            episode_nfo_path, video_file_title, final_episode_num, inputs, signature, episode_season = \
+                pending[video_file]
+            details = streamdetails.get(video_file)
+            thumb = thumbs.get(video_file)
+            if error is not None:
+                summary['ai_failed'] += 1
+                # 记录实际使用的简介来源，下次运行时会重新尝试 AI 生成
+                inputs = inputs[:-1] + [{'source': 'show'}]
+                episode_plot = plot
+                if on_ai_error:
+                    on_ai_error(video_file_title, error)
+            if details:
+                inputs = inputs + [PROBE_MARKER]
+            if thumb:
+                inputs = inputs + [THUMB_MARKER]
+            written = emit(episode_nfo_path, generate_episode_nfo(
+                title, episode_plot, episode_season, final_episode_num, year, video_file_title, details,
+                os.path.basename(thumb) if thumb else None))
+            nfo_manifest.record_episode(manifest, video_file, signature, nfo_manifest.inputs_digest(inputs))
+            summary['generated' if written else 'unchanged'] += 1
+            if on_progress:
+                on_progress(summary['generated'] + summary['unchanged'], len(pending), video_file)
+
+        if ai_settings and pending and dry_run:
+            for video_file, item in pending.items():
+                write_episode(video_file, read_episode_plot(item[0]) or plot)
+        elif ai_settings and pending:
+            if on_status:
+                on_status(f"正在为 {len(pending)} 集生成AI简介...")
+
+            def on_result(video_file, episode_plot, error):
+                write_episode(video_file, episode_plot, error)
+                if on_status and error is None:
+                    on_status(f"'{pending[video_file][1]}' 的AI简介已生成！"
+                              f"({summary['generated']}/{len(pending)})")
+
+            jobs = [(video_file, title, plot, item[2], item[1]) for video_file, item in pending.items()]
+            stats = {'requests': 0, 'prompt_tokens': 0}
+            try:
+                ai_plot.generate_plots_concurrently(
+                    ai_settings['api_key'], ai_settings.get('base_url', ai_plot.DEFAULT_BASE_URL), jobs,
+                    on_result, ai_settings.get('concurrency', ai_plot.DEFAULT_CONCURRENCY),
+                    ai_settings.get('batch_size', 1), ai_settings.get('rpm'), ai_settings.get('tpm'),
+                    ai_settings.get('plot_budget', prompt_budget.DEFAULT_PLOT_BUDGET), stats)
+            finally:
+                summary['ai_requests'] = stats['requests']
+                summary['ai_prompt_tokens'] = stats['prompt_tokens']
+        else:
+            for video_file in pending:
+                write_episode(video_file, plot)
+    finally:
+        if not dry_run:
+            nfo_manifest.prune_manifest(manifest, video_files)
+            nfo_manifest.save_manifest(folder_path, manifest)
+
+    return summary
+
+
+def generate_show_nfo_files(show_root, show, regenerate_all=False, ai_settings=None,
+                            on_status=None, on_ai_error=None, on_progress=None, probe=False,
+                            thumb_offset=None, dry_run=False, workers=None):
+    """
+    为一部电视剧生成 NFO：根目录下有季文件夹 (见 find_season_folders) 时，
+    在根目录写一个 tvshow.nfo，各季（以及根目录中直接存放的视频）作为独立任务并行生成，
+    季数取自文件夹名；没有季文件夹时与 generate_nfo_files 相同。
+
+    workers 为同时生成的季数（None 表示 DEFAULT_SEASON_WORKERS），其余参数同 generate_nfo_files，
+    回调可能在多个线程中调用；on_progress 的 done/total 为已开始的各季之和。
+    返回合并后的统计字典，另有 seasons（季文件夹数）。
+    """
+    seasons = find_season_folders(show_root)
+    if not seasons:
+        return generate_nfo_files(
+            show_root, show, regenerate_all, ai_settings, on_status, on_ai_error, on_progress,
+            probe=probe, thumb_offset=thumb_offset, dry_run=dry_run)
+
+    summary = new_summary(show_root)
+    summary['seasons'] = len(seasons)
+    if dry_run:
+        summary['plan'] = nfo_writer.new_plan()
+    tasks = [(path, dict(show, season=season), False) for path, season in seasons]
+    if list_video_files(show_root):
+        # 根目录中的视频使用界面或 tvshow.nfo 中的季数，tvshow.nfo 随这一任务生成
+        tasks.insert(0, (show_root, show, True))
+    else:
+        write_show_root_nfo(show_root, show, regenerate_all, plan=summary.get('plan'))
+
+    lock = threading.Lock()
+    progress = {}
+
+    def run_season(folder_path, season_show, write_tvshow):
+        def season_progress(done, total, video_file):
+            with lock:
+                progress[folder_path] = (done, total)
+                done = sum(item[0] for item in progress.values())
+                total = sum(item[1] for item in progress.values())
+            on_progress(done, total, video_file)
+
+        return generate_nfo_files(
+            folder_path, season_show, regenerate_all, ai_settings, on_status, on_ai_error,
+            season_progress if on_progress else None, probe=probe, thumb_offset=thumb_offset,
+            dry_run=dry_run, write_tvshow=write_tvshow)
+
+    if on_status:
+        on_status(f"找到 {len(seasons)} 季，正在并行生成...")
+    with ThreadPoolExecutor(max_workers=max(1, workers or DEFAULT_SEASON_WORKERS)) as executor:
+        futures = [executor.submit(run_season, *task) for task in tasks]
+        try:
+            for future in as_completed(futures):
+                season_summary = future.result()
+                for key in SUMMARY_COUNTERS:
+                    summary[key] += season_summary[key]
+                if 'plan' in season_summary:
+                    nfo_writer.merge_plan(summary['plan'], season_summary['plan'])
+        except BaseException:
+            # 某一季失败或被取消时不再开始其余的季；已在运行的季会在下一次回调时停止（如用户取消）
+            for future in futures:
+                future.cancel()
+            raise
+    return summary
+
+
+def load_show_for_folder(folder_path, defaults=None):
+    """
+    合并默认值与文件夹中已有的 tvshow.nfo 信息；没有标题时使用文件夹名。
+
+    folder_path 为季文件夹时读取上一级电视剧根目录的信息，季数取自文件夹名。
+    """
+    season = season_from_folder(folder_path)
+    if season is not None:
+        show = load_show_for_folder(os.path.dirname(os.path.normpath(folder_path)), defaults)
+        show['season'] = season
+        return show
+    show = dict(DEFAULT_SHOW)
+    if defaults:
+        show.update(defaults)
+    try:
+        existing = read_tvshow_nfo(os.path.join(folder_path, "tvshow.nfo"))
+    except ET.ParseError:
+        existing = None
+    if existing:
+        show.update({k: v for k, v in existing.items() if v not in ('', None)})
+    if not show['title']:
+        show['title'] = os.path.basename(os.path.normpath(folder_path))
+    return show
+
+
+def _generate_folder_task(folder_path, defaults, regenerate_all, ai_settings, probe=False, thumb_offset=None,
+                          dry_run=False):
+    """进程池中的单个任务：处理一个电视剧文件夹"""
+    start = time.time()
+    try:
+        show = load_show_for_folder(folder_path, defaults)
+        errors = []
+        summary = generate_show_nfo_files(
+            folder_path, show, regenerate_all, ai_settings,
+            on_ai_error=lambda video_title, e: errors.append(f"{video_title}: {e}"),
+            probe=probe, thumb_offset=thumb_offset, dry_run=dry_run)
+        summary['errors'] = errors
+    except Exception as e:
+        summary = new_summary(folder_path)
+        summary.update({'errors': [str(e)], 'failed': True})
+    summary['elapsed'] = time.time() - start
+    return summary
+
+
+def generate_library(root_path, defaults=None, regenerate_all=False, ai_settings=None,
+                     workers=None, on_progress=None, probe=False, thumb_offset=None, dry_run=False):
+    """
+    遍历媒体库根目录，并行处理每个电视剧文件夹；有季文件夹的电视剧在同一进程中
+    并行处理各季 (见 generate_show_nfo_files)。
+
+    workers 为进程数（None 表示使用 CPU 核心数），ai_settings 同 generate_nfo_files，
+    其中的并发上限对每个进程分别生效；on_progress(done, total, folder_summary)
+    在每个文件夹完成后调用。probe、thumb_offset 同 generate_nfo_files，
+    每个进程各自限制 ffprobe 和 ffmpeg 的并行数。
+    dry_run 时不写入任何文件，各文件夹的预览结果合并到 report['plan']。
+    返回整个媒体库的汇总字典。
+    """
+    start = time.time()
+    show_folders = find_show_folders(root_path)
+    total = len(show_folders)
+    report = {'folders': total, 'failed_folders': 0, 'videos': 0, 'generated': 0, 'unchanged': 0,
+              'skipped': 0, 'ai_failed': 0, 'ai_requests': 0, 'ai_prompt_tokens': 0, 'results': []}
+    if dry_run:
+        report['plan'] = nfo_writer.new_plan()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_generate_folder_task, folder, defaults, regenerate_all, ai_settings,
+                                   probe, thumb_offset, dry_run)
+                   for folder in show_folders]
+        for done, future in enumerate(as_completed(futures), 1):
+            summary = future.result()
+            report['results'].append(summary)
+            if summary.get('failed'):
+                report['failed_folders'] += 1
+            for key in SUMMARY_COUNTERS:
+                report[key] += summary[key]
+            if 'plan' in summary:
+                nfo_writer.merge_plan(report['plan'], summary['plan'])
+            if on_progress:
+                on_progress(done, total, summary)
+
+    report['elapsed'] = time.time() - start
+    return report
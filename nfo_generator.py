@@ -1,6 +1,10 @@
 import os
 import sys
 import re
+import episode_parser
+import nfo_writer
+import media_scanner
+from nfo_worker import ProgressPanel
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QLineEdit, QTextEdit, QPushButton, QFileDialog, 
                             QMessageBox, QSpinBox, QComboBox)
@@ -26,6 +30,11 @@ class NFOGenerator(QMainWindow):
         self.folder_button.clicked.connect(self.select_folder)
         self.main_layout.addWidget(self.folder_button)
         
+        # 进度条（生成时显示）
+        self.progress_panel = ProgressPanel()
+        self.progress_panel.running_changed.connect(self.folder_button.setDisabled)
+        self.main_layout.addWidget(self.progress_panel)
+        
         # 创建状态栏
         self.statusBar().showMessage("就绪")
         
@@ -111,100 +120,87 @@ class NFOGenerator(QMainWindow):
             
             # 获取视频文件列表
             video_extensions = ['.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv']
-            video_files = [f for f in os.listdir(folder_path) 
-                          if os.path.isfile(os.path.join(folder_path, f)) 
-                          and os.path.splitext(f)[1].lower() in video_extensions]
+            video_files = media_scanner.list_files(folder_path, video_extensions)
             
             if not video_files:
                 QMessageBox.warning(self, "警告", "所选文件夹中没有找到视频文件!")
                 return
             
-            # 生成主TVShow NFO文件
-            tvshow_nfo_path = os.path.join(folder_path, "tvshow.nfo")
-            with open(tvshow_nfo_path, 'w', encoding='utf-8') as f:
-                f.write(self.generate_tvshow_nfo(title, originaltitle, plot, year, genre, studio))
-            
-            # 为每个视频文件生成剧集NFO文件
-            current_episode = episode
-            # print(video_files)
-            for video_file in video_files:
-                video_file_title=video_file.split('.')[-2]
-                print(video_file_title)
-                try:
-                    video_file_title=video_file_title.split(']')[-1]
-                    video_file_title=video_file_title.split('-')[-1]
-                except:
-                    pass
-                # 尝试从文件名中提取集数
-                ep_num = self.extract_episode_number(video_file)
-                if ep_num:
-                    current_episode = ep_num
-                
-                # 创建剧集NFO文件
-                base_name = os.path.splitext(video_file)[0]
-                episode_nfo_path = os.path.join(folder_path, f"{base_name}.nfo")
-                with open(episode_nfo_path, 'w', encoding='utf-8') as f:
-                    f.write(self.generate_episode_nfo(title, plot, season, current_episode, year,video_file_title))
+            # 在后台线程中写入，界面保持响应，可随时取消
+            def task(worker):
+                # 生成主TVShow NFO文件
+                tvshow_nfo_path = os.path.join(folder_path, "tvshow.nfo")
+                nfo_writer.write_nfo(tvshow_nfo_path, self.generate_tvshow_nfo(title, originaltitle, plot, year, genre, studio))
                 
-                current_episode += 1
+                # 为每个视频文件生成剧集NFO文件
+                current_episode = episode
+                for done, video_file in enumerate(video_files, 1):
+                    video_file_title = episode_parser.extract_title(video_file)
+                    # 尝试从文件名中提取集数
+                    ep_num = self.extract_episode_number(video_file)
+                    if ep_num:
+                        current_episode = ep_num
+                    
+                    # 创建剧集NFO文件
+                    base_name = os.path.splitext(video_file)[0]
+                    episode_nfo_path = os.path.join(folder_path, f"{base_name}.nfo")
+                    nfo_writer.write_nfo(episode_nfo_path, self.generate_episode_nfo(title, plot, season, current_episode, year,video_file_title))
+                    
+                    current_episode += 1
+                    worker.report(done, len(video_files), video_file)
+                return len(video_files)
             
-            QMessageBox.information(self, "成功", f"已成功生成 {len(video_files) + 1} 个NFO文件!")
-            self.statusBar().showMessage(f"已为 {len(video_files)} 个视频文件生成NFO文件")
+            self.statusBar().showMessage("正在生成NFO文件...")
+            self.progress_panel.start(task, self.on_generation_finished, self.on_generation_failed,
+                                      self.on_generation_cancelled)
             
         except Exception as e:
             QMessageBox.critical(self, "错误", f"生成NFO文件时出错: {str(e)}")
             self.statusBar().showMessage(f"错误: {str(e)}")
     
+    def on_generation_finished(self, count):
+        QMessageBox.information(self, "成功", f"已成功生成 {count + 1} 个NFO文件!")
+        self.statusBar().showMessage(f"已为 {count} 个视频文件生成NFO文件")
+    
+    def on_generation_failed(self, message):
+        QMessageBox.critical(self, "错误", f"生成NFO文件时出错: {message}")
+        self.statusBar().showMessage(f"错误: {message}")
+    
+    def on_generation_cancelled(self):
+        self.statusBar().showMessage("已取消生成")
+    
+    def closeEvent(self, event):
+        self.progress_panel.stop()
+        super().closeEvent(event)
+    
     def generate_tvshow_nfo(self, title, originaltitle, plot, year, genre, studio):
-        return f"""<?xml version="1.0" encoding="UTF-8"?>
-<tvshow>
-    <title>{title}</title>
-    <originaltitle>{originaltitle}</originaltitle>
-    <plot>{plot}</plot>
-    <year>{year}</year>
-    <genre>{genre}</genre>
-    <studio>{studio}</studio>
-</tvshow>"""
+        return nfo_writer.render_nfo('tvshow', [
+            ('title', title),
+            ('originaltitle', originaltitle),
+            ('plot', plot),
+            ('year', year),
+            ('genre', genre),
+            ('studio', studio),
+        ])
     
     def generate_episode_nfo(self, title, plot, season, episode, year,file_title):
-        
-        #处理文件名中的特殊字符&
-        try:
-            file_title = file_title.replace('&','-')
-        except:
-            pass
         try:
             file_title = re.sub(r'^\d+\s+', '', file_title)  # 去除开头的数字和空格
         except:
             pass
 
-        return f"""<?xml version="1.0" encoding="UTF-8"?>
-<episodedetails>
-    <title>{file_title}</title>
-    <showtitle>{title}</showtitle>
-    <plot>{plot}</plot>
-    <season>{season}</season>
-    <episode>{episode}</episode>
-    <year>{year}</year>
-</episodedetails>"""
+        return nfo_writer.render_nfo('episodedetails', [
+            ('title', file_title),
+            ('showtitle', title),
+            ('plot', plot),
+            ('season', season),
+            ('episode', episode),
+            ('year', year),
+        ])
     
     def extract_episode_number(self, filename):
-        # 尝试从文件名中提取集数
-        # 匹配常见格式如 [P01], E01, 第1集等
-        patterns = [
-            r'\[P(\d+)\]',    # 匹配 [P01] 格式
-            r'E(\d+)',        # 匹配 E01 格式
-            r'第(\d+)集'      # 匹配 第1集 格式
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, filename)
-            if match:
-                try:
-                    return int(match.group(1))
-                except ValueError:
-                    continue
-        return None
+        # 集数识别规则统一在 episode_parser.py 中
+        return episode_parser.extract_episode_number(filename)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
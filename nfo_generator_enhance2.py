@@ -1,22 +1,21 @@
 import os
 import sys
-import re
 import xml.etree.ElementTree as ET
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLabel, QLineEdit, QTextEdit, QPushButton, QFileDialog,
                              QMessageBox, QSpinBox, QCheckBox)
 from PyQt5.QtCore import Qt
-from config import qwen_api
-# AI 功能需要 openai 库, 如果你打算使用此功能,
-# 请先通过命令行安装: pip install openai
-try:
-    import openai
-except ImportError:
-    # 允许在没有安装 openai 库的情况下运行程序，但AI功能将不可用
-    openai = None
+from PyQt5.QtGui import QTextCursor
+# 生成逻辑位于 nfo_core.py (不依赖界面，也供 nfo_batch.py 命令行使用)
+import ai_plot
+import nfo_core
+import episode_parser
+import media_probe
+import thumbnails
+from nfo_worker import ProgressPanel, NFOWorker
 
 """qwen_api = "sk-xxxxxxxx" """
-global_api_key = qwen_api
+# 默认 API Key 在第一次使用AI时才读取 (环境变量或 config.py)，见 ai_plot.get_default_api_key
 
 class NFOGenerator(QMainWindow):
     def __init__(self):
@@ -35,6 +34,8 @@ class NFOGenerator(QMainWindow):
         # 创建控制按钮和选项布局
         self.create_controls_layout()
         self.fold_path = None
+        self.ai_failed_titles = []
+        self.preview_worker = None
         
         # 创建状态栏
         self.statusBar().showMessage("就绪")
@@ -51,6 +52,8 @@ class NFOGenerator(QMainWindow):
         self.add_spin_box(spin_boxes_layout, "季数", "season", 1, 1, 100)
         self.add_spin_box(spin_boxes_layout, "起始集数", "episode", 1, 1, 100)
         self.add_spin_box(spin_boxes_layout, "年份", "year", 2023, 1900, 2100)
+        self.add_spin_box(spin_boxes_layout, "AI并发数", "ai_concurrency", ai_plot.DEFAULT_CONCURRENCY, 1, 64)
+        self.add_spin_box(spin_boxes_layout, "每批集数", "ai_batch_size", 1, 1, 50)
         form_layout.addLayout(spin_boxes_layout)
         
         self.add_text_field(form_layout, "类型", "genre", "学习")
@@ -67,13 +70,31 @@ class NFOGenerator(QMainWindow):
         options_layout = QHBoxLayout()
         self.regenerate_all_checkbox = QCheckBox("为所有视频文件重新生成NFO")
         self.regenerate_all_checkbox.setChecked(False)
-        self.regenerate_all_checkbox.setToolTip("如果不勾选，则只为没有NFO文件的视频生成")
+        self.regenerate_all_checkbox.setToolTip("如果不勾选，则只为新增、有变化的视频或信息有改动的剧集生成NFO")
         options_layout.addWidget(self.regenerate_all_checkbox)
         
         self.ai_generate_checkbox = QCheckBox("使用AI为每集生成简介")
         self.ai_generate_checkbox.setChecked(True)
         self.ai_generate_checkbox.setToolTip("需要提供有效的OpenAI API Key，并联网")
         options_layout.addWidget(self.ai_generate_checkbox)
+
+        self.probe_checkbox = QCheckBox("写入视频流信息")
+        self.probe_checkbox.setChecked(media_probe.is_available())
+        self.probe_checkbox.setEnabled(media_probe.is_available())
+        self.probe_checkbox.setToolTip("用 ffprobe 读取编码、分辨率、时长和音轨，写入NFO的 <fileinfo>（需要安装 ffmpeg）")
+        options_layout.addWidget(self.probe_checkbox)
+
+        self.thumb_checkbox = QCheckBox("截取每集缩略图")
+        self.thumb_checkbox.setChecked(False)
+        self.thumb_checkbox.setEnabled(thumbnails.is_available())
+        self.thumb_checkbox.setToolTip(f"用 ffmpeg 截取第 {thumbnails.DEFAULT_OFFSET:.0f} 秒的画面，"
+                                       "保存为 <文件名>-thumb.jpg 并写入NFO（需要安装 ffmpeg）")
+        options_layout.addWidget(self.thumb_checkbox)
+
+        self.dry_run_checkbox = QCheckBox("仅预览 (不写入)")
+        self.dry_run_checkbox.setChecked(False)
+        self.dry_run_checkbox.setToolTip("只统计会新建、改变和内容不变的NFO并显示差异，不写入任何文件，也不请求AI")
+        options_layout.addWidget(self.dry_run_checkbox)
         controls_layout.addLayout(options_layout)
 
         # 操作按钮
@@ -85,8 +106,25 @@ class NFOGenerator(QMainWindow):
         self.generate_button = QPushButton("选择文件夹并生成 NFO")
         self.generate_button.clicked.connect(self.select_folder_and_generate)
         buttons_layout.addWidget(self.generate_button)
+
+        self.preview_button = QPushButton("AI预览单集简介")
+        self.preview_button.setToolTip("为文件夹中的第一集生成简介并逐字显示，可先检查电视剧简介是否合适；"
+                                       "逐集生成时预览过的简介会直接使用")
+        self.preview_button.clicked.connect(self.preview_episode_plot)
+        buttons_layout.addWidget(self.preview_button)
         controls_layout.addLayout(buttons_layout)
 
+        self.plot_preview = QTextEdit()
+        self.plot_preview.setReadOnly(True)
+        self.plot_preview.setMaximumHeight(90)
+        self.plot_preview.setPlaceholderText("单集简介预览")
+        controls_layout.addWidget(self.plot_preview)
+
+        self.progress_panel = ProgressPanel()
+        self.progress_panel.running_changed.connect(self.generate_button.setDisabled)
+        self.progress_panel.running_changed.connect(self.load_nfo_button.setDisabled)
+        controls_layout.addWidget(self.progress_panel)
+
         self.main_layout.addWidget(controls_widget)
 
     def add_text_field(self, layout, label_text, attr_name, default_text=""):
@@ -169,6 +207,60 @@ class NFOGenerator(QMainWindow):
             # QMessageBox.information(self, "成功", "已成功从 tvshow.nfo 加载信息。")
         except:
             pass
+    def preview_episode_plot(self):
+        # 预览过程中再次点击按钮为停止
+        if self.preview_worker is not None:
+            self.preview_worker.cancel()
+            self.preview_button.setEnabled(False)
+            return
+
+        api_key = self.api_key.text() or ai_plot.get_default_api_key()
+        if not ai_plot.is_available() or not api_key:
+            QMessageBox.warning(self, "AI功能警告", "请确保已安装'openai'库并填写了API Key。")
+            return
+        folder_path = self.fold_path
+        if folder_path is None:
+            folder_path = QFileDialog.getExistingDirectory(self, "选择视频文件夹")
+            if not folder_path:
+                return
+            self.detect_tvshow_file(os.path.join(folder_path, "tvshow.nfo"))
+            self.fold_path = folder_path
+        video_files = nfo_core.list_video_files(folder_path)
+        if not video_files:
+            QMessageBox.warning(self, "警告", "所选文件夹中没有找到视频文件!")
+            return
+
+        show_title = self.title.text()
+        show_plot = self.plot.toPlainText()
+        episode_title = episode_parser.parse_filename(video_files[0]).title
+        client = ai_plot.create_ai_client(api_key, ai_plot.DEFAULT_BASE_URL)
+
+        def task(worker):
+            return ai_plot.stream_ai_generated_plot(client, show_title, show_plot, episode_title, worker.send_text)
+
+        self.plot_preview.clear()
+        worker = NFOWorker(task, self)
+        worker.text_received.connect(self.append_preview_text)
+        worker.succeeded.connect(lambda text: self.statusBar().showMessage(f"'{episode_title}' 的简介预览已生成"))
+        worker.failed.connect(lambda message: self.statusBar().showMessage(f"简介预览失败: {message}"))
+        worker.cancelled.connect(lambda: self.statusBar().showMessage("已停止预览"))
+        worker.finished.connect(self.on_preview_finished)
+        self.preview_worker = worker
+        self.preview_button.setText("停止预览")
+        self.statusBar().showMessage(f"正在为 '{episode_title}' 生成简介预览...")
+        worker.start()
+
+    def append_preview_text(self, text):
+        cursor = self.plot_preview.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        cursor.insertText(text)
+        self.plot_preview.setTextCursor(cursor)
+
+    def on_preview_finished(self):
+        self.preview_worker = None
+        self.preview_button.setText("AI预览单集简介")
+        self.preview_button.setEnabled(True)
+
     def select_folder_and_generate(self):
         if self.fold_path is  None:
             folder_path = QFileDialog.getExistingDirectory(self, "选择视频文件夹")
@@ -181,171 +273,115 @@ class NFOGenerator(QMainWindow):
     def generate_nfo_files(self, folder_path):
         try:
             # 获取用户输入
-            title = self.title.text()
-            originaltitle = self.originaltitle.text()
-            plot = self.plot.toPlainText()
-            season = self.season.value()
-            episode_start = self.episode.value()
-            year = self.year.value()
-            genre = self.genre.text()
-            studio = self.studio.text()
+            show = {
+                'title': self.title.text(),
+                'originaltitle': self.originaltitle.text(),
+                'plot': self.plot.toPlainText(),
+                'season': self.season.value(),
+                'episode': self.episode.value(),
+                'year': self.year.value(),
+                'genre': self.genre.text(),
+                'studio': self.studio.text(),
+            }
             
             # 检查AI选项
             use_ai = self.ai_generate_checkbox.isChecked()
             api_key = self.api_key.text()
-            #如果没有api_key输入则用默认api_key，global_api_key默认为None
+            #如果没有api_key输入则用默认api_key (环境变量或 config.py 中的 qwen_api)，都没有时为None
             if not api_key:
-                api_key = global_api_key
-            if use_ai and (not openai or not api_key):
+                api_key = ai_plot.get_default_api_key()
+            if use_ai and (not ai_plot.is_available() or not api_key):
                 QMessageBox.warning(self, "AI功能警告", "请勾选AI功能前，确保已安装'openai'库并填写了API Key。")
                 return
 
-            video_extensions = ['.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv']
-            video_files = sorted([f for f in os.listdir(folder_path) 
-                                if os.path.isfile(os.path.join(folder_path, f)) 
-                                and os.path.splitext(f)[1].lower() in video_extensions])
-            
-            if not video_files:
+            # 所选文件夹可以是只包含季文件夹 (Season 1、S01 等) 的电视剧根目录
+            if not nfo_core.list_video_files(folder_path) and not nfo_core.find_season_folders(folder_path):
                 QMessageBox.warning(self, "警告", "所选文件夹中没有找到视频文件!")
                 return
             
-            tvshow_nfo_path = os.path.join(folder_path, "tvshow.nfo")
-            with open(tvshow_nfo_path, 'w', encoding='utf-8') as f:
-                f.write(self.generate_tvshow_nfo(title, originaltitle, plot, year, genre, studio))
-            
             regenerate_all = self.regenerate_all_checkbox.isChecked()
-            current_episode_counter = episode_start
-            nfo_generated_count = 0
+            probe = self.probe_checkbox.isChecked()
+            thumb_offset = thumbnails.DEFAULT_OFFSET if self.thumb_checkbox.isChecked() else None
+            dry_run = self.dry_run_checkbox.isChecked()
             
-            # 初始化AI客户端（如果需要）
-            ai_client = None
+            # AI 请求参数（如果需要）
+            ai_settings = None
             if use_ai:
-                try:
-                    ai_client = openai.OpenAI(api_key=api_key,base_url='https://dashscope.aliyuncs.com/compatible-mode/v1')
-                except Exception as e:
-                    QMessageBox.critical(self, "AI 初始化失败", f"无法初始化OpenAI客户端: {e}")
-                    return
-
-            for video_file in video_files:
-                base_name = os.path.splitext(video_file)[0]
-                episode_nfo_path = os.path.join(folder_path, f"{base_name}.nfo")
-
-                if not regenerate_all and os.path.exists(episode_nfo_path):
-                    continue
-
-                video_file_title = base_name
-                try:
-                    video_file_title = video_file_title.split(']')[-1].strip()
-                    video_file_title = video_file_title.split('-')[-1].strip()
-                except:
-                    pass
-                
-                ep_num = self.extract_episode_number(video_file)
-                if ep_num:
-                    final_episode_num = ep_num
-                else:
-                    final_episode_num = current_episode_counter
-                    current_episode_counter += 1
-
-                episode_plot = plot
-                if use_ai and ai_client:
-                    self.statusBar().showMessage(f"正在为 '{video_file_title}' 生成AI简介...")
-                    QApplication.processEvents()
-                    try:
-                        episode_plot = self.get_ai_generated_plot(ai_client, title, plot, video_file_title)
-                        self.statusBar().showMessage(f"'{video_file_title}' 的AI简介已生成！")
-                    except Exception as e:
-                        QMessageBox.warning(self, "AI生成失败", f"为 {video_file_title} 生成简介失败: {e}\n将使用默认简介。")
-                        self.statusBar().showMessage(f"AI简介生成失败，使用默认简介。")
-
-                with open(episode_nfo_path, 'w', encoding='utf-8') as f:
-                    f.write(self.generate_episode_nfo(title, episode_plot, season, final_episode_num, year, video_file_title))
-                
-                nfo_generated_count += 1
-            
-            QMessageBox.information(self, "成功", f"操作完成！\n总共生成了 {nfo_generated_count + 1} 个NFO文件 (包含tvshow.nfo)。")
-            self.statusBar().showMessage(f"已为 {nfo_generated_count} 个视频文件生成了NFO")
+                ai_settings = {
+                    'api_key': api_key,
+                    'base_url': ai_plot.DEFAULT_BASE_URL,
+                    'concurrency': self.ai_concurrency.value(),
+                    'batch_size': self.ai_batch_size.value(),
+                }
+
+            self.ai_failed_titles = []
+
+            # 在后台线程中生成，界面保持响应，可随时取消
+            def task(worker):
+                def on_ai_error(video_file_title, error):
+                    self.ai_failed_titles.append(f"{video_file_title}: {error}")
+                    worker.set_status(f"'{video_file_title}' 的AI简介生成失败，使用默认简介。")
+
+                return nfo_core.generate_show_nfo_files(
+                    folder_path, show, regenerate_all, ai_settings,
+                    on_status=worker.set_status, on_ai_error=on_ai_error, on_progress=worker.report,
+                    probe=probe, thumb_offset=thumb_offset, dry_run=dry_run)
+
+            self.statusBar().showMessage("正在生成NFO文件...")
+            self.progress_panel.start(task, self.on_generation_finished, self.on_generation_failed,
+                                      self.on_generation_cancelled, self.statusBar().showMessage)
             
         except Exception as e:
             QMessageBox.critical(self, "错误", f"生成NFO文件时出错: {str(e)}")
             self.statusBar().showMessage(f"错误: {str(e)}")
 
-    def get_ai_generated_plot(self, client, show_title, show_plot, episode_title):
-        """
-        使用新版 openai>1.0.0 的 API 调用方式
-        """
-        if not openai:
-            raise ImportError("OpenAI library is not installed.")
-        
-        prompt = f"""
-        你是一位专业的电视剧剧情摘要助手。
-        请根据以下信息，为指定的一集生成一段引人入胜、简洁明了的剧情简介。
-
-        电视剧名称: {show_title}
-        电视剧主线剧情: {show_plot}
-        本集标题: {episode_title}
-
-        请只输出为 "{episode_title}" 这一集生成的剧情简介，不要包含“本集简介是：”或任何多余的客套话。
-        """
-        # client.base_url = "https://dashscope.aliyuncs.com/compatible-mode/v1"
-        # 新版 API 调用方式
-        response = client.chat.completions.create(
-            model="qwen3-235b-a22b",
-            messages=[
-                {"role": "system", "content": "你是一位专业的电视剧剧情摘要助手。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            extra_body={"enable_thinking": False},
-
-        )
-        
-        # 新版获取返回内容的方式
-        return response.choices[0].message.content.strip()
-
-    def generate_tvshow_nfo(self, title, originaltitle, plot, year, genre, studio):
-        return f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
-<tvshow>
-    <title>{title}</title>
-    <originaltitle>{originaltitle}</originaltitle>
-    <plot>{plot}</plot>
-    <year>{year}</year>
-    <genre>{genre}</genre>
-    <studio>{studio}</studio>
-</tvshow>"""
-    
-    def generate_episode_nfo(self, title, episode_plot, season, episode, year, file_title):
-        file_title = file_title.replace('&', '-')
-        file_title = re.sub(r'^\d+\s*[\.\-]?\s*', '', file_title)
-
-        return f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
-<episodedetails>
-    <title>{file_title}</title>
-    <showtitle>{title}</showtitle>
-    <season>{season}</season>
-    <episode>{episode}</episode>
-    <plot>{episode_plot}</plot>
-    <year>{year}</year>
-</episodedetails>"""
-    
-    def extract_episode_number(self, filename):
-        patterns = [
-            r'\[P(\d+)\]',            # 匹配 [P01] 格式
-            r'[._ \-][Ee][Pp]?(\d+)', # E01, Ep01, ep01, -E01
-            r'[Ss]\d+[Ee](\d+)',      # S01E01
-            r'\[(\d+)\]',            # [01]
-            r'第(\d+)[集话]',        # 第1集, 第1话
-            r'^[^\w]*(\d+)[._ \-]'   # 01. xxx, 01-xxx, 01 xxx (在文件名开头)
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, filename, re.IGNORECASE)
-            if match:
-                try:
-                    return int(match.groups()[-1])
-                except (ValueError, IndexError):
-                    continue
-        return None
+    def show_ai_failures(self):
+        # AI 失败的集（已重试过）汇总后只提示一次
+        if self.ai_failed_titles:
+            failed_text = "\n".join(self.ai_failed_titles[:20])
+            if len(self.ai_failed_titles) > 20:
+                failed_text += f"\n... 共 {len(self.ai_failed_titles)} 集"
+            QMessageBox.warning(self, "AI生成失败", f"以下剧集的简介生成失败，已使用默认简介:\n{failed_text}")
+
+    def on_generation_finished(self, summary):
+        if 'plan' in summary:
+            self.show_plan(summary['plan'])
+            return
+        nfo_generated_count = summary['generated']
+        self.show_ai_failures()
+        QMessageBox.information(self, "成功", f"操作完成！\n总共生成了 {nfo_generated_count + 1} 个NFO文件 (包含tvshow.nfo)。")
+        message = f"已为 {nfo_generated_count} 个视频文件生成了NFO"
+        if summary.get('seasons'):
+            message += f" (共 {summary['seasons']} 季)"
+        if summary['ai_requests']:
+            message += (f"，AI请求 {summary['ai_requests']} 个，输入共 {summary['ai_prompt_tokens']} token"
+                        f" (平均 {summary['ai_prompt_tokens'] // summary['ai_requests']})")
+        self.statusBar().showMessage(message)
+
+    def show_plan(self, plan):
+        text = (f"新建 {plan['created']} 个，改变 {plan['changed']} 个，内容未变 {plan['unchanged']} 个NFO"
+                f" (包含tvshow.nfo)。\n会写入 {plan['bytes_written']} 字节，"
+                f"内容未变而不必写入 {plan['bytes_unchanged']} 字节。")
+        box = QMessageBox(QMessageBox.Information, "预览", text, QMessageBox.Ok, self)
+        if plan['diffs']:
+            box.setDetailedText("\n\n".join(plan['diffs']))
+        box.exec_()
+        self.statusBar().showMessage(f"预览完成：{plan['created'] + plan['changed']} 个NFO会被写入")
+
+    def on_generation_failed(self, message):
+        QMessageBox.critical(self, "错误", f"生成NFO文件时出错: {message}")
+        self.statusBar().showMessage(f"错误: {message}")
+
+    def on_generation_cancelled(self):
+        self.show_ai_failures()
+        self.statusBar().showMessage("已取消，已生成的NFO文件会保留，下次运行时继续")
+
+    def closeEvent(self, event):
+        self.progress_panel.stop()
+        if self.preview_worker is not None:
+            self.preview_worker.cancel()
+            self.preview_worker.wait()
+        super().closeEvent(event)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,323 @@
+"""
+媒体库 NFO 索引与审查
+
+遍历媒体库中的所有 .nfo，在进程池中逐个增量解析 (XMLPullParser，即 iterparse 的底层)（只保留需要的字段，
+读完一个子元素就清理，大文件也不会整个留在内存中），结果存入 SQLite。
+再次运行时只解析大小或修改时间有变化的文件，已删除的文件从索引中移除。
+
+索引建立后可以直接查询：
+- 缺集：某一季的集数中间有空缺
+- 重复集数：同一季中有多个 NFO 使用同一个集数
+- 没有简介的电视剧 (tvshow.nfo 中 plot 为空)
+- 有剧集 NFO 但没有 tvshow.nfo 的电视剧
+- 无法解析的 NFO
+
+季文件夹 (Season 1、S01 等，见 nfo_core.season_from_folder) 中的剧集归入上一级的电视剧。
+索引文件默认位于 ~/.nfo_generator/nfo_index.sqlite3。
+
+示例:
+    python nfo_index.py /mnt/nas/TV
+    python nfo_index.py /mnt/nas/TV --missing --duplicates
+    python nfo_index.py /mnt/nas/TV --no-update --no-plot
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import media_scanner
+import nfo_core
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".nfo_generator", "nfo_index.sqlite3")
+# 需要解析的文件少于此数（或只有一个 CPU 核心）时直接在本进程中解析，省去进程池的开销
+PARALLEL_THRESHOLD = 64
+CHUNK_SIZE = 32
+READ_SIZE = 64 * 1024
+TEXT_FIELDS = ('title', 'showtitle', 'plot')
+INT_FIELDS = ('season', 'episode', 'year')
+
+
+def _to_int(text):
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def read_nfo(path):
+    """
+    增量读取一个 NFO，返回 (根元素名, 字段字典)。
+
+    只读取根元素的直接子元素 title、showtitle、plot、season、episode、year（同名取第一个），
+    格式错误时抛出 ET.ParseError。
+    """
+    # 与 ET.iterparse 相同的增量解析，直接按块喂给 XMLPullParser，对大量小文件更快
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    root = None
+    fields = {}
+    depth = 0
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(READ_SIZE)
+            if data:
+                parser.feed(data)
+            else:
+                parser.close()
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth == 1:
+                    if elem.tag in TEXT_FIELDS or elem.tag in INT_FIELDS:
+                        fields.setdefault(elem.tag, (elem.text or '').strip())
+                    # 已读过的子元素不再需要（如很长的 fileinfo）
+                    root.clear()
+            if not data:
+                break
+    for name in INT_FIELDS:
+        if name in fields:
+            fields[name] = _to_int(fields[name])
+    return root.tag, fields
+
+
+def _parse_task(path):
+    """进程池中的单个任务，返回 (路径, 根元素名, 字段字典, 错误信息)"""
+    try:
+        kind, fields = read_nfo(path)
+        return path, kind, fields, None
+    except (OSError, ET.ParseError) as e:
+        return path, None, {}, str(e)
+
+
+def show_folder_of(nfo_path):
+    """NFO 所属电视剧的根目录：季文件夹中的 NFO 归入上一级文件夹"""
+    folder = os.path.dirname(nfo_path)
+    if nfo_core.season_from_folder(folder) is not None:
+        return os.path.dirname(folder)
+    return folder
+
+
+def _prefix_range(folder):
+    """
+    folder 下所有路径的范围 [下限, 上限)，用于 path >= ? AND path < ?。
+
+    不用 LIKE：SQLite 的 LIKE 不区分 ASCII 大小写，/tv 会匹配到 /TV 下的路径。
+    以分隔符结尾的前缀把最后一个字符加一作为上限，按二进制顺序比较，可以使用主键索引。
+    """
+    prefix = os.path.join(os.path.abspath(folder), '')
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def missing_numbers(episodes):
+    """从 1 到最大集数之间缺少的集数"""
+    present = set(episodes)
+    return [number for number in range(1, max(present) + 1) if number not in present] if present else []
+
+
+class NFOIndex:
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS nfos (
+                path TEXT PRIMARY KEY,
+                show_folder TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                kind TEXT,
+                title TEXT,
+                showtitle TEXT,
+                season INTEGER,
+                episode INTEGER,
+                year INTEGER,
+                has_plot INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS nfos_show ON nfos (show_folder, season, episode)")
+        self._conn.commit()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def update(self, root, workers=None, on_error=None):
+        """
+        扫描 root 下的所有 .nfo 并更新索引，返回 {'nfos', 'parsed', 'removed', 'errors'}。
+
+        workers 为解析进程数（None 表示 CPU 核心数）；无法读取的子文件夹调用 on_error(error) 后跳过。
+        """
+        root = os.path.abspath(root)
+        known = {path: (size, mtime_ns) for path, size, mtime_ns in self._query(
+            "SELECT path, size, mtime_ns FROM nfos WHERE path >= ? AND path < ?", _prefix_range(root))}
+
+        changed = {}
+        present = set()
+        for entry in media_scanner.iter_files(root, ['.nfo'], recursive=True, on_error=on_error):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            present.add(entry.path)
+            if known.get(entry.path) != (st.st_size, st.st_mtime_ns):
+                changed[entry.path] = (st.st_size, st.st_mtime_ns)
+        removed = [path for path in known if path not in present]
+
+        paths = list(changed)
+        if len(paths) < PARALLEL_THRESHOLD or (workers or os.cpu_count() or 1) == 1:
+            results = [_parse_task(path) for path in paths]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_parse_task, paths, chunksize=CHUNK_SIZE))
+
+        rows = []
+        errors = 0
+        for path, kind, fields, error in results:
+            errors += error is not None
+            size, mtime_ns = changed[path]
+            rows.append((path, show_folder_of(path), size, mtime_ns, kind, fields.get('title'),
+                         fields.get('showtitle'), fields.get('season'), fields.get('episode'), fields.get('year'),
+                         int(bool(fields.get('plot'))), error))
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("DELETE FROM nfos WHERE path = ?", [(path,) for path in removed])
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO nfos (path, show_folder, size, mtime_ns, kind, title, showtitle, "
+                    "season, episode, year, has_plot, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return {'nfos': len(present), 'parsed': len(rows), 'removed': len(removed), 'errors': errors}
+
+    def _scope(self, root):
+        """查询范围：root 为 None 时为整个索引"""
+        if root is None:
+            return "1", ()
+        return "path >= ? AND path < ?", _prefix_range(root)
+
+    def missing_episodes(self, root=None):
+        """返回 [(电视剧根目录, 季数, [缺少的集数]), ...]"""
+        where, params = self._scope(root)
+        rows = self._query(
+            f"SELECT show_folder, season, episode FROM nfos WHERE {where} AND kind = 'episodedetails' "
+            "AND episode IS NOT NULL ORDER BY show_folder, season", params)
+        by_season = {}
+        for show_folder, season, episode in rows:
+            by_season.setdefault((show_folder, season), []).append(episode)
+        result = []
+        for (show_folder, season), episodes in by_season.items():
+            missing = missing_numbers(episodes)
+            if missing:
+                result.append((show_folder, season, missing))
+        return result
+
+    def duplicate_episodes(self, root=None):
+        """返回 [(电视剧根目录, 季数, 集数, [NFO 路径]), ...]"""
+        where, params = self._scope(root)
+        rows = self._query(
+            f"SELECT show_folder, season, episode, group_concat(path, char(10)) FROM nfos "
+            f"WHERE {where} AND kind = 'episodedetails' AND episode IS NOT NULL "
+            "GROUP BY show_folder, season, episode HAVING count(*) > 1 ORDER BY show_folder, season, episode",
+            params)
+        return [(show_folder, season, episode, sorted(paths.split('\n')))
+                for show_folder, season, episode, paths in rows]
+
+    def shows_without_plot(self, root=None):
+        """返回 [(tvshow.nfo 路径, 标题), ...]"""
+        where, params = self._scope(root)
+        return self._query(
+            f"SELECT path, title FROM nfos WHERE {where} AND kind = 'tvshow' AND has_plot = 0 ORDER BY path",
+            params)
+
+    def shows_without_tvshow_nfo(self, root=None):
+        """有剧集 NFO 但根目录中没有 tvshow.nfo 的电视剧，返回 [(电视剧根目录, 剧集数), ...]"""
+        where, params = self._scope(root)
+        return self._query(
+            f"SELECT show_folder, count(*) FROM nfos WHERE {where} AND kind = 'episodedetails' "
+            "AND show_folder NOT IN (SELECT show_folder FROM nfos WHERE kind = 'tvshow') "
+            "GROUP BY show_folder ORDER BY show_folder", params)
+
+    def parse_errors(self, root=None):
+        """返回 [(NFO 路径, 错误信息), ...]"""
+        where, params = self._scope(root)
+        return self._query(
+            f"SELECT path, error FROM nfos WHERE {where} AND error IS NOT NULL ORDER BY path", params)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def print_report(index, root, sections):
+    if 'missing' in sections:
+        rows = index.missing_episodes(root)
+        print(f"\n缺集 ({len(rows)} 季):")
+        for show_folder, season, missing in rows:
+            print(f"  {show_folder} 第{season}季: {', '.join(map(str, missing))}")
+    if 'duplicates' in sections:
+        rows = index.duplicate_episodes(root)
+        print(f"\n重复集数 ({len(rows)} 处):")
+        for show_folder, season, episode, paths in rows:
+            print(f"  {show_folder} 第{season}季 第{episode}集:")
+            for path in paths:
+                print(f"      {path}")
+    if 'no_plot' in sections:
+        rows = index.shows_without_plot(root)
+        print(f"\n没有简介的电视剧 ({len(rows)} 部):")
+        for path, title in rows:
+            print(f"  {title or '(无标题)'}: {path}")
+    if 'no_tvshow' in sections:
+        rows = index.shows_without_tvshow_nfo(root)
+        print(f"\n没有 tvshow.nfo 的电视剧 ({len(rows)} 部):")
+        for show_folder, count in rows:
+            print(f"  {show_folder} ({count} 集)")
+    if 'errors' in sections:
+        rows = index.parse_errors(root)
+        print(f"\n无法解析的NFO ({len(rows)} 个):")
+        for path, error in rows:
+            print(f"  {path}: {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="媒体库 NFO 索引与审查")
+    parser.add_argument('root', help="媒体库根目录")
+    parser.add_argument('--db', default=DEFAULT_INDEX_PATH, help="索引文件路径")
+    parser.add_argument('--workers', type=int, default=None, help="解析进程数 (默认 CPU 核心数)")
+    parser.add_argument('--no-update', action='store_true', help="不扫描，直接查询现有索引")
+    parser.add_argument('--missing', action='store_true', help="列出缺集")
+    parser.add_argument('--duplicates', action='store_true', help="列出重复的集数")
+    parser.add_argument('--no-plot', action='store_true', help="列出没有简介的电视剧")
+    parser.add_argument('--no-tvshow', action='store_true', help="列出没有 tvshow.nfo 的电视剧")
+    parser.add_argument('--errors', action='store_true', help="列出无法解析的NFO")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.root):
+        print(f"错误: 目录不存在: {args.root}")
+        return 1
+    sections = {name for name in ('missing', 'duplicates', 'no_plot', 'no_tvshow', 'errors') if getattr(args, name)}
+    if not sections:
+        sections = {'missing', 'duplicates', 'no_plot', 'no_tvshow', 'errors'}
+
+    index = NFOIndex(args.db)
+    try:
+        if not args.no_update:
+            start = time.time()
+            stats = index.update(args.root, args.workers, on_error=lambda e: print(f"无法读取: {e}"))
+            print(f"共 {stats['nfos']} 个NFO，重新解析 {stats['parsed']} 个，移除 {stats['removed']} 个，"
+                  f"解析失败 {stats['errors']} 个，耗时 {time.time() - start:.1f} 秒")
+        print_report(index, args.root, sections)
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+NFO 生成清单 (每个文件夹一个 .nfo_manifest.json)
+
+记录每个视频的大小、修改时间以及生成其 NFO 时所用输入的摘要，
+再次运行时只重新生成视频或输入发生变化的 NFO。
+"""
+import os
+import json
+import hashlib
+
+MANIFEST_NAME = ".nfo_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def load_manifest(folder_path):
+    """读取文件夹的清单；不存在、损坏或版本不符时返回空清单"""
+    manifest_path = os.path.join(folder_path, MANIFEST_NAME)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {'version': MANIFEST_VERSION, 'tvshow': None, 'episodes': {}}
+
+
+def save_manifest(folder_path, manifest):
+    """先写临时文件再替换，避免中途中断留下损坏的清单"""
+    manifest_path = os.path.join(folder_path, MANIFEST_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def inputs_digest(inputs):
+    """对生成 NFO 所用的输入求摘要，输入需可被 JSON 序列化"""
+    data = json.dumps(inputs, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+def video_signature(video_path):
+    """视频文件的 (大小, 修改时间纳秒)"""
+    st = os.stat(video_path)
+    return st.st_size, st.st_mtime_ns
+
+
+def episode_is_current(manifest, video_file, signature, digest):
+    """清单中的记录与当前视频及输入一致时返回 True"""
+    entry = manifest['episodes'].get(video_file)
+    if not entry:
+        return False
+    return (entry.get('size'), entry.get('mtime')) == tuple(signature) and entry.get('inputs') == digest
+
+
+def record_episode(manifest, video_file, signature, digest):
+    manifest['episodes'][video_file] = {
+        'size': signature[0],
+        'mtime': signature[1],
+        'inputs': digest,
+    }
+
+
+def prune_manifest(manifest, video_files):
+    """删除已不存在的视频的记录"""
+    present = set(video_files)
+    for video_file in list(manifest['episodes']):
+        if video_file not in present:
+            del manifest['episodes'][video_file]
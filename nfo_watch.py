@@ -0,0 +1,328 @@
+"""
+监视文件夹，为新下载的视频自动生成 NFO (无界面，可作为常驻进程运行)
+
+Linux 上使用 inotify（通过 ctypes 调用，不需要额外的库）；网络挂载目录收不到其他机器上的
+文件事件，可用 --poll 改为定期扫描。新文件在大小和修改时间停止变化 --settle 秒后才处理，
+同一文件夹同时到达的多个文件合并为一次处理。只为新文件生成剧集 NFO，
+电视剧信息沿用文件夹中已有的 tvshow.nfo（没有时按文件夹名生成一个）。
+直接放在监视目录中（不在电视剧文件夹里）的视频不处理。
+
+示例:
+    python nfo_watch.py /mnt/downloads/TV
+    python nfo_watch.py /mnt/nas/TV --poll --poll-interval 60 --settle 30
+    python nfo_watch.py /mnt/downloads/TV --ai --scan-existing
+"""
+import os
+import sys
+import time
+import errno
+import select
+import signal
+import struct
+import argparse
+import threading
+import ctypes
+import ctypes.util
+
+import ai_plot
+import nfo_core
+import thumbnails
+import media_scanner
+
+# 主循环每次等待事件的最长时间 (秒)，也是检查文件是否写完的间隔
+TICK_SECONDS = 1.0
+DEFAULT_SETTLE_SECONDS = 10.0
+DEFAULT_POLL_INTERVAL = 30.0
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+def log(message):
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
+
+
+def is_video(path):
+    return os.path.splitext(path)[1].lower() in nfo_core.VIDEO_EXTENSIONS
+
+
+def find_videos_without_nfo(roots):
+    """找出所有还没有同名 .nfo 的视频文件（启动时补处理、inotify 队列溢出后使用）"""
+    names_by_folder = {}
+    for root in roots:
+        for entry in media_scanner.iter_files(root, recursive=True):
+            names_by_folder.setdefault(os.path.dirname(entry.path), set()).add(entry.name)
+    missing = []
+    for folder, names in names_by_folder.items():
+        for name in names:
+            if is_video(name) and f"{os.path.splitext(name)[0]}.nfo" not in names:
+                missing.append(os.path.join(folder, name))
+    return missing
+
+
+class InotifyWatcher:
+    """用 inotify 监视目录树，返回有变化的视频文件路径"""
+
+    def __init__(self, roots):
+        libc_name = ctypes.util.find_library('c')
+        if not sys.platform.startswith('linux') or not libc_name:
+            raise OSError(errno.ENOSYS, "inotify 仅在 Linux 上可用")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.watches = {}
+        for root in roots:
+            self.add_tree(root)
+
+    def add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            # ENOSPC 表示超过 fs.inotify.max_user_watches
+            log(f"无法监视 {directory}: {os.strerror(err)}")
+            return
+        self.watches[wd] = directory
+
+    def add_tree(self, root):
+        for dirpath, dirnames, filenames in os.walk(root):
+            self.add_watch(dirpath)
+
+    def poll(self, timeout):
+        """等待最多 timeout 秒，返回 (有变化的视频路径列表, 事件队列是否溢出)"""
+        changed = []
+        overflow = False
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changed, overflow
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                directory = self.watches.get(wd)
+                if directory is None or not name:
+                    continue
+                path = os.path.join(directory, name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # 新建或移入的文件夹（例如整季移入）：监视它并处理其中已有的视频
+                        self.add_tree(path)
+                        changed.extend(entry.path for entry in media_scanner.iter_files(
+                            path, nfo_core.VIDEO_EXTENSIONS, recursive=True))
+                elif is_video(name):
+                    changed.append(path)
+        return changed, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """定期扫描目录树，与上次扫描结果比较，用于网络挂载目录"""
+
+    def __init__(self, roots, interval=DEFAULT_POLL_INTERVAL):
+        self.roots = roots
+        self.interval = interval
+        self.snapshot = self.scan()
+        self.last_scan = time.monotonic()
+
+    def scan(self):
+        snapshot = {}
+        for root in self.roots:
+            for entry in media_scanner.iter_files(root, nfo_core.VIDEO_EXTENSIONS, recursive=True):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                snapshot[entry.path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def poll(self, timeout):
+        remaining = self.interval - (time.monotonic() - self.last_scan)
+        if remaining > 0:
+            time.sleep(min(timeout, remaining))
+            return [], False
+        snapshot = self.scan()
+        self.last_scan = time.monotonic()
+        changed = [path for path, signature in snapshot.items() if self.snapshot.get(path) != signature]
+        self.snapshot = snapshot
+        return changed, False
+
+    def close(self):
+        pass
+
+
+class PendingFiles:
+    """等待写完的文件：大小和修改时间连续 settle 秒不变才算完成，期间有新事件则重新计时"""
+
+    def __init__(self, settle=DEFAULT_SETTLE_SECONDS):
+        self.settle = settle
+        self.files = {}
+
+    def touch(self, path):
+        self.files[path] = None
+
+    def pop_ready(self, now):
+        ready = []
+        for path, state in list(self.files.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                # 文件已被删除或移走
+                del self.files[path]
+                continue
+            signature = (st.st_size, st.st_mtime_ns)
+            if state is None or state[0] != signature:
+                self.files[path] = (signature, now)
+            elif now - state[1] >= self.settle:
+                ready.append(path)
+                del self.files[path]
+        return ready
+
+    def __len__(self):
+        return len(self.files)
+
+
+def process_ready(paths, defaults=None, ai_settings=None, probe=False, thumb_offset=None, roots=()):
+    """
+    为已写完的新视频生成 NFO，按文件夹合并处理。
+
+    直接位于 roots (监视目录) 中的视频跳过：监视目录是媒体库根目录而不是电视剧文件夹，
+    否则会在这里写入以媒体库目录命名的 tvshow.nfo。
+    """
+    root_dirs = {os.path.normcase(os.path.abspath(root)) for root in roots}
+    by_folder = {}
+    for path in paths:
+        folder = os.path.dirname(path)
+        if os.path.normcase(os.path.abspath(folder)) in root_dirs:
+            log(f"跳过 {path}: 视频直接位于监视目录中，请放入电视剧文件夹")
+            continue
+        by_folder.setdefault(folder, set()).add(os.path.basename(path))
+    for folder, names in sorted(by_folder.items()):
+        try:
+            show = nfo_core.load_show_for_folder(folder, defaults)
+            in_season_folder = nfo_core.season_from_folder(folder) is not None
+            if in_season_folder:
+                # 季文件夹中的新视频：tvshow.nfo 写在上一级的电视剧根目录（已存在时不动）
+                nfo_core.write_show_root_nfo(os.path.dirname(os.path.normpath(folder)), show, only_new=True)
+            summary = nfo_core.generate_nfo_files(
+                folder, show, False, ai_settings, only_files=names, probe=probe,
+                thumb_offset=thumb_offset, write_tvshow=not in_season_folder,
+                on_ai_error=lambda video_title, e: log(f"    ! {video_title}: AI简介生成失败 ({e})"))
+        except Exception as e:
+            log(f"处理失败 {folder}: {e}")
+            continue
+        log(f"{folder}: 新视频 {len(names)}，生成 {summary['generated']}，"
+            f"内容未变 {summary['unchanged']}，跳过 {summary['skipped']}")
+
+
+def create_watcher(roots, use_polling=False, poll_interval=DEFAULT_POLL_INTERVAL):
+    if not use_polling:
+        try:
+            return InotifyWatcher(roots)
+        except OSError as e:
+            log(f"inotify 不可用 ({e})，改为每 {poll_interval:.0f} 秒扫描一次")
+    return PollingWatcher(roots, poll_interval)
+
+
+def watch(roots, defaults=None, ai_settings=None, use_polling=False, poll_interval=DEFAULT_POLL_INTERVAL,
+          settle=DEFAULT_SETTLE_SECONDS, scan_existing=False, stop_event=None, probe=False,
+          thumb_offset=None):
+    """监视 roots 直到 stop_event 被设置（或收到 Ctrl+C）"""
+    watcher = create_watcher(roots, use_polling, poll_interval)
+    pending = PendingFiles(settle)
+    if scan_existing:
+        for path in find_videos_without_nfo(roots):
+            pending.touch(path)
+        log(f"启动时发现 {len(pending)} 个没有 NFO 的视频")
+    log(f"开始监视: {', '.join(roots)} ({type(watcher).__name__})")
+    try:
+        while not (stop_event and stop_event.is_set()):
+            changed, overflow = watcher.poll(TICK_SECONDS)
+            for path in changed:
+                pending.touch(path)
+            if overflow:
+                log("inotify 事件队列溢出，重新检查所有没有 NFO 的视频")
+                for path in find_videos_without_nfo(roots):
+                    pending.touch(path)
+            ready = pending.pop_ready(time.monotonic())
+            if ready:
+                process_ready(ready, defaults, ai_settings, probe, thumb_offset, roots)
+    finally:
+        watcher.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="监视文件夹并为新视频自动生成 NFO")
+    parser.add_argument('roots', nargs='+', help="要监视的媒体库目录")
+    parser.add_argument('--poll', action='store_true', help="定期扫描而不使用 inotify (网络挂载目录)")
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL, help="扫描间隔 (秒)")
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help="文件停止变化多少秒后才处理")
+    parser.add_argument('--scan-existing', action='store_true', help="启动时也处理已有但没有 NFO 的视频")
+    parser.add_argument('--ai', action='store_true', help="使用AI为每集生成简介")
+    parser.add_argument('--probe', action='store_true', help="用 ffprobe 读取视频流信息并写入NFO")
+    parser.add_argument('--thumbs', action='store_true', help="用 ffmpeg 为每集截取缩略图 (<文件名>-thumb.jpg)")
+    parser.add_argument('--thumb-offset', type=float, default=thumbnails.DEFAULT_OFFSET, help="截图位置 (秒)")
+    parser.add_argument('--api-key', default=None, help="OpenAI 兼容接口的 API Key")
+    parser.add_argument('--base-url', default=ai_plot.DEFAULT_BASE_URL, help="OpenAI 兼容接口地址")
+    parser.add_argument('--ai-concurrency', type=int, default=ai_plot.DEFAULT_CONCURRENCY,
+                        help="同时进行的AI请求数")
+    parser.add_argument('--ai-batch-size', type=int, default=1, help="每个AI请求包含的集数")
+    args = parser.parse_args(argv)
+
+    for root in args.roots:
+        if not os.path.isdir(root):
+            print(f"错误: 目录不存在: {root}")
+            return 1
+
+    ai_settings = None
+    if args.ai:
+        api_key = args.api_key or ai_plot.get_default_api_key()
+        if not ai_plot.is_available() or not api_key:
+            print("错误: 使用AI功能前，请确保已安装'openai'库并提供了API Key。")
+            return 1
+        ai_settings = {'api_key': api_key, 'base_url': args.base_url,
+                       'concurrency': args.ai_concurrency, 'batch_size': args.ai_batch_size}
+
+    stop_event = threading.Event()
+    # 作为服务运行时 (systemd 等) 收到 SIGTERM 后处理完当前文件再退出
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    try:
+        watch(args.roots, None, ai_settings, args.poll, args.poll_interval, args.settle,
+              args.scan_existing, stop_event, args.probe,
+              args.thumb_offset if args.thumbs else None)
+    except KeyboardInterrupt:
+        pass
+    log("已停止监视")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+NFO 生成的后台线程与进度条
+
+生成循环放到 NFOWorker (QThread) 中执行，界面不会卡住；ProgressPanel 显示进度、
+每秒处理文件数和预计剩余时间，点击“取消”后在处理完当前文件时停止。
+"""
+import time
+import threading
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QProgressBar, QPushButton
+
+
+class GenerationCancelled(Exception):
+    """用户取消了生成"""
+
+
+class NFOWorker(QThread):
+    progress = pyqtSignal(int, int, str)  # 已完成数, 总数, 当前文件
+    status = pyqtSignal(str)
+    text_received = pyqtSignal(str)  # 流式 AI 回复的文本片段
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, task, parent=None):
+        """task(worker) 在后台线程中执行，返回值通过 succeeded 信号传回界面线程"""
+        super().__init__(parent)
+        self.task = task
+        self._cancel_event = threading.Event()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise GenerationCancelled()
+
+    def report(self, done, total, message=""):
+        """汇报进度；已请求取消时抛出 GenerationCancelled 结束 task"""
+        self.progress.emit(done, total, message)
+        self.check_cancelled()
+
+    def set_status(self, message):
+        self.status.emit(message)
+
+    def send_text(self, text):
+        """把流式回复的一段文本交给界面；已请求取消时抛出 GenerationCancelled 中止请求"""
+        self.text_received.emit(text)
+        self.check_cancelled()
+
+    def run(self):
+        try:
+            result = self.task(self)
+        except GenerationCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        self.succeeded.emit(result)
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+class ProgressPanel(QWidget):
+    """进度条 + 速度和剩余时间 + 取消按钮，没有任务时隐藏"""
+    running_changed = pyqtSignal(bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setFormat("%v/%m")
+        layout.addWidget(self.progress_bar)
+        self.rate_label = QLabel()
+        self.rate_label.setMinimumWidth(220)
+        layout.addWidget(self.rate_label)
+        self.cancel_button = QPushButton("取消")
+        self.cancel_button.clicked.connect(self.cancel)
+        layout.addWidget(self.cancel_button)
+        self.worker = None
+        self.start_time = 0.0
+        self.hide()
+
+    def is_running(self):
+        return self.worker is not None and self.worker.isRunning()
+
+    def start(self, task, on_success, on_error=None, on_cancelled=None, on_status=None):
+        """
+        在后台线程执行 task(worker)。
+
+        结束后在界面线程调用 on_success(result)、on_error(message) 或 on_cancelled()；
+        on_status(message) 接收 worker.set_status 发出的状态文字。
+        """
+        worker = NFOWorker(task, self)
+        worker.progress.connect(self.update_progress)
+        if on_status:
+            worker.status.connect(on_status)
+        worker.succeeded.connect(on_success)
+        if on_error:
+            worker.failed.connect(on_error)
+        if on_cancelled:
+            worker.cancelled.connect(on_cancelled)
+        worker.finished.connect(self.on_finished)
+        self.worker = worker
+
+        self.start_time = time.monotonic()
+        self.progress_bar.setRange(0, 0)
+        self.rate_label.setText("准备中...")
+        self.cancel_button.setEnabled(True)
+        self.cancel_button.setText("取消")
+        self.show()
+        self.running_changed.emit(True)
+        worker.start()
+        return worker
+
+    def update_progress(self, done, total, message):
+        elapsed = time.monotonic() - self.start_time
+        self.progress_bar.setRange(0, max(total, 1))
+        self.progress_bar.setValue(done)
+        rate = done / elapsed if elapsed > 0 else 0.0
+        if rate > 0 and total >= done:
+            eta = format_duration((total - done) / rate)
+        else:
+            eta = "--:--"
+        self.rate_label.setText(f"{rate:.1f} 个/秒  剩余 {eta}")
+        if message:
+            self.setToolTip(message)
+
+    def cancel(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancel_button.setEnabled(False)
+            self.cancel_button.setText("正在取消...")
+
+    def stop(self):
+        """关闭窗口前调用：请求取消并等待后台线程结束"""
+        if self.is_running():
+            self.worker.cancel()
+            self.worker.wait()
+
+    def on_finished(self):
+        self.worker = None
+        self.hide()
+        self.running_changed.emit(False)
@@ -0,0 +1,126 @@
+"""
+NFO 文件的生成与写入
+
+render_nfo 按字段列表生成 XML，所有文本都经过转义（简介里的 < 和 & 不会再让 NFO 无法解析）；
+write_nfo 先写临时文件再替换，内容与磁盘上完全相同时不写入，避免修改时间变化导致媒体服务器重新扫描。
+plan_nfo 只比较不写入，供预览模式统计哪些文件会新建或改变。
+"""
+import os
+import re
+import difflib
+import threading
+from xml.sax.saxutils import escape
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+INDENT = "    "
+# 预览时每个文件夹保留的 diff 数
+DIFF_SAMPLE_LIMIT = 3
+
+# XML 1.0 不允许的控制字符（AI 返回的文本中偶尔会出现）
+_INVALID_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+
+def xml_text(value):
+    """把字段值转成可以放进元素内容的文本"""
+    return escape(_INVALID_XML_CHARS.sub('', str(value)))
+
+
+def _render_fields(lines, fields, depth):
+    indent = INDENT * depth
+    for tag, value in fields:
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            # 嵌套元素，值为 [(标签, 值), ...]
+            lines.append(f"{indent}<{tag}>")
+            _render_fields(lines, value, depth + 1)
+            lines.append(f"{indent}</{tag}>")
+        else:
+            lines.append(f"{indent}<{tag}>{xml_text(value)}</{tag}>")
+
+
+def render_nfo(root_tag, fields):
+    """
+    生成 NFO 文本。
+
+    fields 为 [(标签, 值), ...]，按顺序输出；值为 None 的字段省略，
+    值为列表时输出嵌套元素。
+    """
+    lines = [XML_DECLARATION, f"<{root_tag}>"]
+    _render_fields(lines, fields, 1)
+    lines.append(f"</{root_tag}>")
+    return "\n".join(lines)
+
+
+def _is_same_content(path, data):
+    try:
+        if os.path.getsize(path) != len(data):
+            return False
+        with open(path, 'rb') as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+
+def write_nfo(path, text):
+    """
+    以 UTF-8 写入 NFO，返回是否实际写入。
+
+    内容与现有文件完全相同时直接返回 False；否则先写同目录下的临时文件再替换，
+    中途出错不会留下只写了一半的 NFO。
+    """
+    data = text.encode('utf-8')
+    if _is_same_content(path, data):
+        return False
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+def new_plan():
+    """预览结果：各状态的文件数、会写入/可省去的字节数和部分 diff"""
+    return {'created': 0, 'changed': 0, 'unchanged': 0,
+            'bytes_written': 0, 'bytes_unchanged': 0, 'diffs': []}
+
+
+def merge_plan(plan, other, diff_limit=DIFF_SAMPLE_LIMIT):
+    for key in ('created', 'changed', 'unchanged', 'bytes_written', 'bytes_unchanged'):
+        plan[key] += other[key]
+    plan['diffs'].extend(other['diffs'][:max(0, diff_limit - len(plan['diffs']))])
+    return plan
+
+
+def plan_nfo(plan, path, text, diff_limit=DIFF_SAMPLE_LIMIT):
+    """
+    把 write_nfo(path, text) 会做的事记入 plan，不写入文件，返回是否会写入。
+
+    内容改变的文件生成统一 diff，plan['diffs'] 最多保留 diff_limit 个。
+    """
+    data = text.encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            old = f.read()
+    except FileNotFoundError:
+        plan['created'] += 1
+        plan['bytes_written'] += len(data)
+        return True
+    if old == data:
+        plan['unchanged'] += 1
+        plan['bytes_unchanged'] += len(data)
+        return False
+    plan['changed'] += 1
+    plan['bytes_written'] += len(data)
+    if len(plan['diffs']) < diff_limit:
+        plan['diffs'].append('\n'.join(difflib.unified_diff(
+            old.decode('utf-8', errors='replace').splitlines(), text.splitlines(),
+            f"{path} (现有)", f"{path} (新)", lineterm='')))
+    return True
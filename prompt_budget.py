@@ -0,0 +1,97 @@
+"""
+AI 请求的 token 估算与提示词压缩
+
+每一集的请求都会附带电视剧简介，AI_nfo.py 生成电视剧简介时会附带所有剧集标题；
+简介很长或季很长时，输入 token 和延迟随之增长。这里把电视剧简介按句截断到预算以内
+（每部剧只计算一次并缓存），剧集标题超过上限时均匀抽取一部分，保证请求大小不随集数增长。
+
+安装了 tiktoken 时用它计数（cl100k_base，与 Qwen 的分词不完全相同，仅作估算），
+否则按中日韩字符每字 1 个 token、其他字符每 4 个 1 个 token 估算。
+"""
+import re
+import functools
+
+# 电视剧简介在每个请求中最多占用的 token 数，可用 ai_settings['plot_budget'] 修改
+DEFAULT_PLOT_BUDGET = 300
+# 生成电视剧简介时最多附带的剧集标题数
+DEFAULT_MAX_TITLES = 40
+# 每条消息的格式开销
+MESSAGE_OVERHEAD_TOKENS = 4
+ELLIPSIS = "……"
+
+_CJK_CHARS = re.compile('[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+# 在句末标点或换行之后断句
+_SENTENCE_END = re.compile(r'(?<=[。！？!?；;\n])|(?<=\. )')
+
+_encoding = None
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        # 第一次计数时才导入 tiktoken，不影响程序启动速度
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding('cl100k_base')
+        except Exception:
+            # 未安装，或首次使用需要下载词表而当前离线，改用估算
+            _encoding_failed = True
+    return _encoding
+
+
+def count_tokens(text):
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk = len(_CJK_CHARS.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def request_tokens(request):
+    """估算一次 chat.completions 请求的输入 token 数"""
+    return sum(count_tokens(message.get('content') or '') + MESSAGE_OVERHEAD_TOKENS
+               for message in request.get('messages', []))
+
+
+def _cut_to_budget(text, budget):
+    """在句子中间截断：按比例估算长度，再逐步缩短直到不超过预算"""
+    length = max(1, len(text) * budget // max(count_tokens(text), 1))
+    while length > 1 and count_tokens(text[:length]) > budget:
+        length = length * 9 // 10
+    return text[:length]
+
+
+@functools.lru_cache(maxsize=256)
+def compact_plot(plot, budget=DEFAULT_PLOT_BUDGET):
+    """
+    把电视剧简介截断到 budget 个 token 以内，尽量保留完整的句子；未超出时原样返回。
+
+    结果按 (简介, 预算) 缓存，同一部剧的每个请求只计算一次。
+    """
+    plot = (plot or '').strip()
+    if not budget or count_tokens(plot) <= budget:
+        return plot
+    budget -= count_tokens(ELLIPSIS)
+    kept = []
+    used = 0
+    for sentence in _SENTENCE_END.split(plot):
+        tokens = count_tokens(sentence)
+        if used + tokens > budget:
+            break
+        kept.append(sentence)
+        used += tokens
+    text = ''.join(kept).strip() or _cut_to_budget(plot, budget)
+    return text + ELLIPSIS
+
+
+def sample_titles(items, limit=DEFAULT_MAX_TITLES):
+    """超过 limit 项时均匀抽取 limit 项（保留第一项和最后一项），保持原有顺序"""
+    if not limit or len(items) <= limit:
+        return list(items)
+    if limit == 1:
+        return [items[0]]
+    step = (len(items) - 1) / (limit - 1)
+    return [items[round(i * step)] for i in range(limit)]
@@ -0,0 +1,39 @@
+"""
+在 PyQt6 和 PyQt5 之间选择 Qt 绑定
+
+各工具分别使用 PyQt5 (video_process.py、audio_process.py 等) 和 PyQt6
+(video_procesee3.py、view_process2.py、video4.py)。共用的界面模块从这里导入 Qt 类，
+使用调用方已经导入的绑定，两者都未导入时先尝试 PyQt6 再尝试 PyQt5。
+同一进程中不能混用两个绑定。
+
+枚举一律用带作用域的写法 (如 QProcess.ProcessState.Running)，两个绑定都支持。
+"""
+import sys
+
+
+def _pick_binding():
+    for name in ('PyQt6', 'PyQt5'):
+        if name in sys.modules:
+            return name
+    try:
+        import PyQt6.QtCore
+        return 'PyQt6'
+    except ImportError:
+        import PyQt5.QtCore
+        return 'PyQt5'
+
+
+BINDING = _pick_binding()
+
+if BINDING == 'PyQt6':
+    from PyQt6.QtCore import QObject, QProcess, QTimer, Qt, pyqtSignal
+    from PyQt6.QtWidgets import (
+        QAbstractItemView, QHBoxLayout, QHeaderView, QLabel, QMessageBox, QPlainTextEdit, QProgressBar, QPushButton,
+        QSpinBox, QSplitter, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget,
+    )
+else:
+    from PyQt5.QtCore import QObject, QProcess, QTimer, Qt, pyqtSignal
+    from PyQt5.QtWidgets import (
+        QAbstractItemView, QHBoxLayout, QHeaderView, QLabel, QMessageBox, QPlainTextEdit, QProgressBar, QPushButton,
+        QSpinBox, QSplitter, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget,
+    )
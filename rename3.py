@@ -1,6 +1,7 @@
 import sys
 import os
 import re
+import media_scanner
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QHBoxLayout, QPushButton, QFileDialog, QListWidget, 
                             QLabel, QLineEdit, QSpinBox, QCheckBox, QMessageBox, 
@@ -83,16 +84,14 @@ class FlattenToolDialog(QDialog):
 
         def traverse(directory, parent_prefixes):
             try:
-                items = os.listdir(directory)
+                dir_entries, file_entries = media_scanner.scan_directory(directory)
             except OSError as e:
                 self.preview_area.append(f"错误: 无法访问目录 {directory}: {e}")
                 return
 
             # 过滤掉目标文件夹本身，防止无限递归
-            items = [item for item in items if os.path.abspath(os.path.join(directory, item)) != abs_flatten_dir]
-            
-            dirs = sorted([d for d in items if os.path.isdir(os.path.join(directory, d))], key=natural_sort_key)
-            files = sorted([f for f in items if os.path.isfile(os.path.join(directory, f))], key=natural_sort_key)
+            dirs = sorted([d.name for d in dir_entries if os.path.abspath(d.path) != abs_flatten_dir], key=natural_sort_key)
+            files = sorted([f.name for f in file_entries], key=natural_sort_key)
             
             # 先处理文件
             for file_index, filename in enumerate(files, 1):
@@ -404,17 +403,22 @@ class BatchRenamer(QMainWindow):
     def select_folder(self):
         folder = QFileDialog.getExistingDirectory(self, '选择文件夹')
         if folder:
-            files = [os.path.join(folder, f) for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f))]
-            if files: self.add_files(files)
+            # scandir 一次取得文件类型和修改时间，不再逐个 stat
+            entries = list(media_scanner.iter_files(folder))
+            files = [entry.path for entry in entries]
+            mtimes = {entry.path: media_scanner.entry_mtime(entry) for entry in entries}
+            if files: self.add_files(files, mtimes)
                 
-    def add_files(self, files):
+    def add_files(self, files, mtimes=None):
         existing_paths = {data[1] for data in self.file_data}
         added_count = 0
         for file_path in files:
             if file_path not in existing_paths:
                 file_name = os.path.basename(file_path)
-                try: mtime = os.path.getmtime(file_path)
-                except: mtime = 0
+                if mtimes and file_path in mtimes: mtime = mtimes[file_path]
+                else:
+                    try: mtime = os.path.getmtime(file_path)
+                    except: mtime = 0
                 self.file_data.append((file_name, file_path, mtime))
                 self.file_list.addItem(file_name)
                 added_count += 1
@@ -0,0 +1,71 @@
+"""
+nfo_index.py 的测试：按媒体库根目录限定范围
+
+运行: python -m unittest test_nfo_index (或 python -m pytest test_nfo_index.py)
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import nfo_index
+
+EPISODE_NFO = """<?xml version="1.0" encoding="utf-8"?>
+<episodedetails><title>{title}</title><season>1</season><episode>{episode}</episode></episodedetails>
+"""
+
+
+def write_episode(folder, name, episode):
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, name), 'w', encoding='utf-8') as f:
+        f.write(EPISODE_NFO.format(title=name, episode=episode))
+
+
+class ScopeCaseTest(unittest.TestCase):
+    """只有大小写不同的两个根目录互不影响 (SQLite 的 LIKE 不区分大小写)"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.lower = os.path.join(self.tmp, 'tv')
+        self.upper = os.path.join(self.tmp, 'TV')
+        os.makedirs(self.lower)
+        os.makedirs(self.upper)
+        if os.path.samefile(self.lower, self.upper):
+            shutil.rmtree(self.tmp)
+            self.skipTest("文件系统不区分大小写")
+        write_episode(os.path.join(self.lower, 'ShowB'), 'b.nfo', 2)
+        write_episode(os.path.join(self.upper, 'ShowA'), 'a.nfo', 3)
+        self.index = nfo_index.NFOIndex(os.path.join(self.tmp, 'index.sqlite3'))
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmp)
+
+    def test_update_keeps_other_root(self):
+        self.assertEqual(self.index.update(self.lower, workers=1)['removed'], 0)
+        self.assertEqual(self.index.update(self.upper, workers=1)['removed'], 0)
+        self.assertEqual(self.index.update(self.lower, workers=1)['removed'], 0)
+        paths = {row[0] for row in self.index._query("SELECT path FROM nfos")}
+        self.assertEqual(paths, {os.path.join(self.lower, 'ShowB', 'b.nfo'),
+                                 os.path.join(self.upper, 'ShowA', 'a.nfo')})
+
+    def test_queries_scoped_to_root(self):
+        self.index.update(self.lower, workers=1)
+        self.index.update(self.upper, workers=1)
+        self.assertEqual([show for show, _, _ in self.index.missing_episodes(self.lower)],
+                         [os.path.join(self.lower, 'ShowB')])
+        self.assertEqual([show for show, _, _ in self.index.missing_episodes(self.upper)],
+                         [os.path.join(self.upper, 'ShowA')])
+        self.assertEqual(len(self.index.missing_episodes()), 2)
+
+    def test_sibling_with_same_prefix(self):
+        # /tv 不包括 /tv2
+        write_episode(os.path.join(self.tmp, 'tv2', 'ShowC'), 'c.nfo', 2)
+        self.index.update(self.lower, workers=1)
+        self.index.update(os.path.join(self.tmp, 'tv2'), workers=1)
+        self.assertEqual(self.index.update(self.lower, workers=1)['removed'], 0)
+        self.assertEqual(len(self.index.missing_episodes(self.lower)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+用 ffmpeg 为每一集截取一帧缩略图，保存为视频旁边的 <文件名>-thumb.jpg
+
+-ss 放在 -i 之前（输入端定位），ffmpeg 直接跳到偏移位置附近的关键帧再解码，
+不必从头解码整个视频。多个视频同时截图，每个 ffmpeg 进程只用一个解码线程；
+缩略图比视频新时跳过，视频被替换后会重新截取。
+"""
+import os
+import sys
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+FFMPEG = "ffmpeg"
+# 默认截取第 5 分钟的画面，避开片头和黑屏
+DEFAULT_OFFSET = 300.0
+EXTRACT_TIMEOUT = 120
+THUMB_SUFFIX = "-thumb.jpg"
+
+
+def is_available():
+    return shutil.which(FFMPEG) is not None
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def thumb_path(video_path):
+    return os.path.splitext(video_path)[0] + THUMB_SUFFIX
+
+
+def is_current(video_path, thumb):
+    """缩略图存在且不比视频旧"""
+    try:
+        return os.stat(thumb).st_mtime_ns >= os.stat(video_path).st_mtime_ns
+    except OSError:
+        return False
+
+
+def seek_offset(offset, duration=None):
+    """偏移超过视频时长时改为截取中间的画面"""
+    if duration and offset >= duration:
+        return duration / 2
+    return offset
+
+
+def run_ffmpeg(video_path, output_path, offset, timeout=EXTRACT_TIMEOUT):
+    """截取一帧，返回是否得到了图片；偏移超出视频时 ffmpeg 可能以非零代码退出，同样返回 False"""
+    creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+    result = subprocess.run(
+        [FFMPEG, '-nostdin', '-v', 'error', '-y', '-threads', '1', '-ss', f"{offset:.3f}", '-i', video_path,
+         '-frames:v', '1', '-q:v', '2', '-f', 'image2', output_path],
+        capture_output=True, timeout=timeout, creationflags=creation_flags)
+    return result.returncode == 0 and os.path.exists(output_path) and os.path.getsize(output_path) > 0
+
+
+def extract_thumbnail(video_path, offset=DEFAULT_OFFSET, duration=None):
+    """截取一帧写入 thumb_path(video_path)，返回缩略图路径；失败时返回 None"""
+    thumb = thumb_path(video_path)
+    tmp_path = f"{thumb}.{os.getpid()}.tmp.jpg"
+    offset = seek_offset(offset, duration)
+    try:
+        # 不知道时长时偏移可能超出视频，此时没有输出，改从开头截取
+        if not run_ffmpeg(video_path, tmp_path, offset) and not (offset > 0 and run_ffmpeg(video_path, tmp_path, 0)):
+            return None
+        os.replace(tmp_path, thumb)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return thumb
+
+
+def extract_thumbnails(video_paths, offset=DEFAULT_OFFSET, workers=None, durations=None):
+    """
+    为多个视频截图，返回 {视频路径: 缩略图路径或 None}。
+
+    已是最新的缩略图直接返回，不再截取；durations 为 {视频路径: 时长(秒)}，可选。
+    未安装 ffmpeg 时只返回已有的缩略图。
+    """
+    results = {}
+    todo = []
+    for video_path in video_paths:
+        thumb = thumb_path(video_path)
+        if is_current(video_path, thumb):
+            results[video_path] = thumb
+        else:
+            results[video_path] = None
+            todo.append(video_path)
+    if not todo or not is_available():
+        return results
+    durations = durations or {}
+    # 截图由 ffmpeg 子进程完成，线程只负责等待，进程数按 CPU 核心数限制
+    with ThreadPoolExecutor(max_workers=max(1, workers or default_workers())) as executor:
+        extracted = executor.map(lambda path: extract_thumbnail(path, offset, durations.get(path)), todo)
+        results.update(zip(todo, extracted))
+    return results
@@ -9,6 +9,8 @@ import sys
 import os
 import subprocess
 import shutil
+import tempfile
+import importlib.util
 from pathlib import Path
 import datetime
 
@@ -17,24 +19,26 @@ import datetime
 # 如果您已经将mpv的路径正确添加到了系统环境变量，则可以注释掉下面这行
 os.environ['PATH'] = os.path.dirname(os.path.abspath(__file__)) + os.pathsep + os.environ['PATH']
 
-try:
-    from natsort import natsorted
-except ImportError:
+# 只检查是否安装，第一次排序时才导入，加快启动
+if importlib.util.find_spec('natsort') is None:
     print("错误: 缺少 'natsort' 库。请通过 'pip install natsort' 命令安装后重试。")
     sys.exit(1)
 
-try:
-    import mpv
-except ImportError:
+# mpv 只在打开裁切窗口时才导入（加载 libmpv 较慢）
+if importlib.util.find_spec('mpv') is None:
     print("错误: 缺少 'python-mpv' 库。请通过 'pip install python-mpv' 命令安装后重试。")
     sys.exit(1)
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QListWidget, QFileDialog, QMessageBox, QComboBox,
-    QLabel, QCheckBox, QTextEdit, QListWidgetItem, QDialog, QSlider
+    QLabel, QCheckBox, QListWidgetItem, QDialog, QSlider
 )
-from PyQt6.QtCore import Qt, QProcess, QUrl
+from PyQt6.QtCore import Qt, QUrl
+
+import ffmpeg_jobs
+import concat_preflight
+import log_sink
 
 # ==============================================================================
 #  视频裁切对话框 (最终修正版)
@@ -75,6 +79,7 @@ class VideoCropperDialog(QDialog):
 
     def init_mpv(self):
         try:
+            import mpv
             container_id = int(self.video_container.winId())
             self.player = mpv.MPV(wid=container_id, input_default_bindings=True, input_vo_keyboard=True, ytdl=False)
             self.player.observe_property('time-pos', self.on_time_pos_change)
@@ -128,10 +133,12 @@ class VideoMergerApp(QMainWindow):
         super().__init__()
         self.setWindowTitle("视频工具集 (合并、提取、裁切)"); self.setGeometry(100, 100, 800, 700)
         if not self.check_dependencies(): sys.exit(1)
-        self.init_ui(); self.process = None
+        # ffmpeg 任务队列，多个任务可同时运行
+        self.jobs = ffmpeg_jobs.JobScheduler(parent=self); self.jobs.job_finished.connect(self.on_job_finished); self.jobs.queue_finished.connect(self.on_queue_finished)
+        self.init_ui()
 
     def init_ui(self):
-        central_widget=QWidget();self.setCentralWidget(central_widget);main_layout=QVBoxLayout(central_widget);top_button_layout=QHBoxLayout();self.select_button=QPushButton("1. 选择视频");self.select_button.clicked.connect(self.select_videos);self.remove_button=QPushButton("移除选中");self.remove_button.clicked.connect(self.remove_selected_video);self.clear_button=QPushButton("清空列表");self.clear_button.clicked.connect(self.clear_list);top_button_layout.addWidget(self.select_button);top_button_layout.addWidget(self.remove_button);top_button_layout.addWidget(self.clear_button);top_button_layout.addStretch();self.video_list_widget=QListWidget();self.video_list_widget.setDragDropMode(QListWidget.DragDropMode.InternalMove);self.video_list_widget.setSelectionMode(QListWidget.SelectionMode.SingleSelection);self.video_list_widget.setStyleSheet("QListWidget::item { padding: 5px; }");sort_layout=QHBoxLayout();sort_layout.addWidget(QLabel("列表排序:"));self.sort_asc_button=QPushButton("正序 (默认)");self.sort_asc_button.clicked.connect(lambda:self.sort_list(reverse=False));self.sort_desc_button=QPushButton("逆序");self.sort_desc_button.clicked.connect(lambda:self.sort_list(reverse=True));sort_layout.addWidget(self.sort_asc_button);sort_layout.addWidget(self.sort_desc_button);sort_layout.addStretch();actions_layout=QHBoxLayout();self.merge_button=QPushButton("合并视频 (多选)");self.merge_button.clicked.connect(self.merge_videos);self.export_audio_button=QPushButton("导出音频");self.export_audio_button.clicked.connect(self.export_audio);self.crop_button=QPushButton("视频裁切 (单选)");self.crop_button.clicked.connect(self.open_crop_window);actions_layout.addWidget(self.merge_button);actions_layout.addWidget(self.export_audio_button);actions_layout.addWidget(self.crop_button);actions_layout.addStretch();merge_options_layout=QHBoxLayout();merge_options_layout.addWidget(QLabel("合并格式:"));self.format_combo=QComboBox();self.format_combo.addItems(["mp4","mkv"]);merge_options_layout.addWidget(self.format_combo);self.merge_before_audio_checkbox=QCheckBox("先合并再导音频");merge_options_layout.addWidget(self.merge_before_audio_checkbox);merge_options_layout.addStretch();self.log_output=QTextEdit();self.log_output.setReadOnly(True);self.log_output.setPlaceholderText("FFmpeg 执行日志和状态信息将显示在这里...");main_layout.addLayout(top_button_layout);main_layout.addWidget(QLabel("视频文件列表 (可拖拽排序):"));main_layout.addWidget(self.video_list_widget);main_layout.addLayout(sort_layout);main_layout.addSpacing(20);main_layout.addWidget(QLabel("功能操作:"));main_layout.addLayout(actions_layout);main_layout.addLayout(merge_options_layout);main_layout.addSpacing(10);main_layout.addWidget(QLabel("执行日志:"));main_layout.addWidget(self.log_output);self.video_list_widget.model().rowsInserted.connect(self.update_ui_state);self.video_list_widget.model().rowsRemoved.connect(self.update_ui_state);self.update_ui_state()
+        central_widget=QWidget();self.setCentralWidget(central_widget);main_layout=QVBoxLayout(central_widget);top_button_layout=QHBoxLayout();self.select_button=QPushButton("1. 选择视频");self.select_button.clicked.connect(self.select_videos);self.remove_button=QPushButton("移除选中");self.remove_button.clicked.connect(self.remove_selected_video);self.clear_button=QPushButton("清空列表");self.clear_button.clicked.connect(self.clear_list);top_button_layout.addWidget(self.select_button);top_button_layout.addWidget(self.remove_button);top_button_layout.addWidget(self.clear_button);top_button_layout.addStretch();self.video_list_widget=QListWidget();self.video_list_widget.setDragDropMode(QListWidget.DragDropMode.InternalMove);self.video_list_widget.setSelectionMode(QListWidget.SelectionMode.SingleSelection);self.video_list_widget.setStyleSheet("QListWidget::item { padding: 5px; }");sort_layout=QHBoxLayout();sort_layout.addWidget(QLabel("列表排序:"));self.sort_asc_button=QPushButton("正序 (默认)");self.sort_asc_button.clicked.connect(lambda:self.sort_list(reverse=False));self.sort_desc_button=QPushButton("逆序");self.sort_desc_button.clicked.connect(lambda:self.sort_list(reverse=True));sort_layout.addWidget(self.sort_asc_button);sort_layout.addWidget(self.sort_desc_button);sort_layout.addStretch();actions_layout=QHBoxLayout();self.merge_button=QPushButton("合并视频 (多选)");self.merge_button.clicked.connect(self.merge_videos);self.export_audio_button=QPushButton("导出音频");self.export_audio_button.clicked.connect(self.export_audio);self.crop_button=QPushButton("视频裁切 (单选)");self.crop_button.clicked.connect(self.open_crop_window);actions_layout.addWidget(self.merge_button);actions_layout.addWidget(self.export_audio_button);actions_layout.addWidget(self.crop_button);actions_layout.addStretch();merge_options_layout=QHBoxLayout();merge_options_layout.addWidget(QLabel("合并格式:"));self.format_combo=QComboBox();self.format_combo.addItems(["mp4","mkv"]);merge_options_layout.addWidget(self.format_combo);self.merge_before_audio_checkbox=QCheckBox("先合并再导音频");merge_options_layout.addWidget(self.merge_before_audio_checkbox);merge_options_layout.addStretch();self.job_panel=ffmpeg_jobs.JobPanel(self.jobs);self.log_output=log_sink.create_view("FFmpeg 执行日志和状态信息将显示在这里...");self.log_sink=log_sink.LogSink(self.log_output,file_path=log_sink.log_file_path("video4"));main_layout.addLayout(top_button_layout);main_layout.addWidget(QLabel("视频文件列表 (可拖拽排序):"));main_layout.addWidget(self.video_list_widget);main_layout.addLayout(sort_layout);main_layout.addSpacing(20);main_layout.addWidget(QLabel("功能操作:"));main_layout.addLayout(actions_layout);main_layout.addLayout(merge_options_layout);main_layout.addSpacing(10);main_layout.addWidget(QLabel("任务队列:"));main_layout.addWidget(self.job_panel);main_layout.addWidget(QLabel("执行日志:"));main_layout.addWidget(self.log_output);self.video_list_widget.model().rowsInserted.connect(self.update_ui_state);self.video_list_widget.model().rowsRemoved.connect(self.update_ui_state);self.update_ui_state()
 
     @staticmethod
     def format_sec(seconds):
@@ -160,7 +167,7 @@ class VideoMergerApp(QMainWindow):
             output_name = f"{video_path_obj.stem}_crop_{start_str_file}_{end_str_file}.mp4"; output_path = video_path_obj.parent / output_name
             start_ffmpeg = self.format_sec(start_sec); end_ffmpeg = self.format_sec(end_sec)
             command = ['ffmpeg', '-i', videos[0], '-ss', start_ffmpeg, '-to', end_ffmpeg, '-c', 'copy', '-y', str(output_path)]
-            self.run_process(command, None)
+            self.run_process(command, None, priority=ffmpeg_jobs.PRIORITY_HIGH) # 用户在等待裁切结果，排在其他任务之前
 
     def select_videos(self):
         files, _ = QFileDialog.getOpenFileNames(self, "选择视频文件", "", "视频文件 (*.mp4 *.mkv *.mov *.avi *.flv);;所有文件 (*)")
@@ -169,6 +176,7 @@ class VideoMergerApp(QMainWindow):
         for item in self.video_list_widget.selectedItems(): self.video_list_widget.takeItem(self.video_list_widget.row(item))
     def clear_list(self): self.video_list_widget.clear()
     def sort_list(self, reverse=False):
+        from natsort import natsorted
         items = self.get_video_list(); sorted_items = natsorted(items, reverse=reverse)
         self.video_list_widget.clear(); self.video_list_widget.addItems(sorted_items)
     def get_video_list(self): return [self.video_list_widget.item(i).text() for i in range(self.video_list_widget.count())]
@@ -183,17 +191,39 @@ class VideoMergerApp(QMainWindow):
         if output_path.exists():
             if QMessageBox.question(self, "文件已存在", f"文件 '{output_path.name}' 已存在。是否覆盖？", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No) == QMessageBox.StandardButton.No:
                 self.log("操作取消。"); return
-        list_file_path = output_dir / "ffmpeg_list.txt"
+        if self.jobs.find_active(output_path): self.show_message("请稍候", f"'{output_path.name}' 已在任务队列中，请等待其完成后再试。"); return
+        # 编码参数与其他文件不同的文件先转换，否则流复制拼接的结果可能花屏或音画不同步；
+        # 检查要对每个文件运行 ffprobe，在后台进行，完成后再提交任务
+        self.log(f"正在检查 {len(videos)} 个文件的编码参数...")
+        self.jobs.run_in_background(lambda: concat_preflight.plan_concat(videos), lambda plan, error: self.submit_merge(videos, output_path, plan, error))
+    def submit_merge(self, videos, output_path, plan, error):
+        """编码参数检查完成后提交转换任务和合并任务"""
+        if error is not None: self.log(f"检查编码参数失败，按原样合并: {error}", log_sink.WARNING); plan = concat_preflight.ConcatPlan(videos, {})
+        # 检查期间可能又提交了同一个合并
+        if self.jobs.find_active(output_path): self.show_message("请稍候", f"'{output_path.name}' 已在任务队列中，请等待其完成后再试。"); return
+        output_dir = output_path.parent
+        try: inputs, conversions, temp_files = concat_preflight.prepare(plan, output_dir, self.log)
+        except OSError as e: self.show_message("错误", f"创建临时文件失败: {e}", is_critical=True); return
+        # 临时文件名唯一，同一文件夹中的多个合并任务互不影响
+        try: fd, list_file_path = tempfile.mkstemp(prefix="ffmpeg_list_", suffix=".txt", dir=output_dir)
+        except OSError as e:
+            for path in temp_files: os.remove(path)
+            self.show_message("错误", f"创建临时文件失败: {e}", is_critical=True); return
+        list_file_path = Path(list_file_path)
         try:
-            with open(list_file_path, 'w', encoding='utf-8') as f:
-                for video in videos:
+            with open(fd, 'w', encoding='utf-8') as f:
+                for video in inputs:
                     processed_path = video.replace("'", "'\\''")
                     f.write(f"file '{processed_path}'\n")
             command = ['ffmpeg', '-f', 'concat', '-safe', '0', '-i', str(list_file_path), '-c', 'copy', '-y', str(output_path)]
-            self.run_process(command, f"合并完成！文件保存在:\n{output_path}", list_file_path)
+            after = []
+            for title, conversion in conversions:
+                job = self.jobs.submit(conversion, title=title); self.log(f"已加入任务队列: {job.title}"); after.append(job)
+            self.run_process(command, f"合并完成！文件保存在:\n{output_path}", [list_file_path] + temp_files, after=after)
         except Exception as e:
             self.show_message("错误", f"创建临时文件失败: {e}", QMessageBox.Icon.Critical)
-            if list_file_path.exists(): os.remove(list_file_path)
+            for path in [list_file_path] + temp_files:
+                if os.path.exists(path): os.remove(path)
     def export_audio(self):
         videos = self.get_video_list()
         if not videos: self.show_message("错误", "请至少选择一个视频文件。", QMessageBox.Icon.Warning); return
@@ -201,34 +231,46 @@ class VideoMergerApp(QMainWindow):
         else:
             if self.merge_before_audio_checkbox.isChecked(): self.show_message("提示", "请先点击“合并视频”，然后对合并后的文件单独进行音频提取。", QMessageBox.Icon.Information)
             else:
-                self.log(f"准备从 {len(videos)} 个文件中分别提取音频..."); [self.extract_single_audio(v) for v in videos]; self.log("所有音频提取任务已启动。")
+                self.extract_multiple_audio_individually(videos)
     def extract_single_audio(self, video_path_str):
         video_path = Path(video_path_str); output_path = video_path.with_name(f"{video_path.stem}_audio.mp3")
         if output_path.exists():
             if QMessageBox.question(self, "文件已存在", f"文件 '{output_path.name}' 已存在。是否覆盖？", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No) == QMessageBox.StandardButton.No:
                 self.log("操作取消。"); return
-        command = ['ffmpeg', '-i', str(video_path), '-vn', '-c:a', 'libmp3lame', '-q:a', '2', '-y', str(output_path)]
-        self.run_process(command, f"音频提取完成！文件保存在:\n{output_path}")
-    def run_process(self, command, success_message, cleanup_file=None):
-        if self.process and self.process.state() == QProcess.ProcessState.Running: self.show_message("请稍候", "另一个任务正在进行中...", QMessageBox.Icon.Warning); return
-        self.log("="*50 + f"\n执行命令: {' '.join(command)}\n" + "="*50); self.process = QProcess()
-        def on_finished(exit_code, exit_status):
-            if cleanup_file and os.path.exists(cleanup_file):
-                try: os.remove(cleanup_file); self.log(f"已清理临时文件: {cleanup_file}")
-                except OSError as e: self.log(f"清理临时文件失败: {e}")
-            if exit_code == 0:
-                self.log(f"\n任务成功完成！\n{'-'*20}")
-                if success_message != None:
-                    self.show_message("成功", success_message) # 移除了icon参数
-            else:
-                error_output = self.process.readAllStandardError().data().decode('utf-8', errors='ignore')
-                self.log(f"\n任务失败！代码: {exit_code}\n{'-'*20}\nFFmpeg错误:\n{error_output}"); self.show_message("失败", "操作失败，请查看日志。", is_critical=True) # 使用is_critical标志
-            self.process = None
-        self.process.readyReadStandardOutput.connect(lambda: self.log(self.process.readAllStandardOutput().data().decode('utf-8', errors='ignore').strip()))
-        self.process.readyReadStandardError.connect(lambda: self.log(self.process.readAllStandardError().data().decode('utf-8', errors='ignore').strip()))
-        self.process.finished.connect(on_finished); self.process.start(command[0], command[1:])
-    def log(self, message):
-        if message: self.log_output.append(message); self.log_output.ensureCursorVisible()
+        self.run_process(self.build_audio_command(video_path, output_path), f"音频提取完成！文件保存在:\n{output_path}")
+    def build_audio_command(self, video_path, output_path):
+        return ['ffmpeg', '-i', str(video_path), '-vn', '-c:a', 'libmp3lame', '-q:a', '2', '-y', str(output_path)]
+    def extract_multiple_audio_individually(self, videos):
+        """已存在的输出文件只询问一次，然后每个视频一个任务并行提取"""
+        self.log(f"准备从 {len(videos)} 个文件中分别提取音频...")
+        outputs = [(v, Path(v).with_name(f"{Path(v).stem}_audio.mp3")) for v in videos]
+        existing = list(dict.fromkeys(o for _, o in outputs if o.exists()))
+        if existing:
+            policy = ffmpeg_jobs.ask_overwrite_policy(self, existing)
+            if policy is None: self.log("操作取消。"); return
+            if policy == ffmpeg_jobs.SKIP: outputs = [(v, o) for v, o in outputs if not o.exists()]
+        queued = 0
+        for v, o in outputs:
+            if not self.jobs.find_active(o): self.jobs.submit(self.build_audio_command(v, o), f"音频提取完成！文件保存在:\n{o}"); queued += 1
+        self.log(f"已将 {queued} 个音频提取任务加入任务队列，同时运行 {self.jobs.max_workers} 个。")
+    def run_process(self, command, success_message, cleanup_files=(), priority=ffmpeg_jobs.PRIORITY_NORMAL, after=()):
+        """把外部命令加入任务队列；同一输出文件已在队列中时拒绝，避免两个任务同时写入。after 中的任务完成后才开始"""
+        existing = self.jobs.find_active(command[-1])
+        if existing:
+            for path in cleanup_files:
+                if os.path.exists(path): os.remove(path)
+            self.show_message("请稍候", f"'{existing.title}' 已在任务队列中，请等待其完成后再试。"); return None
+        job = self.jobs.submit(command, success_message, list(cleanup_files), priority, after=after); self.log(f"已加入任务队列: {job.title}"); return job
+    def on_job_finished(self, job):
+        if job.state == ffmpeg_jobs.DONE: self.log(f"任务成功完成: {job.title} ({job.elapsed():.1f} 秒)")
+        elif job.state == ffmpeg_jobs.FAILED: self.log(f"任务失败: {job.title}，代码: {job.exit_code}\nFFmpeg错误:\n{job.tail()}", log_sink.ERROR)
+        else: self.log(f"任务已取消: {job.title}")
+    def on_queue_finished(self, jobs):
+        # 队列中的任务全部结束后只提示一次
+        ok, message = ffmpeg_jobs.summarize(jobs)
+        if message: self.show_message("成功" if ok else "失败", message, is_critical=not ok)
+    def log(self, message, level=log_sink.INFO):
+        self.log_sink.write(message, level)
     
     # *** 修正后的 show_message 函数 ***
     def show_message(self, title, message, is_critical=False):
@@ -239,9 +281,9 @@ class VideoMergerApp(QMainWindow):
             QMessageBox.information(self, title, message)
 
     def closeEvent(self, event):
-        if self.process and self.process.state() == QProcess.ProcessState.Running:
-            if QMessageBox.question(self, "确认退出", "任务正在运行，确定强制退出吗？", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No) == QMessageBox.StandardButton.Yes:
-                self.process.kill(); event.accept()
+        if self.jobs.is_busy():
+            if QMessageBox.question(self, "确认退出", f"还有 {self.jobs.active_count()} 个任务未完成，确定强制退出吗？", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No) == QMessageBox.StandardButton.Yes:
+                self.jobs.shutdown(); event.accept()
             else: event.ignore()
         else: event.accept()
 
@@ -1,13 +1,13 @@
 import sys
 import os
-import subprocess
 import time
 from PyQt5.QtWidgets import (QApplication, QWidget, QPushButton, QVBoxLayout,
                              QHBoxLayout, QFileDialog, QSlider, QLabel,
-                             QMessageBox, QStyle, QLineEdit)
-from PyQt5.QtCore import Qt, QTimer
+                             QMessageBox, QStyle, QLineEdit, QProgressDialog)
+from PyQt5.QtCore import Qt, QTimer, QProcess
 from PyQt5.QtGui import QPalette, QColor, QIntValidator
 import mpv
+import ffmpeg_jobs
 
 
 # --- Helper Function to format time ---
@@ -27,6 +27,7 @@ class VideoCropper(QWidget):
         self.start_time_sec = 0.0
         self.end_time_sec = 0.0
         self.player = None
+        self.ffmpeg_process = None
 
         if not os.path.exists('mpv-2.dll'):
             self.show_error_message(
@@ -235,31 +236,67 @@ class VideoCropper(QWidget):
             self.end_time_label.setText(f"结束: {format_time(self.end_time_sec)}")
             
     def _run_ffmpeg_command(self, command, output_file, process_name):
-        """Helper function to run ffmpeg commands and handle errors."""
-        try:
-            msg_box = QMessageBox(QMessageBox.Information, f"正在{process_name}", f"正在处理，请稍候...\n输出文件: {output_file}", QMessageBox.NoButton, self)
-            msg_box.show()
-            QApplication.processEvents()
-            
-            creation_flags = subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
-            process = subprocess.run(
-                command, check=True, capture_output=True, creationflags=creation_flags
-            )
-            msg_box.close()
-            self.show_info_message("成功", f"{process_name}完成！\n文件已保存至:\n{output_file}")
-        except FileNotFoundError:
-            msg_box.close()
-            self.show_error_message("错误", "找不到 'ffmpeg'。\n请确保已安装ffmpeg并将其添加至系统PATH。")
-        except subprocess.CalledProcessError as e:
-            msg_box.close()
-            try:
-                stderr_text = e.stderr.decode('utf-8')
-            except UnicodeDecodeError:
-                stderr_text = e.stderr.decode(sys.getdefaultencoding(), errors='ignore')
-            self.show_error_message(f"FFmpeg {process_name}错误", f"FFmpeg在执行时返回错误:\n{stderr_text}")
-        except Exception as e:
-            msg_box.close()
-            self.show_error_message("未知错误", f"发生了一个意外错误: {e}")
+        """
+        Runs ffmpeg with -progress pipe:1 and shows percentage, speed and ETA in a
+        cancellable progress dialog. Only warnings and errors are kept from stderr.
+        """
+        if self.ffmpeg_process is not None:
+            self.show_error_message("请稍候", "上一个任务尚未完成。")
+            return
+        command = ffmpeg_jobs.with_progress(command)
+        # The range is known from -ss/-to, no need to probe the input
+        progress = ffmpeg_jobs.FFmpegProgress(ffmpeg_jobs.estimate_duration(command))
+        stderr_lines = []
+
+        dialog = QProgressDialog(f"正在处理，请稍候...\n输出文件: {output_file}", "取消", 0, 100, self)
+        dialog.setWindowTitle(f"正在{process_name}")
+        dialog.setWindowModality(Qt.WindowModal)
+        dialog.setMinimumDuration(0)
+        dialog.setAutoClose(False)
+        dialog.setAutoReset(False)
+        dialog.setValue(0)
+
+        process = QProcess(self)
+        self.ffmpeg_process = process
+
+        def on_stdout():
+            if progress.feed(process.readAllStandardOutput().data().decode('utf-8', errors='ignore')):
+                percent = progress.percent()
+                dialog.setValue(int(percent) if percent is not None else 0)
+                dialog.setLabelText(f"正在处理，请稍候...\n输出文件: {output_file}\n"
+                                    f"{progress.describe()}  {progress.speed_text()}")
+
+        def on_stderr():
+            stderr_lines.append(process.readAllStandardError().data().decode('utf-8', errors='ignore'))
+
+        def on_finished(exit_code, exit_status):
+            on_stderr()
+            # Read this before close(): closing a QProgressDialog also emits canceled
+            canceled = dialog.wasCanceled()
+            self.ffmpeg_process = None
+            dialog.close()
+            process.deleteLater()
+            if canceled:
+                return
+            if exit_code == 0 and exit_status == QProcess.NormalExit:
+                self.show_info_message("成功", f"{process_name}完成！\n文件已保存至:\n{output_file}")
+            else:
+                self.show_error_message(f"FFmpeg {process_name}错误", f"FFmpeg在执行时返回错误:\n{''.join(stderr_lines)}")
+
+        def on_error(error):
+            # Not started at all: no finished signal will follow
+            if error == QProcess.FailedToStart:
+                self.ffmpeg_process = None
+                dialog.close()
+                process.deleteLater()
+                self.show_error_message("错误", "找不到 'ffmpeg'。\n请确保已安装ffmpeg并将其添加至系统PATH。")
+
+        process.readyReadStandardOutput.connect(on_stdout)
+        process.readyReadStandardError.connect(on_stderr)
+        process.finished.connect(on_finished)
+        process.errorOccurred.connect(on_error)
+        dialog.canceled.connect(process.kill)
+        process.start(command[0], command[1:])
 
     def crop_video(self):
         if not self.input_file: return
@@ -316,6 +353,11 @@ class VideoCropper(QWidget):
     def show_info_message(self, title, text):
         QMessageBox.information(self, title, text)
     def closeEvent(self, event):
+        if self.ffmpeg_process is not None:
+            # Closing the window cancels the running job without an error message
+            self.ffmpeg_process.finished.disconnect()
+            self.ffmpeg_process.kill()
+            self.ffmpeg_process.waitForFinished(ffmpeg_jobs.SHUTDOWN_WAIT_MS)
         if self.player:
             self.player.quit()
         event.accept()
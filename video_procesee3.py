@@ -9,6 +9,8 @@ import sys
 import os
 import subprocess
 import shutil
+import tempfile
+import importlib.util
 from pathlib import Path
 import datetime
 
@@ -17,24 +19,26 @@ import datetime
 os.environ['PATH'] = os.path.dirname(os.path.abspath(__file__)) + os.pathsep + os.environ['PATH']
 # --- 修改结束 ---
 # --- 依赖库导入与检查 ---
-try:
-    from natsort import natsorted
-except ImportError:
+# 只检查是否安装，第一次排序时才导入，加快启动
+if importlib.util.find_spec('natsort') is None:
     print("错误: 缺少 'natsort' 库。请通过 'pip install natsort' 命令安装后重试。")
     sys.exit(1)
 
-try:
-    import mpv
-except ImportError:
+# mpv 只在打开裁切窗口时才导入（加载 libmpv 较慢）
+if importlib.util.find_spec('mpv') is None:
     print("错误: 缺少 'python-mpv' 库。请通过 'pip install python-mpv' 命令安装后重试。")
     sys.exit(1)
 
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QListWidget, QFileDialog, QMessageBox, QComboBox,
-    QLabel, QCheckBox, QTextEdit, QListWidgetItem, QDialog, QSlider
+    QLabel, QCheckBox, QListWidgetItem, QDialog, QSlider
 )
-from PyQt6.QtCore import Qt, QProcess, QUrl
+from PyQt6.QtCore import Qt, QUrl
+
+import ffmpeg_jobs
+import concat_preflight
+import log_sink
 
 # ==============================================================================
 #  视频裁切对话框 (使用 MPV 播放器核心)
@@ -100,6 +104,7 @@ class VideoCropperDialog(QDialog):
         self.crop_button.clicked.connect(self.run_crop)
 
     def init_mpv(self):
+        import mpv
         # 将 MPV 渲染画面嵌入到 video_container 控件中
         # 使用 int() 而不是 str() 来获取窗口的数字ID
         container_id = int(self.video_container.winId()) # <--- 这是正确的做法
@@ -183,7 +188,8 @@ class VideoCropperDialog(QDialog):
             '-to', end_ffmpeg, '-c', 'copy', '-y', str(output_path)
         ]
         
-        self.main_window_process_runner(command, f"视频裁切完成！文件保存在:\n{output_path}")
+        # 裁切由用户在窗口中等待结果，排在队列中其他任务之前
+        self.main_window_process_runner(command, f"视频裁切完成！文件保存在:\n{output_path}", priority=ffmpeg_jobs.PRIORITY_HIGH)
         self.accept()
 
     def closeEvent(self, event):
@@ -203,8 +209,11 @@ class VideoMergerApp(QMainWindow):
         if not self.check_dependencies():
             sys.exit(1)
 
+        # ffmpeg 任务队列，多个任务可同时运行
+        self.jobs = ffmpeg_jobs.JobScheduler(parent=self)
+        self.jobs.job_finished.connect(self.on_job_finished)
+        self.jobs.queue_finished.connect(self.on_queue_finished)
         self.init_ui()
-        self.process = None
 
     def init_ui(self):
         central_widget = QWidget()
@@ -260,9 +269,9 @@ class VideoMergerApp(QMainWindow):
         merge_options_layout.addWidget(self.merge_before_audio_checkbox)
         merge_options_layout.addStretch()
         
-        self.log_output = QTextEdit()
-        self.log_output.setReadOnly(True)
-        self.log_output.setPlaceholderText("FFmpeg 执行日志和状态信息将显示在这里...")
+        self.job_panel = ffmpeg_jobs.JobPanel(self.jobs)
+        self.log_output = log_sink.create_view("FFmpeg 执行日志和状态信息将显示在这里...")
+        self.log_sink = log_sink.LogSink(self.log_output, file_path=log_sink.log_file_path("video_procesee3"))
 
         main_layout.addLayout(top_button_layout)
         main_layout.addWidget(QLabel("视频文件列表 (可拖拽排序):"))
@@ -273,6 +282,8 @@ class VideoMergerApp(QMainWindow):
         main_layout.addLayout(actions_layout)
         main_layout.addLayout(merge_options_layout)
         main_layout.addSpacing(10)
+        main_layout.addWidget(QLabel("任务队列:"))
+        main_layout.addWidget(self.job_panel)
         main_layout.addWidget(QLabel("执行日志:"))
         main_layout.addWidget(self.log_output)
         
@@ -305,6 +316,7 @@ class VideoMergerApp(QMainWindow):
         self.video_list_widget.clear()
 
     def sort_list(self, reverse=False):
+        from natsort import natsorted
         items = self.get_video_list()
         sorted_items = natsorted(items, reverse=reverse)
         self.video_list_widget.clear()
@@ -341,17 +353,56 @@ class VideoMergerApp(QMainWindow):
             if QMessageBox.question(self, "文件已存在", f"文件 '{output_path.name}' 已存在。是否覆盖？", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No) == QMessageBox.StandardButton.No:
                 self.log("操作取消。"); return
 
-        list_file_path = output_dir / "ffmpeg_list.txt"
+        if self.jobs.find_active(output_path):
+            self.show_message("请稍候", f"'{output_path.name}' 已在任务队列中，请等待其完成后再试。", QMessageBox.Icon.Warning)
+            return
+
+        # 编码参数与其他文件不同的文件先转换，否则流复制拼接的结果可能花屏或音画不同步；
+        # 检查要对每个文件运行 ffprobe，在后台进行，完成后再提交任务
+        self.log(f"正在检查 {len(videos)} 个文件的编码参数...")
+        self.jobs.run_in_background(lambda: concat_preflight.plan_concat(videos),
+                                    lambda plan, error: self.submit_merge(videos, output_path, plan, error))
+
+    def submit_merge(self, videos, output_path, plan, error):
+        """编码参数检查完成后提交转换任务和合并任务"""
+        if error is not None:
+            self.log(f"检查编码参数失败，按原样合并: {error}", log_sink.WARNING)
+            plan = concat_preflight.ConcatPlan(videos, {})
+        # 检查期间可能又提交了同一个合并
+        if self.jobs.find_active(output_path):
+            self.show_message("请稍候", f"'{output_path.name}' 已在任务队列中，请等待其完成后再试。", QMessageBox.Icon.Warning)
+            return
+        output_dir = output_path.parent
+        try:
+            inputs, conversions, temp_files = concat_preflight.prepare(plan, output_dir, self.log)
+        except OSError as e:
+            self.show_message("错误", f"创建临时文件失败: {e}", QMessageBox.Icon.Critical)
+            return
+
+        # 临时文件名唯一，同一文件夹中的多个合并任务互不影响
         try:
-            with open(list_file_path, 'w', encoding='utf-8') as f:
-                for video in videos:
+            fd, list_file_path = tempfile.mkstemp(prefix="ffmpeg_list_", suffix=".txt", dir=output_dir)
+        except OSError as e:
+            for path in temp_files:
+                os.remove(path)
+            self.show_message("错误", f"创建临时文件失败: {e}", QMessageBox.Icon.Critical); return
+        list_file_path = Path(list_file_path)
+        try:
+            with open(fd, 'w', encoding='utf-8') as f:
+                for video in inputs:
                     processed_path = video.replace("'", "'\\''")
                     f.write(f"file '{processed_path}'\n")
             command = ['ffmpeg', '-f', 'concat', '-safe', '0', '-i', str(list_file_path), '-c', 'copy', '-y', str(output_path)]
-            self.run_process(command, f"合并完成！文件保存在:\n{output_path}", list_file_path)
+            after = []
+            for title, conversion in conversions:
+                job = self.jobs.submit(conversion, title=title)
+                self.log(f"已加入任务队列: {job.title}")
+                after.append(job)
+            self.run_process(command, f"合并完成！文件保存在:\n{output_path}", [list_file_path] + temp_files, after=after)
         except Exception as e:
             self.show_message("错误", f"创建临时文件失败: {e}", QMessageBox.Icon.Critical)
-            if list_file_path.exists(): os.remove(list_file_path)
+            for path in [list_file_path] + temp_files:
+                if os.path.exists(path): os.remove(path)
     
     def export_audio(self):
         videos = self.get_video_list()
@@ -363,9 +414,7 @@ class VideoMergerApp(QMainWindow):
             if self.merge_before_audio_checkbox.isChecked():
                 self.show_message("提示", "请先点击“合并视频”，然后对合并后的文件单独进行音频提取。", QMessageBox.Icon.Information)
             else:
-                self.log(f"准备从 {len(videos)} 个文件中分别提取音频...")
-                for video in videos: self.extract_single_audio(video)
-                self.log("所有音频提取任务已启动。")
+                self.extract_multiple_audio_individually(videos)
 
     def extract_single_audio(self, video_path_str):
         video_path = Path(video_path_str)
@@ -373,45 +422,71 @@ class VideoMergerApp(QMainWindow):
         if output_path.exists():
             if QMessageBox.question(self, "文件已存在", f"文件 '{output_path.name}' 已存在。是否覆盖？", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No) == QMessageBox.StandardButton.No:
                 self.log("操作取消。"); return
-        command = ['ffmpeg', '-i', str(video_path), '-vn', '-c:a', 'libmp3lame', '-q:a', '2', '-y', str(output_path)]
-        self.run_process(command, f"音频提取完成！文件保存在:\n{output_path}")
-
-    def run_process(self, command, success_message, cleanup_file=None):
-        if self.process and self.process.state() == QProcess.ProcessState.Running:
-            self.show_message("请稍候", "另一个任务正在进行中...", QMessageBox.Icon.Warning); return
-
-        self.log("="*50 + f"\n执行命令: {' '.join(command)}\n" + "="*50)
-        self.process = QProcess()
-        
-        def on_finished(exit_code, exit_status):
-            if cleanup_file and os.path.exists(cleanup_file):
-                try: os.remove(cleanup_file); self.log(f"已清理临时文件: {cleanup_file}")
-                except OSError as e: self.log(f"清理临时文件失败: {e}")
-            if exit_code == 0:
-                self.log(f"\n任务成功完成！\n{'-'*20}")
-                self.show_message("成功", success_message, QMessageBox.Icon.Information)
-            else:
-                error_output = self.process.readAllStandardError().data().decode('utf-8', errors='ignore')
-                self.log(f"\n任务失败！退出代码: {exit_code}\n{'-'*20}\nFFmpeg 错误信息:\n{error_output}")
-                self.show_message("失败", "操作失败，请查看日志获取详细信息。", QMessageBox.Icon.Critical)
-            self.process = None
+        self.run_process(self.build_audio_command(video_path, output_path), f"音频提取完成！文件保存在:\n{output_path}")
+
+    def build_audio_command(self, video_path, output_path):
+        return ['ffmpeg', '-i', str(video_path), '-vn', '-c:a', 'libmp3lame', '-q:a', '2', '-y', str(output_path)]
+
+    def extract_multiple_audio_individually(self, videos):
+        """已存在的输出文件只询问一次，然后每个视频一个任务并行提取"""
+        self.log(f"准备从 {len(videos)} 个文件中分别提取音频...")
+        outputs = [(video, Path(video).with_name(f"{Path(video).stem}_audio.mp3")) for video in videos]
+        existing = list(dict.fromkeys(output for _, output in outputs if output.exists()))
+        if existing:
+            policy = ffmpeg_jobs.ask_overwrite_policy(self, existing)
+            if policy is None:
+                self.log("操作取消。"); return
+            if policy == ffmpeg_jobs.SKIP:
+                outputs = [(video, output) for video, output in outputs if not output.exists()]
+        queued = 0
+        for video, output in outputs:
+            if not self.jobs.find_active(output):
+                self.jobs.submit(self.build_audio_command(video, output), f"音频提取完成！文件保存在:\n{output}")
+                queued += 1
+        self.log(f"已将 {queued} 个音频提取任务加入任务队列，同时运行 {self.jobs.max_workers} 个。")
+
+    def run_process(self, command, success_message, cleanup_files=(), priority=ffmpeg_jobs.PRIORITY_NORMAL, after=()):
+        """把外部命令（如 ffmpeg）加入任务队列，多个任务可同时运行；after 中的任务完成后才开始"""
+        existing = self.jobs.find_active(command[-1])
+        if existing:
+            # 两个任务同时写同一个输出文件会互相破坏
+            for path in cleanup_files:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.show_message("请稍候", f"'{existing.title}' 已在任务队列中，请等待其完成后再试。", QMessageBox.Icon.Warning)
+            return None
+        job = self.jobs.submit(command, success_message, list(cleanup_files), priority, after=after)
+        self.log(f"已加入任务队列: {job.title}")
+        return job
+
+    def on_job_finished(self, job):
+        """单个任务结束；完整的 FFmpeg 输出在任务列表中选中该任务查看"""
+        if job.state == ffmpeg_jobs.DONE:
+            self.log(f"任务成功完成: {job.title} ({job.elapsed():.1f} 秒)")
+        elif job.state == ffmpeg_jobs.FAILED:
+            self.log(f"任务失败: {job.title}，退出代码: {job.exit_code}", log_sink.ERROR)
+            self.log(f"FFmpeg 错误信息:\n{job.tail()}", log_sink.ERROR)
+        else:
+            self.log(f"任务已取消: {job.title}")
 
-        self.process.readyReadStandardOutput.connect(lambda: self.log(self.process.readAllStandardOutput().data().decode('utf-8', errors='ignore').strip()))
-        self.process.readyReadStandardError.connect(lambda: self.log(self.process.readAllStandardError().data().decode('utf-8', errors='ignore').strip()))
-        self.process.finished.connect(on_finished)
-        self.process.start(command[0], command[1:])
+    def on_queue_finished(self, jobs):
+        """队列中的任务全部结束后只提示一次"""
+        ok, message = ffmpeg_jobs.summarize(jobs)
+        if message:
+            self.show_message("成功" if ok else "失败", message,
+                              QMessageBox.Icon.Information if ok else QMessageBox.Icon.Critical)
 
-    def log(self, message):
-        if message: self.log_output.append(message)
-        self.log_output.ensureCursorVisible()
+    def log(self, message, level=log_sink.INFO):
+        self.log_sink.write(message, level)
 
     def show_message(self, title, message, icon):
         msg_box = QMessageBox(self); msg_box.setWindowTitle(title); msg_box.setText(message); msg_box.setIcon(icon); msg_box.exec()
 
     def closeEvent(self, event):
-        if self.process and self.process.state() == QProcess.ProcessState.Running:
-            if QMessageBox.question(self, "确认退出", "一个任务正在运行中。确定要强制退出吗？", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No) == QMessageBox.StandardButton.Yes:
-                self.process.kill(); event.accept()
+        if self.jobs.is_busy():
+            reply = QMessageBox.question(self, "确认退出", f"还有 {self.jobs.active_count()} 个任务未完成。确定要强制退出吗？", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, QMessageBox.StandardButton.No)
+            if reply == QMessageBox.StandardButton.Yes:
+                self.jobs.shutdown(); event.accept()
             else:
                 event.ignore()
         else:
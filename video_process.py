@@ -2,12 +2,12 @@ import sys
 import os
 import subprocess
 import shutil
+import tempfile
+import importlib.util
 from pathlib import Path
 
-# 检查 natsort 是否安装
-try:
-    from natsort import natsorted
-except ImportError:
+# 检查 natsort 是否安装（只查找不导入，第一次排序时才导入，加快启动）
+if importlib.util.find_spec('natsort') is None:
     print("错误: 缺少 'natsort' 库。")
     print("请通过 'pip install natsort' 命令安装后重试。")
     sys.exit(1)
@@ -15,9 +15,13 @@ except ImportError:
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QListWidget, QFileDialog, QMessageBox, QComboBox,
-    QLabel, QCheckBox, QTextEdit, QListWidgetItem
+    QLabel, QCheckBox, QListWidgetItem
 )
-from PyQt5.QtCore import Qt, QProcess
+from PyQt5.QtCore import Qt
+
+import ffmpeg_jobs
+import concat_preflight
+import log_sink
 
 class VideoMergerApp(QMainWindow):
     def __init__(self):
@@ -29,8 +33,11 @@ class VideoMergerApp(QMainWindow):
         if not self.check_ffmpeg():
             sys.exit(1) # 如果 ffmpeg 不存在，则退出应用
 
+        # ffmpeg 任务队列，多个任务可同时运行
+        self.jobs = ffmpeg_jobs.JobScheduler(parent=self)
+        self.jobs.job_finished.connect(self.on_job_finished)
+        self.jobs.queue_finished.connect(self.on_queue_finished)
         self.init_ui()
-        self.process = None # 用于执行 ffmpeg 命令
 
     def init_ui(self):
         # 主布局
@@ -96,10 +103,12 @@ class VideoMergerApp(QMainWindow):
         audio_layout.addWidget(self.merge_before_audio_checkbox)
         audio_layout.addStretch()
 
+        # --- 任务队列区 ---
+        self.job_panel = ffmpeg_jobs.JobPanel(self.jobs)
+
         # --- 日志输出区 ---
-        self.log_output = QTextEdit()
-        self.log_output.setReadOnly(True)
-        self.log_output.setPlaceholderText("FFmpeg 执行日志和状态信息将显示在这里...")
+        self.log_output = log_sink.create_view("FFmpeg 执行日志和状态信息将显示在这里...")
+        self.log_sink = log_sink.LogSink(self.log_output, file_path=log_sink.log_file_path("video_process"))
 
         # 添加组件到主布局
         main_layout.addLayout(top_button_layout)
@@ -111,6 +120,8 @@ class VideoMergerApp(QMainWindow):
         main_layout.addSpacing(10)
         main_layout.addLayout(audio_layout)
         main_layout.addSpacing(10)
+        main_layout.addWidget(QLabel("任务队列:"))
+        main_layout.addWidget(self.job_panel)
         main_layout.addWidget(QLabel("执行日志:"))
         main_layout.addWidget(self.log_output)
         
@@ -157,6 +168,7 @@ class VideoMergerApp(QMainWindow):
 
     def sort_list(self, reverse=False):
         """对列表中的项进行自然排序"""
+        from natsort import natsorted
         items = [self.video_list_widget.item(i).text() for i in range(self.video_list_widget.count())]
         sorted_items = natsorted(items, reverse=reverse)
         self.video_list_widget.clear()
@@ -195,11 +207,44 @@ class VideoMergerApp(QMainWindow):
                 self.log("操作取消。")
                 return
 
-        # 创建一个临时文件列表供 ffmpeg concat 使用
-        list_file_path = output_dir / "ffmpeg_list.txt"
+        if self.jobs.find_active(output_path):
+            self.show_message("请稍候", f"'{output_path.name}' 已在任务队列中，请等待其完成后再试。", QMessageBox.Icon.Warning)
+            return
+
+        # 编码参数与其他文件不同的文件先转换，否则流复制拼接的结果可能花屏或音画不同步；
+        # 检查要对每个文件运行 ffprobe，在后台进行，完成后再提交任务
+        self.log(f"正在检查 {len(videos)} 个文件的编码参数...")
+        self.jobs.run_in_background(lambda: concat_preflight.plan_concat(videos),
+                                    lambda plan, error: self.submit_merge(videos, output_path, plan, error))
+
+    def submit_merge(self, videos, output_path, plan, error):
+        """编码参数检查完成后提交转换任务和合并任务"""
+        if error is not None:
+            self.log(f"检查编码参数失败，按原样合并: {error}", log_sink.WARNING)
+            plan = concat_preflight.ConcatPlan(videos, {})
+        # 检查期间可能又提交了同一个合并
+        if self.jobs.find_active(output_path):
+            self.show_message("请稍候", f"'{output_path.name}' 已在任务队列中，请等待其完成后再试。", QMessageBox.Icon.Warning)
+            return
+        output_dir = output_path.parent
+        try:
+            inputs, conversions, temp_files = concat_preflight.prepare(plan, output_dir, self.log)
+        except OSError as e:
+            self.show_message("错误", f"创建临时文件失败: {e}", QMessageBox.Icon.Critical)
+            return
+
+        # 创建一个临时文件列表供 ffmpeg concat 使用；文件名唯一，同一文件夹中的多个合并任务互不影响
+        try:
+            fd, list_file_path = tempfile.mkstemp(prefix="ffmpeg_list_", suffix=".txt", dir=output_dir)
+        except OSError as e:
+            for path in temp_files:
+                os.remove(path)
+            self.show_message("错误", f"创建临时文件失败: {e}", QMessageBox.Icon.Critical)
+            return
+        list_file_path = Path(list_file_path)
         try:
-            with open(list_file_path, 'w', encoding='utf-8') as f:
-                for video in videos:
+            with open(fd, 'w', encoding='utf-8') as f:
+                for video in inputs:
                     # --- 这里是修改的部分 ---
                     # 之前的代码在 f-string 内部使用了反斜杠，导致语法错误。
                     # 我们先处理好路径中的单引号，再将其放入 f-string。
@@ -218,12 +263,18 @@ class VideoMergerApp(QMainWindow):
                 '-y', # 覆盖输出文件
                 str(output_path)
             ]
-            self.run_process(command, f"合并完成！文件保存在:\n{output_path}", list_file_path)
+            after = []
+            for title, conversion in conversions:
+                job = self.jobs.submit(conversion, title=title)
+                self.log(f"已加入任务队列: {job.title}")
+                after.append(job)
+            self.run_process(command, f"合并完成！文件保存在:\n{output_path}", [list_file_path] + temp_files, after=after)
 
         except Exception as e:
             self.show_message("错误", f"创建临时文件失败: {e}", QMessageBox.Icon.Critical)
-            if list_file_path.exists():
-                os.remove(list_file_path)
+            for path in [list_file_path] + temp_files:
+                if os.path.exists(path):
+                    os.remove(path)
 
     def export_audio(self):
         """导出音频的核心功能"""
@@ -242,12 +293,14 @@ class VideoMergerApp(QMainWindow):
             else:
                 self.extract_multiple_audio_individually(videos)
 
+    def audio_output_path(self, video_path_str):
+        """提取的音频保存在视频所在目录，文件名为 <视频名>_audio.mp3"""
+        video_path = Path(video_path_str)
+        return video_path.parent / f"{video_path.stem}_audio.mp3"
+
     def extract_single_audio(self, video_path_str):
         """从单个视频中提取音频"""
-        video_path = Path(video_path_str)
-        output_dir = video_path.parent
-        output_name = f"{video_path.stem}_audio.mp3"
-        output_path = output_dir / output_name
+        output_path = self.audio_output_path(video_path_str)
 
         if output_path.exists():
             reply = QMessageBox.question(
@@ -258,7 +311,12 @@ class VideoMergerApp(QMainWindow):
             if reply == QMessageBox.StandardButton.No:
                 self.log("操作取消。")
                 return
-        
+
+        self.run_process(self.build_audio_command(video_path_str, output_path),
+                         f"音频提取完成！文件保存在:\n{output_path}")
+
+    def build_audio_command(self, video_path_str, output_path):
+        """生成提取音频的 ffmpeg 命令"""
         # --- 这里是修改的部分 ---
         # 原来的 '-c:a', 'copy' 无法将 aac 编码直接放入 mp3 容器。
         # 我们需要将其重新编码为 mp3。
@@ -266,7 +324,7 @@ class VideoMergerApp(QMainWindow):
         # '-q:a 2' 是一个很好的可变比特率设置，能在保证高质量的同时控制文件大小。
         command = [
             'ffmpeg',
-            '-i', str(video_path),
+            '-i', str(video_path_str),
             '-vn',                 # 禁用视频流
             '-c:a', 'libmp3lame',  # <-- 这是修改的关键：指定使用 mp3 编码器
             '-q:a', '2',           # <-- 这是推荐的质量参数
@@ -274,8 +332,7 @@ class VideoMergerApp(QMainWindow):
             str(output_path)
         ]
         # --- 修改结束 ---
-        
-        self.run_process(command, f"音频提取完成！文件保存在:\n{output_path}")
+        return command
 
     def merge_and_extract_audio(self):
         """先合并视频，然后从合并后的视频中提取音频"""
@@ -285,64 +342,68 @@ class VideoMergerApp(QMainWindow):
         # 但为简化交互，引导用户分步操作更清晰。
 
     def extract_multiple_audio_individually(self, videos):
-        """分别从多个视频中提取音频"""
+        """
+        分别从多个视频中提取音频。
+
+        已存在的输出文件只询问一次（全部覆盖 / 跳过 / 取消），然后每个视频一个 ffmpeg 任务
+        全部加入任务队列，按"同时运行"的数量并行执行，进度显示在任务队列下方。
+        """
         self.log(f"准备从 {len(videos)} 个文件中分别提取音频...")
-        for video in videos:
-            self.extract_single_audio(video)
-        self.log("所有音频提取任务已启动。")
+        outputs = [(video, self.audio_output_path(video)) for video in videos]
+        existing = list(dict.fromkeys(output for _, output in outputs if output.exists()))
+        if existing:
+            policy = ffmpeg_jobs.ask_overwrite_policy(self, existing)
+            if policy is None:
+                self.log("操作取消。")
+                return
+            if policy == ffmpeg_jobs.SKIP:
+                outputs = [(video, output) for video, output in outputs if not output.exists()]
+                self.log(f"跳过 {len(existing)} 个已存在的音频文件。")
+
+        queued = 0
+        for video, output in outputs:
+            # 同一个输出已在队列中（如列表中有重复的视频）时不再提交
+            if self.jobs.find_active(output):
+                continue
+            self.jobs.submit(self.build_audio_command(video, output),
+                             f"音频提取完成！文件保存在:\n{output}")
+            queued += 1
+        self.log(f"已将 {queued} 个音频提取任务加入任务队列，同时运行 {self.jobs.max_workers} 个。")
     
-    def run_process(self, command, success_message, cleanup_file=None):
-        """执行外部命令（如 ffmpeg）"""
-        if self.process and self.process.state() == QProcess.ProcessState.Running:
-            self.show_message("请稍候", "另一个任务正在进行中，请等待其完成后再试。", QMessageBox.Icon.Warning)
-            return
-
-        self.log("="*50)
-        self.log(f"执行命令: {' '.join(command)}")
-        self.log("="*50)
-        
-        self.process = QProcess()
-        
-        # 定义完成后的操作
-        def on_finished(exit_code, exit_status):
-            # 清理临时文件
-            if cleanup_file and os.path.exists(cleanup_file):
-                try:
-                    os.remove(cleanup_file)
-                    self.log(f"已清理临时文件: {cleanup_file}")
-                except OSError as e:
-                    self.log(f"清理临时文件失败: {e}")
-
-            if exit_code == 0:
-                self.log(f"\n任务成功完成！\n{'-'*20}")
-                self.show_message("成功", success_message, QMessageBox.Icon.Information)
-            else:
-                error_output = self.process.readAllStandardError().data().decode('utf-8', errors='ignore')
-                self.log(f"\n任务失败！退出代码: {exit_code}\n{'-'*20}")
-                self.log(f"FFmpeg 错误信息:\n{error_output}")
-                self.show_message("失败", f"操作失败，请查看日志获取详细信息。", QMessageBox.Icon.Critical)
-            self.process = None # 重置 process
-
-        self.process.readyReadStandardOutput.connect(self.handle_stdout)
-        self.process.readyReadStandardError.connect(self.handle_stderr)
-        self.process.finished.connect(on_finished)
-
-        self.process.start(command[0], command[1:])
-
-    def handle_stdout(self):
-        """处理标准输出"""
-        data = self.process.readAllStandardOutput().data().decode('utf-8', errors='ignore')
-        self.log(data.strip())
+    def run_process(self, command, success_message, cleanup_files=(), priority=ffmpeg_jobs.PRIORITY_NORMAL, after=()):
+        """把外部命令（如 ffmpeg）加入任务队列，多个任务可同时运行；after 中的任务完成后才开始"""
+        existing = self.jobs.find_active(command[-1])
+        if existing:
+            # 两个任务同时写同一个输出文件会互相破坏
+            for path in cleanup_files:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.show_message("请稍候", f"'{existing.title}' 已在任务队列中，请等待其完成后再试。", QMessageBox.Icon.Warning)
+            return None
+        job = self.jobs.submit(command, success_message, list(cleanup_files), priority, after=after)
+        self.log(f"已加入任务队列: {job.title}")
+        return job
+
+    def on_job_finished(self, job):
+        """单个任务结束；完整的 FFmpeg 输出在任务列表中选中该任务查看"""
+        if job.state == ffmpeg_jobs.DONE:
+            self.log(f"任务成功完成: {job.title} ({job.elapsed():.1f} 秒)")
+        elif job.state == ffmpeg_jobs.FAILED:
+            self.log(f"任务失败: {job.title}，退出代码: {job.exit_code}", log_sink.ERROR)
+            self.log(f"FFmpeg 错误信息:\n{job.tail()}", log_sink.ERROR)
+        else:
+            self.log(f"任务已取消: {job.title}")
 
-    def handle_stderr(self):
-        """处理标准错误（ffmpeg 进度信息通常在这里）"""
-        data = self.process.readAllStandardError().data().decode('utf-8', errors='ignore')
-        self.log(data.strip())
+    def on_queue_finished(self, jobs):
+        """队列中的任务全部结束后只提示一次"""
+        ok, message = ffmpeg_jobs.summarize(jobs)
+        if message:
+            self.show_message("成功" if ok else "失败", message,
+                              QMessageBox.Icon.Information if ok else QMessageBox.Icon.Critical)
 
-    def log(self, message):
+    def log(self, message, level=log_sink.INFO):
         """向日志文本框追加信息"""
-        self.log_output.append(message)
-        self.log_output.ensureCursorVisible() # 滚动到底部
+        self.log_sink.write(message, level)
 
     def show_message(self, title, message, icon):
         """显示一个简单的消息框"""
@@ -353,15 +414,15 @@ class VideoMergerApp(QMainWindow):
         msg_box.exec()
 
     def closeEvent(self, event):
-        """关闭窗口时确认是否有进程在运行"""
-        if self.process and self.process.state() == QProcess.ProcessState.Running:
+        """关闭窗口时确认是否有任务未完成"""
+        if self.jobs.is_busy():
             reply = QMessageBox.question(
-                self, "确认退出", "一个任务正在运行中。确定要强制退出吗？",
+                self, "确认退出", f"还有 {self.jobs.active_count()} 个任务未完成。确定要强制退出吗？",
                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
                 QMessageBox.StandardButton.No
             )
             if reply == QMessageBox.StandardButton.Yes:
-                self.process.kill()
+                self.jobs.shutdown()
                 event.accept()
             else:
                 event.ignore()
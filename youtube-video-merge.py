@@ -1,6 +1,7 @@
 import sys
 import os
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from PyQt5.QtWidgets import (
     QApplication,
@@ -13,14 +14,19 @@ from PyQt5.QtWidgets import (
     QTextEdit,
     QMessageBox,
     QComboBox,
+    QProgressBar,
 )
 from PyQt5.QtCore import QProcess, Qt
-from PyQt5.QtGui import QTextCursor
+import ffmpeg_jobs
+import log_sink
 
 class SimplifiedMerger(QWidget):
     def __init__(self):
         super().__init__()
         self.selected_files = {} # 用字典存储识别出的文件路径
+        self.progress = ffmpeg_jobs.FFmpegProgress()
+        # 在后台用 ffprobe 读取输入时长，不阻塞界面
+        self._probe_pool = ThreadPoolExecutor(max_workers=1)
         self.initUI()
         self.process = QProcess(self)
         self.process.readyReadStandardOutput.connect(self.handle_stdout)
@@ -65,9 +71,19 @@ class SimplifiedMerger(QWidget):
         self.merge_button.clicked.connect(self.merge_files)
         vbox.addWidget(self.merge_button)
 
-        # 4. 输出日志控制台
-        self.output_console = QTextEdit(self)
-        self.output_console.setReadOnly(True)
+        # 4. 进度条和编码速度（来自 ffmpeg -progress 的输出）
+        progress_hbox = QHBoxLayout()
+        self.progress_bar = QProgressBar(self)
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.speed_label = QLabel(self)
+        progress_hbox.addWidget(self.progress_bar)
+        progress_hbox.addWidget(self.speed_label)
+        vbox.addLayout(progress_hbox)
+
+        # 5. 输出日志控制台（只显示 ffmpeg 的警告和错误）
+        self.output_console = log_sink.create_view()
+        self.console = log_sink.LogSink(self.output_console, file_path=log_sink.log_file_path("youtube-video-merge"))
         vbox.addWidget(self.output_console)
 
         self.setLayout(vbox)
@@ -123,7 +139,7 @@ class SimplifiedMerger(QWidget):
                                          f"文件 '{output_file.name}' 已存在。要覆盖它吗？",
                                          QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
             if reply == QMessageBox.No:
-                self.output_console.append(f"操作取消：用户选择不覆盖现有文件 '{output_file.name}'。")
+                self.console.info(f"操作取消：用户选择不覆盖现有文件 '{output_file.name}'。")
                 return
 
         try:
@@ -135,7 +151,7 @@ class SimplifiedMerger(QWidget):
 
         self.merge_button.setEnabled(False)
         self.select_button.setEnabled(False)
-        self.output_console.clear()
+        self.console.clear()
 
         # --- 动态构建FFmpeg命令 ---
         input_files_cmd = []
@@ -153,14 +169,14 @@ class SimplifiedMerger(QWidget):
         # **核心改动：处理音频流**
         if 'audio' in self.selected_files:
             # 情况1: 提供了外部音频，则映射外部音频
-            self.output_console.append("音频模式: 使用外部音轨\n")
+            self.console.info("音频模式: 使用外部音轨\n")
             input_files_cmd.extend(["-i", self.selected_files['audio']])
             map_cmd.extend(["-map", f"{current_input_index}:a:0"])
             codec_cmd.extend(["-c:a", "copy"])
             current_input_index += 1
         else:
             # 情况2: 未提供外部音频，则从原视频(输入0)中复制音轨
-            self.output_console.append("音频模式: 保留原始视频音轨\n")
+            self.console.info("音频模式: 保留原始视频音轨\n")
             map_cmd.extend(["-map", "0:a?"]) # '?'确保视频没音轨时不报错
             codec_cmd.extend(["-c:a", "copy"])
             
@@ -170,34 +186,53 @@ class SimplifiedMerger(QWidget):
             map_cmd.extend(["-map", f"{current_input_index}:s:0"])
             subtitle_codec = "mov_text" if output_format == 'mp4' else "copy"
             codec_cmd.extend(["-c:s", subtitle_codec])
-            self.output_console.append(f"字幕编码器: {subtitle_codec}\n")
+            self.console.info(f"字幕编码器: {subtitle_codec}\n")
             
         # 组合最终命令
         command = input_files_cmd + map_cmd + codec_cmd + [str(output_file)]
         
-        self.output_console.append(f"输出文件: {output_file}\n\n")
-        
-        self.process.start("ffmpeg", ["-y"] + command)
+        self.console.info(f"输出文件: {output_file}\n\n")
+
+        # 标准输出是结构化的进度，标准错误只有警告和错误；总时长取最长的输入，在后台读取，
+        # 读到之前进度条只显示已处理的时长
+        command = ffmpeg_jobs.with_progress(["ffmpeg", "-y"] + command)
+        self.progress = ffmpeg_jobs.FFmpegProgress()
+        self._probe_pool.submit(self._estimate_duration, self.progress, command)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setFormat("%p%")
+        self.speed_label.clear()
+        self.process.start(command[0], command[1:])
+
+    def _estimate_duration(self, progress, command):
+        # 在线程池中运行；只写入 progress.duration，由界面线程在下次进度更新时读取。
+        # 不能在这里写日志 (LogSink 只能在界面线程中使用)，无法获取时长时保持 None
+        try:
+            progress.duration = ffmpeg_jobs.estimate_duration(command)
+        except Exception:
+            pass
 
     def handle_stdout(self):
         data = self.process.readAllStandardOutput().data().decode('utf-8', errors='ignore')
-        self.output_console.moveCursor(QTextCursor.End)
-        self.output_console.insertPlainText(data)
+        if self.progress.feed(data):
+            percent = self.progress.percent()
+            self.progress_bar.setValue(int(percent) if percent is not None else 0)
+            self.progress_bar.setFormat(self.progress.describe())
+            self.speed_label.setText(self.progress.speed_text())
 
     def handle_stderr(self):
+        # -loglevel warning 之后标准错误中只有警告和错误
         data = self.process.readAllStandardError().data().decode('utf-8', errors='ignore')
-        self.output_console.moveCursor(QTextCursor.End)
-        self.output_console.insertPlainText(data)
+        self.console.warning(data.strip())
 
     def process_finished(self):
         self.merge_button.setEnabled(True)
         self.select_button.setEnabled(True)
         if self.process.exitCode() == 0:
-            self.output_console.append("\n合并成功！")
+            self.console.info("\n合并成功！")
             output_file_path = self.process.arguments()[-1]
             QMessageBox.information(self, "成功", f"文件已成功合并！\n\n输出路径: {output_file_path}")
         else:
-            self.output_console.append("\n合并失败。")
+            self.console.error("合并失败。")
             QMessageBox.critical(self, "错误", "合并过程中发生错误，请检查日志。")
 
 if __name__ == "__main__":